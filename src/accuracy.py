@@ -0,0 +1,90 @@
+import numpy as np
+
+from cube import CellCube
+from filter_index import BLANK_LABEL, missing_first
+
+# Horizons the DNN is scored on: label, predicted column, actual column
+ACCURACY_HORIZONS = [('Month 3', 'Month 3 (P)', 'Month 3 (A)'), ('Month 4', 'Month 4 (P)', 'Month 4 (A)'),
+                     ('Month 5', 'Month 5 (P)', 'Month 5 (A)'), ('Month 6', 'Month 6 (P)', 'Month 6 (A)')]
+
+# Sums kept per horizon: rows with both values, error (predicted - actual), its absolute value and
+# square, and the absolute percentage error with the number of rows it covers (actual not zero)
+SUMS = ['count', 'error', 'abs_error', 'squared_error', 'pct_error', 'pct_count']
+
+
+# Per-row terms of SUMS for one horizon; rows missing either value add nothing
+def horizon_terms(predicted, actual):
+    valid = ~(np.isnan(predicted) | np.isnan(actual))
+    error = np.where(valid, predicted - actual, 0)
+    pct = valid & (actual != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_error = np.where(pct, np.abs(error) / np.abs(actual), 0)
+    return [valid, error, np.abs(error), error * error, pct_error, pct]
+
+
+# (horizons x SUMS x groups) sums of rows (None means all rows) by group number; term-major, so each
+# sum is one contiguous array
+def grouped_sums(df, rows, groups, size):
+    sums = np.zeros((len(ACCURACY_HORIZONS), len(SUMS), size))
+    for h, (_, predicted, actual) in enumerate(ACCURACY_HORIZONS):
+        p, a = df[predicted].to_numpy(dtype=float), df[actual].to_numpy(dtype=float)
+        if rows is not None:
+            p, a = p[rows], a[rows]
+        for s, term in enumerate(horizon_terms(p, a)):
+            sums[h, s] = np.bincount(groups, weights=term, minlength=size)
+    return sums
+
+
+# (value, row count, horizons x SUMS sums) per non-empty group, biggest first, then by value (blank first)
+def group_results(values, counts, sums):
+    groups = [(values[g], int(counts[g]), sums[:, :, g]) for g in np.flatnonzero(counts)]
+    return sorted(groups, key=lambda group: (-group[1], missing_first(group[0])))
+
+
+# Sums over selected rows (None means all rows), grouped by a filter column or not at all. Grouped,
+# blank values (code -1) are counted in group 0, valued None, and every other code one group up
+def selection_totals(df, index, rows, group_column):
+    size = len(df) if rows is None else len(rows)
+    if group_column is None:
+        groups, values = np.zeros(size, dtype=np.int64), [None]
+    else:
+        column = index.columns[group_column]
+        codes = column.codes if rows is None else column.codes[rows]
+        groups, values = codes.astype(np.int64) + 1, [None] + column.values
+    counts = np.bincount(groups, minlength=len(values))
+    return group_results(values, counts, grouped_sums(df, rows, groups, len(values)))
+
+
+# Accuracy sums (horizons x SUMS) per cell, so any selection on the cube columns, a Date range and a
+# grouping by one of them merge cells instead of rows
+class AccuracyCube(CellCube):
+    def row_sums(self, df, rows, groups, size):
+        return grouped_sums(df, rows, groups, size)
+
+    # Same result as selection_totals over the selected rows, from the matching cells
+    def totals(self, filters, ranges, group_column):
+        if group_column is None:
+            groups, values = np.zeros(len(self.cells), dtype=np.int64), [None]
+        else:
+            groups, values = self.codes(group_column) + 1, [None] + self.index.columns[group_column].values
+        sums, counts = self.merged(self.kept(filters, ranges), groups, len(values))
+        return group_results(values, counts, sums)
+
+
+# Table rows of MAE, RMSE, MAPE and bias per horizon for each group of accuracy(..., group_column);
+# ungrouped, the one group is the whole selection
+def accuracy_records(groups, group_column=None):
+    records = []
+    for value, rows, sums in groups:
+        record = {'Segment': 'All rows' if group_column is None else BLANK_LABEL if value is None else value, 'Rows': rows}
+        for (label, _, _), (count, error, abs_error, squared_error, pct_error, pct_count) in zip(ACCURACY_HORIZONS, sums):
+            record[f'{label} MAE'] = round(float(abs_error / count), 4) if count else None
+            record[f'{label} RMSE'] = round(float(np.sqrt(squared_error / count)), 4) if count else None
+            record[f'{label} MAPE %'] = round(float(pct_error / pct_count * 100), 2) if pct_count else None
+            record[f'{label} Bias'] = round(float(error / count), 4) if count else None
+        records.append(record)
+    return records
+
+
+# Column names of accuracy_records, in order
+ACCURACY_COLUMNS = ['Segment', 'Rows'] + [f'{label} {metric}' for label, _, _ in ACCURACY_HORIZONS for metric in ('MAE', 'RMSE', 'MAPE %', 'Bias')]
@@ -2,19 +2,63 @@ from flask import Flask
 from dash import Dash, dcc, Output, Input, State, html
 import dash_bootstrap_components as dbc
 from dash import dash_table
-import pandas as pd
+import os
+import time
+from dash import ALL, ctx, no_update
+from dash.exceptions import PreventUpdate
+from flask import Response, g, jsonify, request, stream_with_context
+from accuracy import ACCURACY_COLUMNS, accuracy_records
+from compression import COMPRESS_MIN_BYTES, accepted_encoding, compress
+from dataset_manager import DatasetManager, POLL_SECONDS, TABLE_COLUMNS
+from export import ACTUAL_COLUMNS, EXPORT_CHUNK_ROWS, EXPORT_TYPES, csv_stream, export_state, parquet_stream, pyarrow
+from filter_index import FILTER_COLUMNS, RANGE_COLUMNS
+from leaderboard import LEADERBOARD_COLUMNS, LEADERBOARD_GROUPS, LEADERBOARD_K, LEADERBOARD_METRICS, MAX_K, leaderboard_records
+from metrics import PROFILE_SLOW_MS, Metrics, SlowRequestProfiler
+from registry import DatasetRegistry, dataset_name, discover
+from result_cache import EVENTS, ResultCache
+from roi import ROI_HORIZONS
+from sessions import LatestRequests
+from sqlite_backend import SqliteDataset
+from trends import TREND_DIMENSIONS, top_series, trend_figures
+from warmup import WarmUp
 
 # Define Flask application instance
 # server = Flask(__name__)
 
-# Load Data
-path = 'DNNresults.csv'
-data = pd.read_csv(path)
-df = pd.DataFrame(data)
-df['Month'] = pd.to_datetime(df['Month'])  # Convert Month column to datetime
-df['Month'] = df['Month'].dt.strftime('%Y/%m')  # Format Month column as 'YYYY/MM'
-df2 = df[['Month','Date','Country','New_Gateway','Telco','Shortcode','Keyword','Offer_ID','Affiliate_ID',
-          'Total Sales','ECPA','Day 1','Week 1','Month 3 (P)','Month 4 (P)','Month 5 (P)','Month 6 (P)']]
+# Load Data (DNN_SOURCE points the dashboard at another results file, e.g. a synthetic one)
+path = os.environ.get('DNN_SOURCE', 'DNNresults.csv')
+cache_root = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+
+# A dataset manager owns the current snapshot (data plus indexes) of one results file and swaps in new
+# prediction batches without a restart; callbacks take current() once and query that version throughout.
+# DNN_BACKEND=sqlite serves datasets larger than memory from an on-disk SQLite file instead. Batches for
+# the main dataset go into DNN_INGEST_DIR, for the others into a subdirectory named after them.
+def open_dataset(source):
+    if os.environ.get('DNN_BACKEND', 'pandas') == 'sqlite':
+        return SqliteDataset(source)
+    ingest_dir = os.environ.get('DNN_INGEST_DIR', 'ingest')
+    if source != os.path.abspath(path):
+        ingest_dir = os.path.join(ingest_dir, dataset_name(source))
+    return DatasetManager(source, ingest_dir=ingest_dir)
+
+# Every results file found next to the main one (see registry.DATASETS), loaded on first use and
+# dropped least recently used first past DNN_MEMORY_BUDGET_MB; the dataset dropdown picks one
+datasets = DatasetRegistry(discover(path), open_dataset, default=dataset_name(path))
+
+# Callback outputs keyed on the filter state and dataset version, shared by the gunicorn workers
+results = ResultCache(directory=os.path.join(cache_root, 'results'), scope_of=datasets.name_of)
+
+# Callback latency, payload and filter histograms summed over the workers, served at /metrics;
+# with DNN_PROFILE_SLOW_MS set, callback requests slower than that are saved as cProfile dumps
+metrics = Metrics(directory=os.path.join(cache_root, 'metrics'))
+metrics.collectors.append(lambda: {('result_cache_events_total', (('event', name),)): value
+                                   for name, value in results.snapshot_stats().items() if name in EVENTS})
+metrics.collectors.append(lambda: {('dataset_events_total', (('event', event), ('dataset', name))): value
+                                   for (event, name), value in datasets.events.items()})
+# Newest dashboard request per browser tab, shared by the workers; older requests stop between stages
+latest_requests = LatestRequests(directory=os.path.join(cache_root, 'sessions'))
+
+profiler = SlowRequestProfiler(os.path.join(cache_root, 'profiles'), PROFILE_SLOW_MS) if PROFILE_SLOW_MS else None
 
 #app =server
 
@@ -22,28 +66,144 @@ df2 = df[['Month','Date','Country','New_Gateway','Telco','Shortcode','Keyword','
 app = Dash(__name__, external_stylesheets=[dbc.themes.LUX])
 server = app.server
 
-# Function to filter data based on user selections
-def filter_data(df, month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id):
-    filtered_df = df.copy()
-    if month:
-        filtered_df = filtered_df[filtered_df['Month'] == month]
-    if date:
-        filtered_df = filtered_df[filtered_df['Date'] == date]
-    if country:
-        filtered_df = filtered_df[filtered_df['Country'] == country]
-    if gateway:
-        filtered_df = filtered_df[filtered_df['New_Gateway'] == gateway]
-    if telco:
-        filtered_df = filtered_df[filtered_df['Telco'] == telco]
-    if shortcode:
-        filtered_df = filtered_df[filtered_df['Shortcode'] == shortcode]
-    if keyword:
-        filtered_df = filtered_df[filtered_df['Keyword'] == keyword]
-    if offer_id:
-        filtered_df = filtered_df[filtered_df['Offer_ID'] == offer_id]
-    if affiliate_id:
-        filtered_df = filtered_df[filtered_df['Affiliate_ID'] == affiliate_id]
-    return filtered_df
+# Each gunicorn worker starts watching its loaded datasets for new prediction batches once it serves requests
+@server.before_request
+def start_dataset_watcher():
+    datasets.watch()
+
+# The datasets a request uses (the selected one and the one it is compared with) stay loaded until it
+# ends, streamed exports included, whatever the memory budget (see DatasetRegistry.hold)
+@server.before_request
+def hold_datasets():
+    datasets.hold()
+
+@server.teardown_request
+def release_datasets(error):
+    datasets.release()
+
+# Result cache hit/miss/eviction counters for this worker
+@server.route('/cache-stats')
+def cache_stats():
+    return jsonify(results.snapshot_stats())
+
+@server.route('/metrics')
+def metrics_text():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Filtered rows as a download streamed chunk by chunk, so memory stays flat whatever the result size:
+# /export?format=csv|parquet&state=<JSON filter state, see export.export_state>
+@server.route('/export')
+def export_rows():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_TYPES:
+        return Response(f'Unknown export format {fmt!r}', status=400, mimetype='text/plain')
+    if fmt == 'parquet' and pyarrow is None:
+        return Response('Parquet export needs pyarrow installed', status=501, mimetype='text/plain')
+    try:
+        filters, ranges, filter_query, sort_by, actuals, name = export_state(request.args.get('state'))
+    except ValueError as error:
+        return Response(f'Bad export state: {error}', status=400, mimetype='text/plain')
+
+    name = name if name in datasets.sources else datasets.default
+    backend = datasets.get(name).current()
+    columns = TABLE_COLUMNS + (ACTUAL_COLUMNS if actuals else [])
+    chunks = backend.export_chunks(filter_rows(backend, *filters, ranges), filter_query, sort_by, columns, EXPORT_CHUNK_ROWS)
+    stream = csv_stream(chunks) if fmt == 'csv' else parquet_stream(chunks)
+    return Response(stream_with_context(stream), mimetype=EXPORT_TYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{name}-{backend.version}.{fmt}"'})
+
+# Time every callback request, named after the Python function serving it
+@server.before_request
+def start_callback_timer():
+    if request.path == '/_dash-update-component':
+        g.callback_start = time.perf_counter()
+        g.profile = profiler.start() if profiler else None
+
+@server.after_request
+def record_callback(response):
+    if 'callback_start' not in g:
+        return response
+    seconds = time.perf_counter() - g.callback_start
+    output = (request.get_json(silent=True) or {}).get('output')
+    spec = app.callback_map.get(output)
+    name = spec['callback'].__name__ if spec else 'unknown'
+    if g.profile is not None:
+        profiler.stop(g.profile, name, seconds)
+    metrics.observe('dash_callback_seconds', seconds, callback=name)
+    metrics.observe('dash_response_bytes', g.get('response_bytes', response.content_length or 0), callback=name)
+    metrics.observe('dash_response_wire_bytes', response.content_length or 0, callback=name)
+    metrics.save()
+    return response
+
+# Compress callback responses above COMPRESS_MIN_BYTES with the best encoding the browser accepts; table
+# pages shrink about 5x. Registered after the timer, so it runs first and its time is counted.
+@server.after_request
+def compress_callback(response):
+    if request.path != '/_dash-update-component' or response.status_code != 200 or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers:
+        return response
+    data = response.get_data()
+    g.response_bytes = len(data)
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Backend selection matching the user selections (each dropdown may hold several values) and ranges
+def filter_rows(backend, month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id, ranges=None):
+    stats = {}
+    selection = backend.select([month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id], ranges, stats)
+    if stats:
+        metrics.observe('filter_rows_scanned', stats['scanned'])
+        metrics.observe('filter_rows_returned', stats['returned'])
+    return selection
+
+# Function to filter data based on user selections (in-memory snapshots only)
+def filter_data(snapshot, month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id, ranges=None):
+    return snapshot.index.take(filter_rows(snapshot, month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id, ranges))
+
+# Dropdown options below a path of earlier selections, labelled with their row counts within the ranges
+def facet_options(backend, path, ranges=None):
+    return results.get_or_compute('facet-options', backend.version, [path, ranges], lambda: [
+        {'label': f'{value} ({count})', 'value': value} for value, count in backend.facet_counts(path, ranges)])
+
+# Filter dropdowns share one pattern-matching id type, keyed by the column they filter
+FILTER_PLACEHOLDERS = [('Month', 'Select Month'), ('Date', 'Select Date'), ('Country', 'Select Country'),
+                       ('New_Gateway', 'Select Gateway'), ('Telco', 'Select Telco'), ('Shortcode', 'Select Shortcode'),
+                       ('Keyword', 'Select Keyword'), ('Offer_ID', 'Select Offer ID'), ('Affiliate_ID', 'Select Affiliate ID')]
+
+def filter_id(column):
+    return {'type': 'filter-dropdown', 'column': column}
+
+# Numeric range filters get a min and a max input each; the Date range uses the date picker instead
+RANGE_INPUTS = [col for col in RANGE_COLUMNS if col != 'Date']
+
+def range_id(column, bound):
+    return {'type': f'range-{bound}', 'column': column}
+
+# {column: [low, high]} for every range with at least one end set
+def selected_ranges(start_date, end_date):
+    ranges = {}
+    if start_date or end_date:
+        ranges['Date'] = [start_date, end_date]
+    lows = {item['id']['column']: item.get('value') for item in ctx.inputs_list[1]}
+    highs = {item['id']['column']: item.get('value') for item in ctx.inputs_list[2]}
+    for col in RANGE_COLUMNS:
+        if lows.get(col) is not None or highs.get(col) is not None:
+            ranges[col] = [lows.get(col), highs.get(col)]
+    return ranges
+
+# Horizon the trend charts and the leaderboard open on
+TREND_HORIZON = 'Month 3 (P)'
+
+# Rows per table page, as the table opens
+TABLE_PAGE_SIZE = 200
+
+# Columns of the ROI comparison of two datasets
+COMPARE_COLUMNS = ['Horizon', 'Selected dataset %', 'Compared dataset %', 'Difference (pts)']
 
 # Dash layout
 app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', 'fontFamily': 'Arial, sans-serif'}, children=[
@@ -54,6 +214,23 @@ app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', '
 
     html.H1('ARPU Prediction Result', style={'widt': '50%','textAlign': 'center', 'fontWeight': '2000', 'fontFamily': 'Forum','marginBottom': '20px'}),
 
+    # Results file every section queries, and another one whose ROI is compared on the same filters
+    html.Div([
+        dcc.Dropdown(id='dataset-name', options=[{'label': name, 'value': name} for name in datasets.names()], value=datasets.default,
+                     clearable=False, style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
+        dcc.Dropdown(id='compare-dataset', placeholder='Compare ROI with', options=[{'label': name, 'value': name} for name in datasets.names()],
+                     style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
+    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': '5px'}),
+
+    # Active dataset version and load/ingest timings, polled so new batches show up without a reload
+    html.P('Loading dataset...', id='dataset-status', style={'textAlign': 'center', 'fontFamily': 'Forum', 'fontSize': '12px', 'color': '#6c757d'}),
+    dcc.Store(id='dataset-version'),
+    # Random id of this tab, sent with every dashboard request so a newer one can supersede it
+    dcc.Store(id='session-id'),
+    # Inputs the dashboard outputs the browser last applied were computed from (see dashboard_state)
+    dcc.Store(id='dashboard-rendered'),
+    dcc.Interval(id='dataset-poll', interval=max(POLL_SECONDS, 1) * 1000, disabled=POLL_SECONDS <= 0),
+
     dbc.Button(
         "Expand filters collapse",
         id="collapse-button",
@@ -68,18 +245,22 @@ app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', '
     dbc.Collapse(id='collapse', is_open=False, children=[
 
         html.Div([
-            dcc.Dropdown(id='month-dropdown', options=[{'label': month, 'value': month} for month in df2['Month'].unique()], placeholder='Select Month',
-                         style={'width': '30%',  'margin': '2px','fontFamily': 'Forum'}),
-            dcc.Dropdown(id='date-dropdown', placeholder='Select Date', style={'width': '30%','margin': '2px', 'fontFamily': 'Forum'}),
-            dcc.Dropdown(id='country-dropdown', placeholder='Select Country', style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
-            dcc.Dropdown(id='gateway-dropdown', placeholder='Select Gateway', style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
-            dcc.Dropdown(id='telco-dropdown', placeholder='Select Telco', style={'width': '30%', 'margin': '2px','fontFamily': 'Forum'}),
-            dcc.Dropdown(id='shortcode-dropdown', placeholder='Select Shortcode', style={'width': '30%','margin': '2px','fontFamily': 'Forum'}),
-            dcc.Dropdown(id='keyword-dropdown', placeholder='Select Keyword', style={'width': '30%', 'margin': '2px','fontFamily': 'Forum'}),
-            dcc.Dropdown(id='offer-id-dropdown', placeholder='Select Offer ID', style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
-            dcc.Dropdown(id='affiliate-id-dropdown', placeholder='Select Affiliate ID', style={'width': '30%', 'margin': '2px','fontFamily': 'Forum'})
+            dcc.Dropdown(id=filter_id(col), placeholder=placeholder, options=[], multi=True, style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'})
+            for col, placeholder in FILTER_PLACEHOLDERS
         ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'marginBottom': '10px'}),
 
+        html.Div([
+            dcc.DatePickerRange(id='date-range', start_date_placeholder_text='From date', end_date_placeholder_text='To date',
+                                clearable=True, style={'margin': '2px', 'fontFamily': 'Forum'})
+        ] + [
+            html.Div([
+                html.Span(col, style={'fontFamily': 'Forum', 'fontSize': '12px', 'marginRight': '4px'}),
+                dcc.Input(id=range_id(col, 'min'), type='number', placeholder='min', debounce=True, style={'width': '80px'}),
+                dcc.Input(id=range_id(col, 'max'), type='number', placeholder='max', debounce=True, style={'width': '80px'}),
+            ], style={'margin': '2px 8px'})
+            for col in RANGE_INPUTS
+        ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'alignItems': 'center', 'marginBottom': '10px'}),
+
         html.Div([html.Button('Clear Filters', id='clear-filters-button', n_clicks=0, className='me-1', style={'margin': '5px','fontFamily': 'Forum', 'color': 'secondary'})]
                   ,style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'right', 'marginBottom': '10px'}),
 
@@ -89,7 +270,7 @@ app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', '
     # Table displaying filtered data
     dash_table.DataTable(
         id='table',
-        columns=[{'name': col, 'id': col} for col in df2.columns if col not in ['Month 3 ROI', 'Month 4 ROI', 'Month 5 ROI', 'Month 6 ROI']], 
+        columns=[{'name': col, 'id': col} for col in TABLE_COLUMNS if col not in ['Month 3 ROI', 'Month 4 ROI', 'Month 5 ROI', 'Month 6 ROI']], 
         data=[],
         style_data={
             'textAlign': 'left',
@@ -106,12 +287,64 @@ app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', '
             'fontFamily': 'Forum'
         },
         style_table={'height': '500px', 'overflowY': 'auto'},
-        page_size=200,
+        # Paging, sorting and column filters run on the server; only the visible page is sent
+        page_action='custom',
+        page_current=0,
+        page_size=TABLE_PAGE_SIZE,
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
     ),
 
+    html.Div([
+        dcc.Checklist(id='export-actuals', options=[{'label': ' include actual values', 'value': 'actuals'}], value=[],
+                      style={'fontFamily': 'Forum', 'fontSize': '12px', 'margin': '5px'}),
+        html.A('Export CSV', id='export-csv', href='/export?format=csv', style={'fontFamily': 'Forum', 'fontSize': '12px', 'margin': '5px'}),
+        html.A('Export Parquet', id='export-parquet', href='/export?format=parquet',
+               style={'fontFamily': 'Forum', 'fontSize': '12px', 'margin': '5px', 'display': 'inline' if pyarrow else 'none'}),
+        html.P(id='table-row-count', style={'fontFamily': 'Forum', 'fontSize': '12px', 'margin': '5px'}),
+    ], style={'display': 'flex', 'justifyContent': 'flex-end', 'alignItems': 'center'}),
+
     html.P('ROI (Return on Investment) based on predictions', 
            style={'textAlign': 'center', 'fontWeight': 'bold', 'fontFamily': 'Forum', 'marginBottom': '5px','fontSize':'25px'}),
 
+    html.Div(
+    [
+        html.Div(
+            [
+                dcc.Graph(
+                    id='day1-donut-graph',
+                    figure={
+                        'layout': {
+                            'title': 'Day 1 ROI',
+                            'margin': {'t': 20, 'r': 20, 'b': 20, 'l': 20},
+                            'fontWeight': 'bold',
+                            'fontFamily': 'Forum',
+                            'legend': {'orientation': 'horizontal', 'yanchor': 'top', 'xanchor': 'center'}
+                        }
+                    },
+                    style={'width': '50%', 'display': 'inline-block'}  # Set width to 50% for side-by-side display
+                ),
+                dcc.Graph(
+                    id='week1-donut-graph',
+                    figure={
+                        'layout': {
+                            'title': 'Week 1 ROI',
+                            'margin': {'t': 20, 'r': 20, 'b': 20, 'l': 20},
+                            'fontWeight': 'bold',
+                            'fontFamily': 'Forum',
+                            'legend': {'orientation': 'horizontal', 'yanchor': 'top', 'xanchor': 'center'}
+                        }
+                    },
+                    style={'width': '50%', 'display': 'inline-block'}  # Set width to 50% for side-by-side display
+                )
+            ],
+            style={'backgroundColor': '#f0f0f0', 'padding': '20px'}  # Add background color and padding
+        )
+    ]),
+
     html.Div(
     [
 
@@ -181,286 +414,178 @@ app.layout = html.Div(style={'backgroundColor': '#f8f9fa', 'color': '#212529', '
             ],
             style={'backgroundColor': '#f0f0f0', 'padding': '20px'}  # Add background color and padding
         )
-    ])
+    ]),
+
+    # ROI hit rates of the selected dataset next to the compared one, on the same filters
+    dash_table.DataTable(
+        id='compare-table',
+        columns=[{'name': col, 'id': col} for col in COMPARE_COLUMNS],
+        data=[],
+        style_data={'textAlign': 'left', 'color': '#212529', 'backgroundColor': '#ffffff', 'fontFamily': 'Forum'},
+        style_header={'textAlign': 'center', 'backgroundColor': '#007bff', 'color': '#ffffff', 'fontWeight': 'bold', 'fontFamily': 'Forum'},
+        style_table={'overflowX': 'auto'},
+    ),
+
+    # Predicted value and ROI hit rate of one horizon by month, overall or per value of one filter column
+    html.P('Trends by month',
+           style={'textAlign': 'center', 'fontWeight': 'bold', 'fontFamily': 'Forum', 'margin': '20px 0 5px', 'fontSize': '25px'}),
+
+    html.Div([
+        dcc.Dropdown(id='trend-dimension', placeholder='Break down by', options=[{'label': col, 'value': col} for col in TREND_DIMENSIONS],
+                     style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
+        dcc.Dropdown(id='trend-horizon', options=[{'label': col, 'value': col} for col in ROI_HORIZONS], value=TREND_HORIZON, clearable=False,
+                     style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'}),
+    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': '10px'}),
+
+    html.Div([
+        dcc.Graph(id='trend-value-graph', style={'width': '50%', 'display': 'inline-block'}),
+        dcc.Graph(id='trend-roi-graph', style={'width': '50%', 'display': 'inline-block'}),
+    ], style={'backgroundColor': '#f0f0f0', 'padding': '20px'}),
+
+    # Best (or worst) affiliates, offers or affiliate / offer pairs of the selected rows by one metric
+    html.P('Affiliate and offer leaderboard',
+           style={'textAlign': 'center', 'fontWeight': 'bold', 'fontFamily': 'Forum', 'margin': '20px 0 5px', 'fontSize': '25px'}),
+
+    html.Div([
+        dcc.Dropdown(id='leaderboard-group', options=[{'label': name, 'value': name} for name in LEADERBOARD_GROUPS], value='Affiliate_ID',
+                     clearable=False, style={'width': '25%', 'margin': '2px', 'fontFamily': 'Forum'}),
+        dcc.Dropdown(id='leaderboard-metric', options=[{'label': label, 'value': metric} for metric, label in LEADERBOARD_METRICS.items()],
+                     value='roi', clearable=False, style={'width': '20%', 'margin': '2px', 'fontFamily': 'Forum'}),
+        dcc.Dropdown(id='leaderboard-horizon', options=[{'label': col, 'value': col} for col in ROI_HORIZONS], value=TREND_HORIZON,
+                     clearable=False, style={'width': '20%', 'margin': '2px', 'fontFamily': 'Forum'}),
+        dcc.RadioItems(id='leaderboard-order', options=[{'label': ' Highest', 'value': 'highest'}, {'label': ' Lowest', 'value': 'lowest'}],
+                       value='highest', inline=True, labelStyle={'marginRight': '10px'}, style={'margin': '8px', 'fontFamily': 'Forum'}),
+        dcc.Input(id='leaderboard-k', type='number', min=1, max=MAX_K, step=1, value=LEADERBOARD_K, debounce=True,
+                  style={'width': '70px', 'margin': '2px', 'fontFamily': 'Forum'}),
+    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': '10px'}),
+
+    dash_table.DataTable(
+        id='leaderboard-table',
+        columns=[{'name': col, 'id': col} for col in LEADERBOARD_COLUMNS],
+        data=[],
+        style_data={'textAlign': 'left', 'color': '#212529', 'backgroundColor': '#ffffff', 'fontFamily': 'Forum'},
+        style_header={'textAlign': 'center', 'backgroundColor': '#007bff', 'color': '#ffffff', 'fontWeight': 'bold', 'fontFamily': 'Forum'},
+        style_table={'overflowX': 'auto'},
+        page_size=20,
+        sort_action='native',
+    ),
+
+    # Predicted vs actual accuracy of the selected rows, overall or per value of one filter column
+    html.P('Prediction accuracy (predicted vs actual)',
+           style={'textAlign': 'center', 'fontWeight': 'bold', 'fontFamily': 'Forum', 'margin': '20px 0 5px', 'fontSize': '25px'}),
+
+    html.Div([
+        dcc.Dropdown(id='accuracy-group', placeholder='Group by', options=[{'label': col, 'value': col} for col in FILTER_COLUMNS],
+                     style={'width': '30%', 'margin': '2px', 'fontFamily': 'Forum'})
+    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': '10px'}),
+
+    dash_table.DataTable(
+        id='accuracy-table',
+        columns=[{'name': col, 'id': col} for col in ACCURACY_COLUMNS],
+        data=[],
+        style_data={'textAlign': 'left', 'color': '#212529', 'backgroundColor': '#ffffff', 'fontFamily': 'Forum'},
+        style_header={'textAlign': 'center', 'backgroundColor': '#007bff', 'color': '#ffffff', 'fontWeight': 'bold', 'fontFamily': 'Forum'},
+        style_table={'overflowX': 'auto'},
+        page_size=20,
+        sort_action='native',
+    ),
 
 ])
 
-# Collapse filter columns feature
-@app.callback(
+# Collapse filter columns feature and the expand/collapse box word, both handled in the browser
+app.clientside_callback(
+    """
+    function(n, is_open) {
+        return n ? !is_open : is_open;
+    }
+    """,
     Output("collapse", "is_open"),
     [Input("collapse-button", "n_clicks")],
     [State("collapse", "is_open")],
 )
-def toggle_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
-# change the expand/collapse box word
-@app.callback(
+app.clientside_callback(
+    """
+    function(is_open) {
+        return is_open ? "Collapse filters" : "Expand filters";
+    }
+    """,
     Output('collapse-button', 'children'),
     [Input('collapse', 'is_open')]
 )
-def update_button_text(is_open):
-    if is_open:
-        return "Collapse filters"
-    else:
-        return "Expand filters"
 
-# Callback to update date dropdown options based on month selection
-@app.callback(
-    Output('date-dropdown', 'options'),
-    [Input('month-dropdown', 'value')]
-)
-def update_date_dropdown(month):
-    if month:
-        options = [{'label': date, 'value': date} for date in df2[df2['Month'] == month]['Date'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update country dropdown options based on month and date selections
-@app.callback(
-    Output('country-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value')]
-)
-def update_country_dropdown(month, date):
-    if month and date:
-        options = [{'label': country, 'value': country} for country in df2[(df2['Month'] == month) & (df2['Date'] == date)]['Country'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update gateway dropdown options based on month, date and country selections
-@app.callback(
-    Output('gateway-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown','value')]
-)
-def update_gateway_dropdown(month, date, country):
-    if month and date and country:
-        options = [{'label':gateway, 'value': gateway} for gateway in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country)]['New_Gateway'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update telco dropdown options based on month, date, country, and gateway selections
-@app.callback(
-    Output('telco-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value')]
-)
-def update_telco_dropdown(month, date, country, gateway):
-    if month and date and country and gateway:
-        options = [{'label': telco, 'value': telco} for telco in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country) & (df2['New_Gateway'] == gateway)]['Telco'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update shortcode dropdown options based on month, date, country, gateway, and telco selections
-@app.callback(
-    Output('shortcode-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value'),
-     Input('telco-dropdown', 'value')]
-)
-def update_shortcode_dropdown(month, date, country, gateway, telco):
-    if month and date and country and gateway and telco:
-        options = [{'label': shortcode, 'value': shortcode} for shortcode in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country) & (df2['New_Gateway'] == gateway) & (df2['Telco'] == telco)]['Shortcode'].unique()]
-    else:
-        options = []
-    return options
-
-
-# Callback to update keyword dropdown options based on month, date, country, gateway, telco, and shortcode selections
-@app.callback(
-    Output('keyword-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value'),
-     Input('telco-dropdown', 'value'),
-     Input('shortcode-dropdown', 'value')]
-)
-def update_keyword_dropdown(month, date, country, gateway, telco, shortcode):
-    if month and date and country and gateway and telco and shortcode:
-        options =[{'label': keyword, 'value': keyword} for keyword in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country) & (df2['New_Gateway'] == gateway) & (df2['Telco'] == telco) & (df2['Shortcode'] == shortcode)]['Keyword'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update offer ID dropdown options based on month, date, country, gateway, telco, shortcode, and keyword selections
-@app.callback(
-    Output('offer-id-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value'),
-     Input('telco-dropdown', 'value'),
-     Input('shortcode-dropdown', 'value'),
-     Input('keyword-dropdown', 'value')]
-)
-def update_offer_id_dropdown(month, date, country, gateway, telco, shortcode, keyword):
-    if month and date and country and gateway and telco and shortcode and keyword:
-        options = [{'label': offer_id, 'value': offer_id} for offer_id in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country) & (df2['New_Gateway'] == gateway) & (df2['Telco'] == telco) & (df2['Shortcode'] == shortcode) & (df2['Keyword'] == keyword)]['Offer_ID'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update affiliate ID dropdown options based on all filter selections
-@app.callback(
-    Output('affiliate-id-dropdown', 'options'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value'),
-     Input('telco-dropdown', 'value'),
-     Input('shortcode-dropdown', 'value'),
-     Input('keyword-dropdown', 'value'),
-     Input('offer-id-dropdown', 'value')]
-)
-def update_affiliate_id_dropdown(month, date, country, gateway, telco, shortcode, keyword, offer_id):
-    if month and date and country and gateway and telco and shortcode and keyword and offer_id:
-        options = [{'label': affiliate_id, 'value': affiliate_id} for affiliate_id in df2[(df2['Month'] == month) & (df2['Date'] == date) & (df2['Country'] == country) & (df2['New_Gateway'] == gateway) & (df2['Telco'] == telco) & (df2['Shortcode'] == shortcode) & (df2['Keyword'] == keyword) & (df2['Offer_ID'] == offer_id)]['Affiliate_ID'].unique()]
-    else:
-        options = []
-    return options
-
-# Callback to update table data based on all filter selections
-@app.callback(
-    Output('table', 'data'),
-    [Input('month-dropdown', 'value'),
-     Input('date-dropdown', 'value'),
-     Input('country-dropdown', 'value'),
-     Input('gateway-dropdown', 'value'),
-     Input('telco-dropdown', 'value'),
-     Input('shortcode-dropdown', 'value'),
-     Input('keyword-dropdown', 'value'),
-     Input('offer-id-dropdown', 'value'),
-     Input('affiliate-id-dropdown', 'value')]
-)
-def update_table_data(month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id):
-    filtered_df = filter_data(df2, month, date, country, gateway, telco, shortcode, keyword, offer_id, affiliate_id)
-    return filtered_df.to_dict('records')
-
-
-# Month 3 donut graph callback
-@app.callback(
-    Output('month3-donut-graph', 'figure'),
-    [Input('table', 'data'),
-     Input('table', 'data_timestamp')]  # Input from table update callback
+app.clientside_callback(
+    """
+    function(id) {
+        return Math.random().toString(36).slice(2, 12) + Date.now().toString(36);
+    }
+    """,
+    Output('session-id', 'data'),
+    [Input('session-id', 'id')]
 )
-def update_month3_donut_graph(filtered_data, data_timestamp):
-    if not filtered_data:  # Handle empty data case
-        return {}
-
-    # Extract filtered DataFrame from the callback context
-    filtered_df = pd.DataFrame(filtered_data)
-
-    # Calculate the percentage for the metric
-    if len(filtered_df) > 0:
-        metric_percentage = (filtered_df['Month 3 (P)'] / filtered_df['ECPA'] > 1).sum() / len(filtered_df) * 100
-    else:
-        metric_percentage = 0
 
-    # Create donut chart figure
-    return {
-        'data': [
-            {
-                'values': [metric_percentage, 100 - metric_percentage],
-                'labels': ['Hit ROI', 'Missed ROI'],
-                'type': 'pie',
-                'hole': 0.4,
-                'textinfo': 'label+percent',
-                'fontWeight': 'bold',
-                'fontFamily': 'Forum',
-                'textposition': 'inside',
-                'marker': {
-                    'colors': ['#fdae61', '#abcaf0']
-                }
-            }
-        ],
-        'layout': {
-            'title': 'Month 3 ROI',  # Replace with actual title
-            'margin': {'top': 20, 'right': 20, 'bottom': 20, 'left': 20},
-            'fontWeight': 'bold',
-            'fontFamily': 'Forum',
-            'legend': {'orientation': 'horizontal', 'yanchor': 'top', 'xanchor': 'center'}
-        }
+# Callback to clear all filter dropdowns and ranges, in the browser; the dashboard callback then runs once for the cleared state
+app.clientside_callback(
+    """
+    function(n_clicks, values, lows, highs) {
+        return [values.map(() => []), lows.map(() => null), highs.map(() => null), null, null];
     }
-
-
-# Month 4 donut graph callback
-@app.callback(
-    Output('month4-donut-graph', 'figure'),
-    [Input('table', 'data'),
-     Input('table', 'data_timestamp')]  # Input from table update callback
+    """,
+    [Output(filter_id(ALL), 'value'),
+     Output(range_id(ALL, 'min'), 'value'),
+     Output(range_id(ALL, 'max'), 'value'),
+     Output('date-range', 'start_date'),
+     Output('date-range', 'end_date')],
+    [Input('clear-filters-button', 'n_clicks')],
+    [State(filter_id(ALL), 'value'),
+     State(range_id(ALL, 'min'), 'value'),
+     State(range_id(ALL, 'max'), 'value')],
+    prevent_initial_call=True
 )
-def update_month4_donut_graph(filtered_data, data_timestamp):
-    if not filtered_data:  # Handle empty data case
-        return {}
-
-    # Extract filtered DataFrame from the callback context
-    filtered_df = pd.DataFrame(filtered_data)
 
-    # Calculate the percentage for the metric
-    if len(filtered_df) > 0:
-        metric_percentage = (filtered_df['Month 4 (P)'] / filtered_df['ECPA'] > 1).sum() / len(filtered_df) * 100
-    else:
-        metric_percentage = 0
 
-    # Create donut chart figure
-    return {
-        'data': [
-            {
-                'values': [metric_percentage, 100 - metric_percentage],
-                'labels': ['Hit ROI', 'Missed ROI'],
-                'type': 'pie',
-                'hole': 0.4,
-                'textinfo': 'label+percent',
-                'fontWeight': 'bold',
-                'fontFamily': 'Forum',
-                'textposition': 'inside',
-                'marker': {
-                    'colors': ['#f0f5bc', '#d2b4ed']
-                }
-            }
-        ],
-        'layout': {
-            'title': 'Month 4 ROI',  # Replace with actual title
-            'margin': {'top': 20, 'right': 20, 'bottom': 20, 'left': 20},
-            'fontWeight': 'bold',
-            'fontFamily': 'Forum',
-            'legend': {'orientation': 'horizontal', 'yanchor': 'top', 'xanchor': 'center'}
-        }
+# Export links carry the dataset, current filters, ranges, table sort and column filters; built in the browser
+# from the same inputs as the dashboard callback, so exporting needs no extra request until clicked
+app.clientside_callback(
+    """
+    function(values, lows, highs, start_date, end_date, sort_by, filter_query, actuals, dataset) {
+        const inputs = dash_clientside.callback_context.inputs_list;
+        const filters = {}, ranges = {};
+        inputs[0].forEach(item => { if (item.value && item.value.length !== 0) { filters[item.id.column] = item.value; } });
+        if (start_date || end_date) { ranges['Date'] = [start_date || null, end_date || null]; }
+        inputs[1].forEach((item, i) => {
+            const low = item.value ?? null, high = inputs[2][i].value ?? null;
+            if (low !== null || high !== null) { ranges[item.id.column] = [low, high]; }
+        });
+        const state = encodeURIComponent(JSON.stringify({filters: filters, ranges: ranges, sort_by: sort_by || [],
+                                                         filter_query: filter_query || '', actuals: (actuals || []).length > 0,
+                                                         dataset: dataset || null}));
+        return ['/export?format=csv&state=' + state, '/export?format=parquet&state=' + state];
     }
-
-# Month 5 donut graph callback
-@app.callback(
-    Output('month5-donut-graph', 'figure'),
-    [Input('table', 'data'),
-     Input('table', 'data_timestamp')]  # Input from table update callback
+    """,
+    [Output('export-csv', 'href'),
+     Output('export-parquet', 'href')],
+    [Input(filter_id(ALL), 'value'),
+     Input(range_id(ALL, 'min'), 'value'),
+     Input(range_id(ALL, 'max'), 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('table', 'sort_by'),
+     Input('table', 'filter_query'),
+     Input('export-actuals', 'value'),
+     Input('dataset-name', 'value')]
 )
-def update_month5_donut_graph(filtered_data, data_timestamp):
-    if not filtered_data:  # Handle empty data case
-        return {}
-
-    # Extract filtered DataFrame from the callback context
-    filtered_df = pd.DataFrame(filtered_data)
 
-    # Calculate the percentage for the metric
-    if len(filtered_df) > 0:
-        metric_percentage = (filtered_df['Month 5 (P)'] / filtered_df['ECPA'] > 1).sum() / len(filtered_df) * 100
-    else:
-        metric_percentage = 0
+# ROI donuts: graph id, predicted column, title and hit/miss colours
+ROI_DONUTS = [('day1-donut-graph', 'Day 1', 'Day 1 ROI', ['#f5c26b', '#a9d6e5']),
+              ('week1-donut-graph', 'Week 1', 'Week 1 ROI', ['#c6e2a5', '#e5b3d3']),
+              ('month3-donut-graph', 'Month 3 (P)', 'Month 3 ROI', ['#fdae61', '#abcaf0']),
+              ('month4-donut-graph', 'Month 4 (P)', 'Month 4 ROI', ['#f0f5bc', '#d2b4ed']),
+              ('month5-donut-graph', 'Month 5 (P)', 'Month 5 ROI', ['#ebc0b0', '#b7ebe6']),
+              ('month6-donut-graph', 'Month 6 (P)', 'Month 6 ROI', ['#beebbe', '#ebbcbc'])]
 
-    # Create donut chart figure
+# Create donut chart figure
+def roi_donut_figure(title, metric_percentage, colors):
     return {
         'data': [
             {
@@ -473,12 +598,12 @@ def update_month5_donut_graph(filtered_data, data_timestamp):
                 'fontFamily': 'Forum',
                 'textposition': 'inside',
                 'marker': {
-                    'colors': ['#ebc0b0', '#b7ebe6']
+                    'colors': colors
                 }
             }
         ],
         'layout': {
-            'title': 'Month 5 ROI',  # Replace with actual title
+            'title': title,
             'margin': {'top': 20, 'right': 20, 'bottom': 20, 'left': 20},
             'fontWeight': 'bold',
             'fontFamily': 'Forum',
@@ -486,68 +611,222 @@ def update_month5_donut_graph(filtered_data, data_timestamp):
         }
     }
 
-# Month 6 donut graph callback
+# Visible table page for the filter selections, ranges, sorting and column filters
+def table_page(backend, filters, page_current, page_size, sort_by, filter_query, ranges=None):
+    def compute():
+        records, total, count, current = backend.table_page(filter_rows(backend, *filters, ranges), filter_query, sort_by, page_current, page_size)
+        return records, count, current, f'{total:,} rows'
+
+    return results.get_or_compute('table', backend.version, [filters, page_current, page_size, sort_by, filter_query, ranges], compute)
+
+# Every ROI donut from one aggregation over the selected rows
+def roi_donuts(backend, filters, ranges=None):
+    def compute():
+        percentages = backend.hit_rates(filter_rows(backend, *filters, ranges))
+        if percentages is None:  # Handle empty data case
+            return [{}] * len(ROI_DONUTS)
+        return [roi_donut_figure(title, percentages[col], colors) for _, col, title, colors in ROI_DONUTS]
+
+    return results.get_or_compute('roi-donuts', backend.version, [filters, ranges], compute)
+
+# Percentage of the selected rows hitting ROI per horizon, None when nothing is selected
+def hit_rates(backend, filters, ranges):
+    return results.get_or_compute('hit-rates', backend.version, [filters, ranges],
+                                  lambda: backend.hit_rates(filter_rows(backend, *filters, ranges)))
+
+# ROI hit rates of the selection in the selected dataset next to another one (e.g. two model runs),
+# loaded on first use; empty without one
+def roi_comparison(backend, compare, filters, ranges):
+    if compare not in datasets.sources:
+        return []
+    ours, theirs = hit_rates(backend, filters, ranges), hit_rates(datasets.get(compare).current(), filters, ranges)
+    records = []
+    for _, col, title, _ in ROI_DONUTS:
+        selected = None if ours is None else round(float(ours[col]), 2)
+        compared = None if theirs is None else round(float(theirs[col]), 2)
+        records.append({'Horizon': title, 'Selected dataset %': selected, 'Compared dataset %': compared,
+                        'Difference (pts)': None if selected is None or compared is None else round(selected - compared, 2)})
+    return records
+
+# MAE, RMSE, MAPE and bias per horizon for the selection, grouped by a filter column when one is chosen
+def accuracy_table(backend, filters, ranges, group_column):
+    return results.get_or_compute('accuracy', backend.version, [filters, ranges, group_column],
+                                  lambda: accuracy_records(backend.accuracy(filters, ranges, group_column), group_column))
+
+# Stop a dashboard request before its next stage once a newer one from the same tab has arrived: the
+# browser only applies the latest response, so the rest would be computed for nothing. Results already
+# being computed are finished, since other requests may be waiting on them.
+def stop_if_superseded(session, token, stage):
+    if latest_requests.superseded(session, token):
+        metrics.count('dash_requests_superseded_total', stage=stage)
+        raise PreventUpdate
+
+# Month trend charts of one predicted horizon for the selection. The rollup (the biggest series of the
+# breakdown plus 'Other') is cached without the horizon, so switching horizons only redraws the lines.
+def trend_charts(backend, filters, ranges, dimension, horizon):
+    def compute():
+        months, series = backend.trends(filters, ranges, dimension)
+        return months, top_series(series)
+
+    months, series = results.get_or_compute('trends', backend.version, [filters, ranges, dimension], compute)
+    return trend_figures(months, series, horizon if horizon in ROI_HORIZONS else TREND_HORIZON, dimension)
+
+# Top k groups of the selection by a metric of one predicted horizon; unknown control values fall back
+# to the defaults and k is kept within 1..MAX_K
+def leaderboard_table(backend, filters, ranges, group, metric, horizon, order, k):
+    group_columns = LEADERBOARD_GROUPS.get(group, LEADERBOARD_GROUPS['Affiliate_ID'])
+    metric = metric if metric in LEADERBOARD_METRICS else 'roi'
+    horizon = horizon if horizon in ROI_HORIZONS else TREND_HORIZON
+    k = min(max(int(k), 1), MAX_K) if isinstance(k, (int, float)) else LEADERBOARD_K
+    lowest = order == 'lowest'
+    return results.get_or_compute('leaderboard', backend.version, [filters, ranges, group_columns, metric, horizon, k, lowest],
+                                  lambda: leaderboard_records(backend.leaderboard(filters, ranges, group_columns, horizon, metric, k, lowest),
+                                                              group_columns))
+
+# Table properties that only change the visible page, and trend, leaderboard and comparison controls that only change their own outputs
+TABLE_PROPS = {'table.page_current', 'table.page_size', 'table.sort_by', 'table.filter_query'}
+TREND_PROPS = {'trend-dimension.value', 'trend-horizon.value'}
+LEADERBOARD_PROPS = {'leaderboard-group.value', 'leaderboard-metric.value', 'leaderboard-horizon.value', 'leaderboard-order.value',
+                     'leaderboard-k.value'}
+COMPARE_PROPS = {'compare-dataset.value'}
+
+# Inputs of every part of the dashboard, sent back to the browser with the outputs they rendered. A
+# narrow update is only safe when the browser shows the other parts for the current inputs, which Dash
+# does not promise: once a newer request for this callback is sent, the renderer drops the response of
+# the one still in flight, so e.g. a table sort sent before a filter change has come back would leave
+# every output but the table on the old filters. Dropped responses never update the stored state.
+def dashboard_state(filters, ranges, table, group_column, trends, leaders, compare, version, name):
+    return {'filters': filters, 'ranges': ranges, 'table': list(table), 'accuracy': group_column, 'trends': list(trends),
+            'leaderboard': list(leaders), 'compare': compare, 'dataset': [name, version]}
+
+# True when every part of the rendered state but the given ones matches the current inputs
+def rendered_except(rendered, state, *parts):
+    return isinstance(rendered, dict) and all(rendered.get(part) == value for part, value in state.items() if part not in parts)
+
+# Callback for the whole dashboard: one request per interaction returns the cascaded dropdown options
+# (each column's options depend on the selections before it), the table page, the ROI donuts, the
+# accuracy table, the trend charts, the leaderboard and the ROI comparison, all from the selected dataset
+# (switching it publishes its version, which reruns everything). Paging, sorting and column filters only
+# change the table, the accuracy grouping only the accuracy table, and the trend, leaderboard and
+# comparison controls only their own outputs, so the other outputs are left alone then, as long as the
+# browser shows them for the current inputs (see dashboard_state); otherwise everything is rendered.
 @app.callback(
-    Output('month6-donut-graph', 'figure'),
-    [Input('table', 'data'),
-     Input('table', 'data_timestamp')]  # Input from table update callback
+    [Output(filter_id(ALL), 'options'),
+     Output('table', 'data'),
+     Output('table', 'page_count'),
+     Output('table', 'page_current'),
+     Output('table-row-count', 'children')] +
+    [Output(graph_id, 'figure') for graph_id, _, _, _ in ROI_DONUTS] +
+    [Output('accuracy-table', 'data'),
+     Output('trend-value-graph', 'figure'),
+     Output('trend-roi-graph', 'figure'),
+     Output('leaderboard-table', 'data'),
+     Output('compare-table', 'data'),
+     Output('dashboard-rendered', 'data')],
+    [Input(filter_id(ALL), 'value'),
+     Input(range_id(ALL, 'min'), 'value'),
+     Input(range_id(ALL, 'max'), 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('table', 'page_current'),
+     Input('table', 'page_size'),
+     Input('table', 'sort_by'),
+     Input('table', 'filter_query'),
+     Input('accuracy-group', 'value'),
+     Input('trend-dimension', 'value'),
+     Input('trend-horizon', 'value'),
+     Input('leaderboard-group', 'value'),
+     Input('leaderboard-metric', 'value'),
+     Input('leaderboard-horizon', 'value'),
+     Input('leaderboard-order', 'value'),
+     Input('leaderboard-k', 'value'),
+     Input('compare-dataset', 'value'),
+     Input('dataset-version', 'data')],
+    [State('dataset-name', 'value'),
+     State('dashboard-rendered', 'data'),
+     State('session-id', 'data')]
 )
-def update_month6_donut_graph(filtered_data, data_timestamp):
-    if not filtered_data:  # Handle empty data case
-        return {}
-
-    # Extract filtered DataFrame from the callback context
-    filtered_df = pd.DataFrame(filtered_data)
-
-    # Calculate the percentage for the metric
-    if len(filtered_df) > 0:
-        metric_percentage = (filtered_df['Month 6 (P)'] / filtered_df['ECPA'] > 1).sum() / len(filtered_df) * 100
-    else:
-        metric_percentage = 0
-
-    # Create donut chart figure
-    return {
-        'data': [
-            {
-                'values': [metric_percentage, 100 - metric_percentage],
-                'labels': ['Hit ROI', 'Missed ROI'],
-                'type': 'pie',
-                'hole': 0.4,
-                'textinfo': 'label+percent',
-                'fontWeight': 'bold',
-                'fontFamily': 'Forum',
-                'textposition': 'inside',
-                'marker': {
-                    'colors': ['#beebbe', '#ebbcbc']
-                }
-            }
-        ],
-        'layout': {
-            'title': 'Month 6 ROI',  # Replace with actual title
-            'margin': {'top': 20, 'right': 20, 'bottom': 20, 'left': 20},
-            'fontWeight': 'bold',
-            'fontFamily': 'Forum',
-            'legend': {'orientation': 'horizontal', 'yanchor': 'top', 'xanchor': 'center'}
-        }
-    }
-
-# Callback to clear all filter dropdowns
+def update_dashboard(values, lows, highs, start_date, end_date, page_current, page_size, sort_by, filter_query, group_column,
+                     dimension, horizon, leader_group, leader_metric, leader_horizon, leader_order, leader_k, compare, version, name,
+                     rendered, session):
+    token = latest_requests.start(session)
+    backend = datasets.get(name).current()
+    selections = {item['id']['column']: item.get('value') for item in ctx.inputs_list[0]}
+    filters = [selections.get(col) for col in FILTER_COLUMNS]
+    ranges = selected_ranges(start_date, end_date)
+    leaders = (leader_group, leader_metric, leader_horizon, leader_order, leader_k)
+    state = dashboard_state(filters, ranges, (page_current, page_size, sort_by, filter_query), group_column, (dimension, horizon),
+                            leaders, compare, version, name)
+
+    triggered = set(ctx.triggered_prop_ids)
+    if triggered == {'accuracy-group.value'} and rendered_except(rendered, state, 'accuracy'):
+        return [[no_update] * len(values)] + [no_update] * (4 + len(ROI_DONUTS)) + [accuracy_table(backend, filters, ranges, group_column)] + [no_update] * 4 + [state]
+    if triggered and triggered <= TREND_PROPS and rendered_except(rendered, state, 'trends'):
+        return [[no_update] * len(values)] + [no_update] * (5 + len(ROI_DONUTS)) + trend_charts(backend, filters, ranges, dimension, horizon) + [no_update] * 2 + [state]
+    if triggered and triggered <= LEADERBOARD_PROPS and rendered_except(rendered, state, 'leaderboard'):
+        return [[no_update] * len(values)] + [no_update] * (7 + len(ROI_DONUTS)) + [leaderboard_table(backend, filters, ranges, *leaders), no_update, state]
+    if triggered and triggered <= COMPARE_PROPS and rendered_except(rendered, state, 'compare'):
+        return [[no_update] * len(values)] + [no_update] * (8 + len(ROI_DONUTS)) + [roi_comparison(backend, compare, filters, ranges), state]
+
+    table = table_page(backend, filters, page_current, page_size, sort_by, filter_query, ranges)
+    state['table'][0] = table[2]  # the page shown, which the browser sends back as page_current
+    if triggered and triggered <= TABLE_PROPS and rendered_except(rendered, state, 'table'):
+        return [[no_update] * len(values), *table] + [no_update] * (len(ROI_DONUTS) + 5) + [state]
+
+    options = []
+    for item in ctx.outputs_list[0]:
+        stop_if_superseded(session, token, 'options')
+        options.append(facet_options(backend, filters[:FILTER_COLUMNS.index(item['id']['column'])], ranges))
+    stop_if_superseded(session, token, 'donuts')
+    donuts = roi_donuts(backend, filters, ranges)
+    stop_if_superseded(session, token, 'accuracy')
+    accuracy = accuracy_table(backend, filters, ranges, group_column)
+    stop_if_superseded(session, token, 'trends')
+    charts = trend_charts(backend, filters, ranges, dimension, horizon)
+    stop_if_superseded(session, token, 'leaderboard')
+    leaderboard = leaderboard_table(backend, filters, ranges, *leaders)
+    stop_if_superseded(session, token, 'comparison')
+    return [options, *table] + donuts + [accuracy] + charts + [leaderboard, roi_comparison(backend, compare, filters, ranges), state]
+
+# Callback to publish the active dataset version; dependent callbacks only rerun when it changes
 @app.callback(
-    [Output('month-dropdown', 'value'),
-     Output('date-dropdown', 'value'),
-     Output('country-dropdown', 'value'),
-     Output('gateway-dropdown', 'value'),
-     Output('telco-dropdown', 'value'),
-     Output('shortcode-dropdown', 'value'),
-     Output('keyword-dropdown', 'value'),
-     Output('offer-id-dropdown', 'value'),
-     Output('affiliate-id-dropdown', 'value')],
-    [Input('clear-filters-button', 'n_clicks')]
+    [Output('dataset-version', 'data'),
+     Output('dataset-status', 'children')],
+    [Input('dataset-poll', 'n_intervals'),
+     Input('dataset-name', 'value')],
+    [State('dataset-version', 'data')]
 )
-def clear_filters(n_clicks):
-    if n_clicks:
-        return '', '', '', '', '', '', '', '', ''
-    return ('', '', '', '', '', '', '', '', '')
+def update_dataset_version(n_intervals, name, version):
+    snapshot = datasets.get(name).current()
+    return (no_update if snapshot.version == version else snapshot.version), snapshot.describe()
+
+# The dashboard as a new tab first asks for it: no selections, every control at its default
+def initial_dashboard():
+    backend = datasets.get().current()
+    filters, ranges = [None] * len(FILTER_COLUMNS), {}
+    for i in range(len(FILTER_COLUMNS)):
+        facet_options(backend, filters[:i], ranges)
+    table_page(backend, filters, 0, TABLE_PAGE_SIZE, [], '', ranges)
+    roi_donuts(backend, filters, ranges)
+    accuracy_table(backend, filters, ranges, None)
+    trend_charts(backend, filters, ranges, None, TREND_HORIZON)
+    leaderboard_table(backend, filters, ranges, 'Affiliate_ID', 'roi', TREND_HORIZON, 'highest', LEADERBOARD_K)
+
+# Importing the app only builds the layout, so the server binds and serves the page shell at once; the
+# default dataset is loaded and the first dashboard computed into the result cache in the background.
+# Every gunicorn worker starts its warm-up once forked (gunicorn.conf.py), other servers on their first request.
+warmup = WarmUp([(f'load dataset {datasets.default}', datasets.get), ('compute initial dashboard', initial_dashboard)],
+                lock_path=os.path.join(cache_root, 'warmup.lock'))
+
+@server.before_request
+def start_warm_up():
+    warmup.start()
+
+# Warm-up progress of the worker serving the request: 200 once it is ready, 503 until then (or after a step failed)
+@server.route('/ready')
+def ready():
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 if __name__ == '__main__':
     app.run_server(debug=True)
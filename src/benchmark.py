@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from dash._utils import to_json
+
+import app
+from dataset import load_dataset
+from dataset_manager import Snapshot, build_snapshot
+from filter_index import FILTER_COLUMNS
+from result_cache import ResultCache
+from sqlite_backend import SqliteDataset
+from synthetic import SyntheticResults, parse_rows, synthetic_path
+
+# Saved runs, compared against with --compare
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+# A benchmark slower than its baseline by more than this fraction, and by more than MIN_DELTA_MS
+# (sub-millisecond timings jitter by more than any tolerance), is reported as a regression
+TOLERANCE = 0.25
+MIN_DELTA_MS = 0.5
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+# Selection paths of `depth` levels taken from random rows, so every case matches at least one row. Backends
+# without the rows in memory walk down the cascade instead, picking each value weighted by its row count.
+def sample_paths(backend, depth, count, rng):
+    if depth == 0:
+        return [[None] * len(FILTER_COLUMNS)]
+    paths = []
+    if isinstance(backend, Snapshot):
+        for row in rng.integers(len(backend.df), size=count):
+            values = [backend.df[col].iloc[row] for col in FILTER_COLUMNS[:depth]]
+            paths.append([value.item() if hasattr(value, 'item') else value for value in values] + [None] * (len(FILTER_COLUMNS) - depth))
+        return paths
+    for _ in range(count):
+        path = []
+        for _ in range(depth):
+            values, counts = zip(*backend.facet_counts(path))
+            path.append(values[rng.choice(len(values), p=np.array(counts) / sum(counts))])
+        paths.append(path + [None] * (len(FILTER_COLUMNS) - depth))
+    return paths
+
+
+def dashboard_cascade(snapshot, filters, ranges=None):
+    return [app.facet_options(snapshot, filters[:level], ranges) for level in range(len(FILTER_COLUMNS))]
+
+
+# Range filters of the ranges/* benchmarks: one quarter of dates, a band of ECPA, and both with a sales floor
+QUARTER = {'Date': ['2023-01-01', '2023-03-31']}
+ECPA_BAND = {'ECPA': [0.5, 2]}
+QUARTER_SALES = {'Date': ['2023-01-01', '2023-03-31'], 'Total Sales': [100, None]}
+
+
+# name -> (function of (snapshot, filters), selection depth); the table entries carry their own paging,
+# sorting and column-filter arguments. Depths: 0 unfiltered, 1 month, 3 month/date/country, 9 every dropdown
+BENCHMARKS = {
+    'filter_data/month': (lambda s, f: app.filter_data(s, *f), 1),
+    'filter_data/country': (lambda s, f: app.filter_data(s, *f), 3),
+    'filter_data/all': (lambda s, f: app.filter_data(s, *f), 9),
+    'cascade/none': (dashboard_cascade, 0),
+    'cascade/country': (dashboard_cascade, 3),
+    'cascade/all': (dashboard_cascade, 9),
+    'table/first-page': (lambda s, f: app.table_page(s, f, 0, 200, [], ''), 0),
+    'table/sorted': (lambda s, f: app.table_page(s, f, 0, 200, [{'column_id': 'Total Sales', 'direction': 'desc'}], ''), 0),
+    'table/month-multisort': (lambda s, f: app.table_page(s, f, 2, 200, [{'column_id': 'Country', 'direction': 'asc'},
+                                                                          {'column_id': 'ECPA', 'direction': 'desc'}], ''), 1),
+    'table/filter-query': (lambda s, f: app.table_page(s, f, 0, 200, [], '{ECPA} > 1 && {Keyword} contains a'), 0),
+    'donuts/none': (app.roi_donuts, 0),
+    'donuts/month': (app.roi_donuts, 1),
+    'donuts/all': (app.roi_donuts, 9),
+    'accuracy/none': (lambda s, f: app.accuracy_table(s, f, None, None), 0),
+    'accuracy/month-country': (lambda s, f: app.accuracy_table(s, f, None, 'Country'), 1),
+    'accuracy/quarter-date': (lambda s, f: app.accuracy_table(s, f, QUARTER, 'Date'), 0),
+    'accuracy/rows-affiliate': (lambda s, f: app.accuracy_table(s, f, None, 'Affiliate_ID'), 3),
+    'trends/none': (lambda s, f: app.trend_charts(s, f, None, None, 'Month 3 (P)'), 0),
+    'trends/month-telco': (lambda s, f: app.trend_charts(s, f, None, 'Telco', 'Month 3 (P)'), 1),
+    'trends/quarter-keyword': (lambda s, f: app.trend_charts(s, f, QUARTER, 'Keyword', 'Day 1'), 0),
+    'trends/rows-offer': (lambda s, f: app.trend_charts(s, f, None, 'Offer_ID', 'Month 6 (P)'), 3),
+    'leaderboard/affiliates': (lambda s, f: app.leaderboard_table(s, f, None, 'Affiliate_ID', 'roi', 'Month 3 (P)', 'highest', 10), 0),
+    'leaderboard/pairs': (lambda s, f: app.leaderboard_table(s, f, None, 'Affiliate_ID / Offer_ID', 'margin', 'Month 6 (P)', 'highest', 50), 0),
+    'leaderboard/month-offers-lowest': (lambda s, f: app.leaderboard_table(s, f, None, 'Offer_ID', 'roi', 'Day 1', 'lowest', 10), 1),
+    'leaderboard/quarter-pairs': (lambda s, f: app.leaderboard_table(s, f, QUARTER, 'Affiliate_ID / Offer_ID', 'roi', 'Month 3 (P)', 'highest', 100), 0),
+    'ranges/filter-quarter': (lambda s, f: app.filter_data(s, *f, QUARTER), 0),
+    'ranges/filter-month-ecpa': (lambda s, f: app.filter_data(s, *f, ECPA_BAND), 1),
+    'ranges/cascade-ecpa': (lambda s, f: dashboard_cascade(s, f, ECPA_BAND), 3),
+    'ranges/table-qtr-sales': (lambda s, f: app.table_page(s, f, 0, 200, [], '', QUARTER_SALES), 0),
+    'ranges/donuts-qtr-sales': (lambda s, f: app.roi_donuts(s, f, QUARTER_SALES), 0),
+}
+
+
+# p50/p99 latency, peak traced memory and JSON payload size of every benchmark the backend supports
+def run(snapshot, cases, repeat, seed):
+    # Cold paths only: no result cache, and no metrics files written from the benchmark
+    app.results = ResultCache(memory_bytes=0)
+    app.metrics.directory = None
+
+    rng = np.random.default_rng(seed)
+    report = {}
+    for name, (function, depth) in BENCHMARKS.items():
+        if name.startswith(('filter_data/', 'ranges/filter')) and not isinstance(snapshot, Snapshot):
+            continue  # materializes rows in memory, which only the pandas backend does
+        paths = sample_paths(snapshot, depth, cases, rng)
+        function(snapshot, paths[0])  # warm up imports and lazily mapped pages
+
+        timings = []
+        for _ in range(repeat):
+            for filters in paths:
+                start = time.perf_counter()
+                function(snapshot, filters)
+                timings.append(time.perf_counter() - start)
+
+        peak, payload = 0, []
+        for filters in paths[:5]:
+            tracemalloc.start()
+            result = function(snapshot, filters)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            payload.append(len(to_json(result)) if not isinstance(result, pd.DataFrame) else 0)
+
+        report[name] = {'p50_ms': round(percentile(timings, 50), 3), 'p99_ms': round(percentile(timings, 99), 3),
+                        'peak_mb': round(peak / 2**20, 2), 'payload_bytes': int(np.median(payload))}
+        print(f'{name:24} p50 {report[name]["p50_ms"]:9.3f}ms  p99 {report[name]["p99_ms"]:9.3f}ms  '
+              f'peak {report[name]["peak_mb"]:8.2f}MB  payload {report[name]["payload_bytes"]:>9,}B', flush=True)
+    return report
+
+
+# Side-by-side table of two runs; returns the names of benchmarks that got slower than the tolerance allows
+def compare(baseline, current, tolerance=TOLERANCE):
+    print(f'\n{"benchmark":24} {"base p50":>10} {"p50":>10} {"ratio":>7} {"base p99":>10} {"p99":>10} {"peak MB":>15} {"payload":>21}')
+    regressions = []
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            print(f'{name:24} {"-":>10} {result["p50_ms"]:10.3f} {"new":>7}')
+            continue
+        ratio = result['p50_ms'] / base['p50_ms'] if base['p50_ms'] else float('inf')
+        slower = ratio > 1 + tolerance and result['p50_ms'] - base['p50_ms'] > MIN_DELTA_MS
+        if slower:
+            regressions.append(name)
+        print(f'{name:24} {base["p50_ms"]:10.3f} {result["p50_ms"]:10.3f} {ratio:6.2f}x {base["p99_ms"]:10.3f} {result["p99_ms"]:10.3f} '
+              f'{base["peak_mb"]:7.2f}>{result["peak_mb"]:<7.2f} {base["payload_bytes"]:>10,}>{result["payload_bytes"]:<10,}'
+              + ('  REGRESSION' if slower else ''))
+    if baseline['rows'] != current['rows']:
+        print(f'\nNote: baseline has {baseline["rows"]:,} rows, this run {current["rows"]:,}')
+    return regressions
+
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BENCHMARK_DIR, f'{name}.json')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks on a synthetic dataset.')
+    parser.add_argument('rows', type=parse_rows, nargs='?', default=100_000, help='dataset size, e.g. 100k, 1M, 10M')
+    parser.add_argument('--source', help='benchmark this CSV instead of a generated one')
+    parser.add_argument('--backend', choices=['pandas', 'sqlite'], default='pandas')
+    parser.add_argument('--cases', type=int, default=20, help='sampled selections per benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='NAME', help='save the run as benchmarks/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against benchmarks/NAME.json (or a path)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 when a benchmark regressed')
+    args = parser.parse_args()
+
+    source = args.source or synthetic_path(args.rows)
+    if not os.path.exists(source):
+        print(f'Generating {args.rows:,} rows into {source}', flush=True)
+        SyntheticResults(rows=args.rows, seed=args.seed).write(source)
+
+    start = time.perf_counter()
+    if args.backend == 'sqlite':
+        snapshot = SqliteDataset(source).current()
+        rows = snapshot.rows
+    else:
+        data = load_dataset(source)
+        snapshot = build_snapshot(data, 'benchmark', time.perf_counter() - start)
+        rows = len(data)
+    print(f'{rows:,} rows from {source} ({args.backend}), ready in {time.perf_counter() - start:.2f}s\n', flush=True)
+
+    current = {'rows': rows, 'backend': args.backend, 'source': os.path.basename(source), 'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+               'benchmarks': run(snapshot, args.cases, args.repeat, args.seed)}
+
+    if args.save:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        with open(baseline_path(args.save), 'w') as f:
+            json.dump(current, f, indent=1)
+        print(f'\nSaved {baseline_path(args.save)}')
+
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            regressions = compare(json.load(f), current, args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
@@ -0,0 +1,34 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Callback responses smaller than this are sent as they are: they fit a TCP segment or two anyway
+COMPRESS_MIN_BYTES = int(os.environ.get('DNN_COMPRESS_MIN_BYTES', 1400))
+
+# Levels trading CPU per response against bytes on the wire; higher levels barely shrink table JSON further
+GZIP_LEVEL = int(os.environ.get('DNN_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('DNN_BROTLI_QUALITY', 4))
+
+
+# Best encoding the client accepts ('br', 'gzip') or None; q=0 rules an encoding out
+def accepted_encoding(header):
+    accepted = set()
+    for part in (header or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(name.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
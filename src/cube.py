@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS, category_days, in_range, range_bound, selected_values
+
+# Grain of the cubes: the cascade down to Keyword. Offer_ID and Affiliate_ID would make nearly every
+# row its own cell, so selections and groupings on them are summed from the selected rows instead.
+CUBE_COLUMNS = FILTER_COLUMNS[:7]
+
+
+# Sums materialized per distinct CUBE_COLUMNS combination (a cell) at load time, so any selection on
+# those columns, a Date range and groupings by them merge cells instead of rows. Subclasses say what is
+# summed with row_sums(df, rows, groups, size): an (..., size) array of sums over rows (None means all
+# rows) by group number. cells holds each cell's dictionary codes, in first-appearance order like the
+# facet tree.
+class CellCube:
+    def __init__(self, df, index, columns=CUBE_COLUMNS, arrays=None):
+        self.columns = list(columns)
+        self.index = index
+        if arrays is None:
+            codes = self.row_codes(index, 0)
+            cell_of_row = self.cell_ids(codes)
+            size = int(cell_of_row.max(initial=-1)) + 1
+            arrays = {'cells': codes[np.unique(cell_of_row, return_index=True)[1]],
+                      'sums': self.row_sums(df, None, cell_of_row, size),
+                      'counts': np.bincount(cell_of_row, minlength=size)}
+        self.cells = arrays['cells']
+        self.sums = arrays['sums']
+        self.counts = arrays['counts']
+        if 'Date' in self.columns:  # with NaT last, so a blank Date (code -1) is in no range
+            self.days = np.append(category_days(index.columns['Date'].values), np.datetime64('NaT', 'D'))
+        else:
+            self.days = None
+
+    def row_sums(self, df, rows, groups, size):
+        raise NotImplementedError
+
+    def row_codes(self, index, start):
+        return np.column_stack([index.columns[col].codes[start:] for col in self.columns]).astype(np.int32)
+
+    # Cell number of every code row, numbered in first-appearance order
+    def cell_ids(self, codes):
+        return pd.DataFrame(codes).groupby(list(range(len(self.columns))), sort=False).ngroup().to_numpy()
+
+    # Cube over df whose first `start` rows are the ones summed here: the existing cells keep their
+    # numbers and sums, and only the new rows are grouped and added
+    def extended(self, df, index, start):
+        codes = self.row_codes(index, start)
+        new_ids = self.cell_ids(np.concatenate([self.cells, codes]))[len(self.cells):]  # existing cells stay 0..n - 1
+        size = max(int(new_ids.max(initial=-1)) + 1, len(self.cells))
+        ids, first = np.unique(new_ids, return_index=True)
+        cells = np.concatenate([self.cells, codes[first[ids >= len(self.cells)]]])
+        sums = self.row_sums(df, np.arange(start, len(df)), new_ids, size)
+        sums[..., :len(self.cells)] += self.sums
+        counts = np.bincount(new_ids, minlength=size)
+        counts[:len(self.cells)] += self.counts
+        return type(self)(df, index, self.columns, arrays={'cells': cells, 'sums': sums, 'counts': counts})
+
+    def arrays(self):
+        return {'cells': self.cells, 'sums': self.sums, 'counts': self.counts}
+
+    # Whether the cells can answer a query: every selection, range and grouping (None for none) uses cube columns
+    def covers(self, filters, ranges, *group_columns):
+        if any(col is not None and col not in self.columns for col in group_columns):
+            return False
+        if any(selected_values(value) is not None for col, value in zip(FILTER_COLUMNS, filters) if col not in self.columns):
+            return False
+        return all(col == 'Date' and self.days is not None for col, (low, high) in (ranges or {}).items()
+                   if low is not None or high is not None)
+
+    # Which cells hold the rows a covered selection would return
+    def kept(self, filters, ranges):
+        keep = np.ones(len(self.cells), dtype=bool)
+        for i, col in enumerate(self.columns):
+            values = selected_values(filters[FILTER_COLUMNS.index(col)])
+            if values is not None:
+                column = self.index.columns[col]
+                keep &= np.isin(self.cells[:, i], [code for code in map(column.code, values) if code is not None])
+        if ranges and 'Date' in ranges:
+            low, high = (range_bound(bound, self.days.dtype) for bound in ranges['Date'])
+            keep &= in_range(self.days[self.cells[:, self.columns.index('Date')]], low, high)
+        return keep
+
+    # Dictionary codes of a cube column for every cell
+    def codes(self, column):
+        return self.cells[:, self.columns.index(column)].astype(np.int64)
+
+    # (sums, counts) of the kept cells by group number (size groups). Cells left out go to one extra
+    # group that is dropped, so the sums are read in place.
+    def merged(self, keep, groups, size):
+        groups = np.where(keep, groups, size)
+        flat = self.sums.reshape(-1, len(self.cells))
+        sums = np.array([np.bincount(groups, weights=row, minlength=size + 1)[:-1] for row in flat])
+        counts = np.bincount(groups, weights=self.counts, minlength=size + 1)[:-1]
+        return sums.reshape(self.sums.shape[:-1] + (size,)), counts
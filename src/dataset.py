@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS
+
+# Prediction results written by the DNN model
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DNNresults.csv')
+
+# Metric columns stored as float32; Total Sales too, so a blank count is NaN rather than a failed load.
+# Any other column is kept as pandas parsed it.
+METRIC_COLUMNS = ['Total Sales', 'ECPA', 'Day 1', 'Week 1', 'Month 3 (A)', 'Month 3 (P)', 'Month 4 (A)', 'Month 4 (P)',
+                  'Month 5 (A)', 'Month 5 (P)', 'Month 6 (A)', 'Month 6 (P)']
+
+# Bump when the on-disk layout changes so old caches are rebuilt
+CACHE_FORMAT = 3
+
+
+# Cache directory for a source file, e.g. src/.cache/DNNresults.csv/
+def cache_dir(source):
+    return os.path.join(os.path.dirname(os.path.abspath(source)), '.cache', os.path.basename(source))
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Parse the CSV into compact typed columns: categoricals for filters, float32 metrics
+def read_source(source):
+    return type_columns(pd.read_csv(source))
+
+
+def type_columns(data):
+    for col in data.columns:
+        if col in FILTER_COLUMNS:
+            # Converted after parsing so numeric ids such as Shortcode keep integer categories
+            data[col] = data[col].astype('category')
+        elif col in METRIC_COLUMNS:
+            data[col] = data[col].astype(np.float32)
+
+    # Month arrives as e.g. '2023/7'; format it as 'YYYY/MM' once per distinct value, not per row.
+    # Spellings of one month share a category, and blank months (code -1) stay missing
+    months = data['Month'].cat
+    formatted = pd.to_datetime(pd.Series(months.categories), format='mixed').dt.strftime('%Y/%m').to_numpy()
+    categories, inverse = np.unique(formatted.astype(object), return_inverse=True)
+    data['Month'] = pd.Categorical.from_codes(np.append(inverse, -1)[months.codes], categories)
+    return data
+
+
+# New frame with typed rows appended; categoricals gain any new values at the end of their categories,
+# so the codes of existing rows (and every index built on them) stay valid
+def append_rows(data, new):
+    columns = {}
+    for col in data.columns:
+        old_values = data[col]
+        if isinstance(old_values.dtype, pd.CategoricalDtype):
+            categories = old_values.cat.categories
+            new_values = pd.Index(np.asarray(new[col]))
+            if categories.dtype == object and new_values.dtype != object:
+                new_values = new_values.astype(str)  # e.g. a batch whose Keywords all look numeric
+            categories = categories.append(new_values[~new_values.isin(categories) & new_values.notna()].unique())
+            codes = np.concatenate([old_values.cat.codes.to_numpy(), categories.get_indexer(new_values)])
+            columns[col] = pd.Categorical.from_codes(codes.astype(np.min_scalar_type(-len(categories))), categories)
+        else:
+            columns[col] = np.concatenate([old_values.to_numpy(), new[col].to_numpy(dtype=old_values.dtype)])
+    combined = pd.DataFrame(columns, copy=False)
+    combined.attrs.update(source=data.attrs.get('source'))  # in-process only: no sha1, so never shared
+    return combined
+
+
+# Write one .npy file per column (codes for categoricals) plus a manifest describing them
+def write_cache(data, source, stat=None, digest=None):
+    stat = stat or os.stat(source)
+    target = cache_dir(source)
+    tmp = f'{target}.tmp-{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+
+    columns = []
+    for i, col in enumerate(data.columns):
+        series = data[col]
+        entry = {'name': col, 'file': f'{i}.npy'}
+        if series.dtype == object:
+            series = series.astype('category')  # extra text columns: mapped .npy files cannot hold objects
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry['categories'] = series.cat.categories.tolist()
+            np.save(os.path.join(tmp, entry['file']), series.cat.codes.to_numpy())
+        else:
+            np.save(os.path.join(tmp, entry['file']), series.to_numpy())
+        columns.append(entry)
+
+    manifest = {'format': CACHE_FORMAT, 'rows': len(data), 'columns': columns,
+                'source_mtime': stat.st_mtime, 'source_size': stat.st_size,
+                'source_sha1': digest or file_digest(source)}
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    # Swap the finished directory in; readers that lose the race simply fall back to the CSV
+    if os.path.exists(target):
+        shutil.rmtree(target, ignore_errors=True)
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Manifest of a cache that still matches the source, or None when it is missing or stale
+def valid_manifest(source, stat):
+    try:
+        with open(os.path.join(cache_dir(source), 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != CACHE_FORMAT or manifest['source_size'] != stat.st_size:
+        return None
+    if manifest['source_mtime'] != stat.st_mtime:
+        if manifest['source_sha1'] != file_digest(source):
+            return None  # mtime alone changes on a re-copy; only a different hash invalidates
+        # Same content: record the new mtime, so later loads skip hashing again
+        manifest['source_mtime'] = stat.st_mtime
+        write_manifest(cache_dir(source), manifest)
+    return manifest
+
+
+# Replace a cache manifest in one rename; a read-only cache just keeps hashing
+def write_manifest(folder, manifest):
+    tmp = os.path.join(folder, f'manifest.json.tmp-{os.getpid()}')
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(folder, 'manifest.json'))
+    except OSError:
+        pass
+
+
+# Columns are memory-mapped read-only, so every process loading the same cache shares one copy in the page cache
+def read_cache(source, manifest):
+    folder = cache_dir(source)
+    data = {}
+    for entry in manifest['columns']:
+        values = np.load(os.path.join(folder, entry['file']), mmap_mode='r')
+        if 'categories' in entry:
+            data[entry['name']] = pd.Categorical.from_codes(values, entry['categories'])  # keeps the mapped codes
+        else:
+            data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+# Load the dataset from its binary cache, rebuilding the cache from the CSV when it is missing or stale
+def load_dataset(source=SOURCE_PATH, use_cache=True):
+    if not use_cache:
+        return read_source(source)
+
+    stat = os.stat(source)
+    manifest = valid_manifest(source, stat)
+    if manifest is not None:
+        data = read_cache(source, manifest)
+    else:
+        data = read_source(source)
+        manifest = {'source_sha1': file_digest(source)}
+        try:
+            write_cache(data, source, stat, manifest['source_sha1'])
+        except OSError:
+            pass  # read-only deploys keep working from the CSV
+
+    # Remember where the rows came from so index arrays can be shared through the same cache
+    data.attrs.update(source=os.path.abspath(source), sha1=manifest['source_sha1'])
+    return data
+
+
+# Zero-copy column subset that keeps the dataset attrs (data[columns] would copy every block)
+def select_columns(data, columns):
+    subset = pd.DataFrame({col: data[col] for col in columns}, copy=False)
+    subset.attrs.update(data.attrs)
+    return subset
+
+
+# Index arrays saved next to the column cache, or None when missing or built from other data
+def load_arrays(data, name):
+    if 'sha1' not in data.attrs:
+        return None
+    folder = os.path.join(cache_dir(data.attrs['source']), name)
+    try:
+        with open(os.path.join(folder, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest['sha1'] != data.attrs['sha1'] or manifest['rows'] != len(data):
+        return None
+    return {key: np.load(os.path.join(folder, f'{i}.npy'), mmap_mode='r') for i, key in enumerate(manifest['keys'])}
+
+
+def save_arrays(data, name, arrays):
+    folder = os.path.join(cache_dir(data.attrs['source']), name)
+    tmp = f'{folder}.tmp-{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    keys = list(arrays)
+    for i, key in enumerate(keys):
+        np.save(os.path.join(tmp, f'{i}.npy'), np.ascontiguousarray(arrays[key]))
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump({'sha1': data.attrs['sha1'], 'rows': len(data), 'keys': keys}, f)
+    if os.path.exists(folder):
+        shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Build an index over data from memory-mapped arrays when another process (normally the gunicorn
+# master) already built it; otherwise build it here and save its arrays for the processes that follow
+def shared_index(data, name, build):
+    arrays = load_arrays(data, name)
+    if arrays is not None:
+        return build(arrays)
+    index = build(None)
+    if 'sha1' in data.attrs:
+        try:
+            save_arrays(data, name, index.arrays())
+        except OSError:
+            pass
+    return index
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+# Cold-load timing and resident memory for one loader, run in a fresh interpreter by --profile
+def profile_load(source, mode):
+    before = rss_mb()
+    start = time.perf_counter()
+    data = load_dataset(source, use_cache=(mode == 'cache'))
+    data.sum(numeric_only=True)  # touch every column so mapped pages are counted
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'rows': len(data), 'seconds': round(elapsed, 4),
+                      'rss_mb': round(rss_mb() - before, 1), 'frame_mb': round(data.memory_usage(deep=True).sum() / 2**20, 1)}))
+
+
+if __name__ == '__main__':
+    import argparse
+    import subprocess
+
+    parser = argparse.ArgumentParser(description='Build the binary cache of a prediction results CSV.')
+    parser.add_argument('source', nargs='?', default=SOURCE_PATH)
+    parser.add_argument('--profile', action='store_true', help='compare cold CSV and cache loads in fresh interpreters')
+    parser.add_argument('--load', choices=['csv', 'cache'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load:
+        profile_load(args.source, args.load)
+    else:
+        start = time.perf_counter()
+        write_cache(read_source(args.source), args.source)
+        print(f'Cached {args.source} in {time.perf_counter() - start:.2f}s -> {cache_dir(args.source)}')
+        if args.profile:
+            for mode in ('csv', 'cache'):
+                subprocess.run([sys.executable, os.path.abspath(__file__), args.source, '--load', mode], check=True)
@@ -0,0 +1,270 @@
+import glob
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from accuracy import AccuracyCube, selection_totals
+from dataset import SOURCE_PATH, append_rows, load_dataset, select_columns, shared_index, type_columns
+from facets import FacetTree
+from filter_index import FILTER_COLUMNS, FilterIndex, RangeIndex, SortIndex, intersect, selected_values
+from leaderboard import selection_leaderboard
+from query_backend import QueryBackend
+from roi import RoiFlags
+from table_query import ordered_rows, page_records, query_page
+from trends import TrendCube, selection_trends
+
+logger = logging.getLogger(__name__)
+
+# Columns shown in the results table
+TABLE_COLUMNS = ['Month', 'Date', 'Country', 'New_Gateway', 'Telco', 'Shortcode', 'Keyword', 'Offer_ID', 'Affiliate_ID',
+                 'Total Sales', 'ECPA', 'Day 1', 'Week 1', 'Month 3 (P)', 'Month 4 (P)', 'Month 5 (P)', 'Month 6 (P)']
+
+# Seconds between checks of the source file and the ingest directory (0 turns watching off)
+POLL_SECONDS = float(os.environ.get('DNN_POLL_SECONDS', 15))
+
+# How many recent ingests a snapshot remembers for the status line
+INGEST_HISTORY = 5
+
+# Reads of a source that keeps growing before a load gives up until the next attempt
+LOAD_ATTEMPTS = 3
+
+
+# One immutable version of the dataset with every structure built over it. Callbacks take the current
+# snapshot once and use it throughout, so a swap never changes the data under an in-flight request.
+# Selections are sorted row-id arrays, or None for every row.
+class Snapshot(QueryBackend):
+    def __init__(self, version, df, index, facets, sort, roi, ranges, cube, trend_cube, load_seconds, ingests=()):
+        self.version = version
+        self.df = df  # every column, including the actual values
+        self.df2 = index.df  # table columns
+        self.index = index
+        self.facets = facets
+        self.sort = sort
+        self.roi = roi
+        self.ranges = ranges
+        self.cube = cube
+        self.trend_cube = trend_cube
+        self.load_seconds = load_seconds
+        self.ingests = list(ingests)[-INGEST_HISTORY:]
+
+    def describe(self):
+        text = f'Dataset {self.version} · {len(self.df):,} rows · loaded in {self.load_seconds:.2f}s'
+        if self.ingests:
+            last = self.ingests[-1]
+            text += (f" · last ingest +{last['rows']:,} rows from {last['name']} in {last['seconds']:.2f}s"
+                     f" at {time.strftime('%H:%M:%S', time.localtime(last['at']))}")
+        return text
+
+    # Bytes of the frame (the table columns share its arrays) and of every index, mapped cache files included:
+    # they are resident once queried
+    def memory_bytes(self):
+        parts = [self.index, self.facets, self.sort, self.roi, self.ranges, self.cube, self.trend_cube]
+        return int(self.df.memory_usage(deep=True).sum()) + sum(array.nbytes for part in parts for array in part.arrays().values())
+
+    def select(self, filters, ranges=None, stats=None):
+        conditions = self.index.conditions(dict(zip(FILTER_COLUMNS, filters))) + self.ranges.conditions(ranges)
+        rows = intersect(conditions, stats)
+        if stats is not None:
+            stats.setdefault('scanned', 0)
+            stats['returned'] = len(self.df) if rows is None else len(rows)
+        return rows
+
+    # Single values and no ranges are read straight off the facet tree; otherwise the next column's
+    # codes are counted over the selected rows, which are in row order, so values keep first appearance
+    def facet_counts(self, path, ranges=None):
+        if len(path) >= len(FILTER_COLUMNS) or not all(selected_values(value) for value in path):
+            return []
+        if not ranges and all(not isinstance(value, (list, tuple)) or len(value) == 1 for value in path):
+            return self.facets.children([value[0] if isinstance(value, (list, tuple)) else value for value in path])
+        rows = self.select(list(path) + [None] * (len(FILTER_COLUMNS) - len(path)), ranges)
+        column = self.index.columns[FILTER_COLUMNS[len(path)]]
+        codes = column.codes if rows is None else column.codes[rows]
+        counts = np.bincount(codes.astype(np.int64) + 1, minlength=len(column.values) + 1)  # missing (-1) in slot 0
+        return [(column.values[code] if code >= 0 else None, int(counts[code + 1])) for code in pd.unique(codes)]
+
+    def hit_rates(self, selection):
+        return self.roi.hit_rates(selection)
+
+    # Merged from the accuracy cube when it covers the query, otherwise summed over the selected rows
+    def accuracy(self, filters, ranges=None, group_column=None):
+        if self.cube.covers(filters, ranges, group_column):
+            return self.cube.totals(filters, ranges, group_column)
+        return selection_totals(self.df, self.index, self.select(filters, ranges), group_column)
+
+    # Rolled up from the trend cube when it covers the query, otherwise summed over the selected rows
+    def trends(self, filters, ranges=None, dimension=None):
+        if self.trend_cube.covers(filters, ranges, 'Month', dimension):
+            return self.trend_cube.rollup(filters, ranges, dimension)
+        return selection_trends(self.df, self.index, self.select(filters, ranges), dimension)
+
+    def leaderboard(self, filters, ranges, group_columns, predicted, metric, k, lowest=False):
+        return selection_leaderboard(self.df, self.index, self.select(filters, ranges), group_columns, predicted, metric, k, lowest)
+
+    # Only the ordered row ids (4 bytes a row) and one chunk of values are held at a time
+    def export_chunks(self, selection, filter_query, sort_by, columns, chunk_rows):
+        rows = ordered_rows(self.index, self.sort, selection, filter_query, sort_by)
+        frame = select_columns(self.df, [col for col in columns if col in self.df.columns])
+        total = len(frame) if rows is None else len(rows)
+        for start in range(0, max(total, 1), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows] if rows is None else frame.take(rows[start:start + chunk_rows])
+
+    def table_page(self, selection, filter_query, sort_by, page_current, page_size):
+        page, total, page_count, page_current = query_page(self.index, self.sort, selection, filter_query, sort_by, page_current, page_size)
+        return page_records(page), total, page_count, page_current
+
+
+def build_snapshot(df, version, load_seconds):
+    df2 = select_columns(df, TABLE_COLUMNS)
+    index = shared_index(df2, 'filter-index', lambda arrays: FilterIndex(df2, arrays=arrays))
+    facets = shared_index(df2, 'facets', lambda arrays: FacetTree(index, arrays=arrays))
+    sort = shared_index(df2, 'sort-index', lambda arrays: SortIndex(df2, arrays=arrays))
+    roi = shared_index(df2, 'roi-flags', lambda arrays: RoiFlags(df2, arrays=arrays))
+    ranges = shared_index(df2, 'range-index', lambda arrays: RangeIndex(df2, arrays=arrays))
+    cube = shared_index(df2, 'accuracy-cube', lambda arrays: AccuracyCube(df, index, arrays=arrays))
+    trend_cube = shared_index(df2, 'trend-cube', lambda arrays: TrendCube(df2, index, arrays=arrays))
+    return Snapshot(version, df, index, facets, sort, roi, ranges, cube, trend_cube, load_seconds)
+
+
+# Snapshot with typed rows appended: the filter index, facet tree, ROI flags and cubes only process the new rows
+def extend_snapshot(snapshot, new, version, ingest):
+    start = len(snapshot.df)
+    df = append_rows(snapshot.df, new)
+    df2 = select_columns(df, TABLE_COLUMNS)
+    index = snapshot.index.extended(df2, start)
+    facets = snapshot.facets.extended(index, start)
+    sort = SortIndex(df2)  # dense ranks move when new values arrive, so sort orders are rebuilt
+    roi = snapshot.roi.extended(df2, start)
+    ranges = RangeIndex(df2)  # sorted like the sort index, so also rebuilt
+    cube = snapshot.cube.extended(df, index, start)
+    trend_cube = snapshot.trend_cube.extended(df2, index, start)
+    return Snapshot(version, df, index, facets, sort, roi, ranges, cube, trend_cube, snapshot.load_seconds, snapshot.ingests + [ingest])
+
+
+# Owns the current snapshot and picks up new prediction batches without a restart: rows appended to the
+# source CSV are parsed from the last consumed byte, and *.csv batch files dropped into the ingest
+# directory (write them elsewhere and rename them in) are each ingested once, in name order.
+# Anything else, such as the source being rewritten, triggers a full reload.
+class DatasetManager:
+    def __init__(self, source=SOURCE_PATH, ingest_dir=None, poll_seconds=POLL_SECONDS):
+        self.source = os.path.abspath(source)
+        self.ingest_dir = ingest_dir
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()  # one refresh at a time; readers never wait
+        self.watcher_pid = None
+        self.stopped = threading.Event()
+        self.snapshot = None
+        self.load()
+
+    def current(self):
+        return self.snapshot
+
+    def load(self):
+        with self.lock:
+            start = time.perf_counter()
+            for _ in range(LOAD_ATTEMPTS):
+                stat = os.stat(self.source)
+                df = load_dataset(self.source)
+                if os.stat(self.source).st_size == stat.st_size:
+                    break  # otherwise the file grew while it was read; read it again
+            else:
+                # The frame may hold rows past stat.st_size, which the next refresh would ingest again; the
+                # current snapshot stays, and the next load or poll tries again
+                raise RuntimeError(f'{self.source} grew during each of {LOAD_ATTEMPTS} reads; not loading a partial view')
+
+            with open(self.source, 'rb') as f:
+                self.header = f.readline()
+                f.seek(max(stat.st_size - 4096, 0))
+                self.end_block = f.read(stat.st_size - f.tell())
+            self.base_sha1 = df.attrs.get('sha1', '')
+            self.consumed = stat.st_size
+            self.mtime = stat.st_mtime
+            self.ingested = []
+            self.snapshot = build_snapshot(df, self.version_id(self.consumed, self.ingested), time.perf_counter() - start)
+        self.refresh()  # batches already waiting in the ingest directory
+
+    # Deterministic for the same source content and batches, so every worker agrees on it
+    def version_id(self, consumed, ingested):
+        key = f'{self.base_sha1}|{consumed}|' + '|'.join(ingested)
+        return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+    # Check the source and ingest directory once and swap in a new snapshot if anything changed
+    def refresh(self):
+        stat = os.stat(self.source)
+        if stat.st_size != self.consumed or stat.st_mtime != self.mtime:
+            if stat.st_size < self.consumed or not self.source_prefix_unchanged():
+                logger.info('%s was rewritten, reloading', self.source)
+                self.load()
+                return
+            self.ingest_tail(stat)
+
+        for path in self.pending_batches():
+            self.ingest_batch(path)
+
+    # An append leaves the bytes before the old end alone; compare the last block we consumed
+    def source_prefix_unchanged(self):
+        with open(self.source, 'rb') as f:
+            f.seek(self.consumed - len(self.end_block))
+            return f.read(len(self.end_block)) == self.end_block
+
+    def ingest_tail(self, stat):
+        with open(self.source, 'rb') as f:
+            f.seek(self.consumed)
+            tail = f.read(stat.st_size - self.consumed)
+        complete = tail[:tail.rfind(b'\n') + 1]  # a line still being written waits for the next poll
+        if complete:
+            new = type_columns(pd.read_csv(io.BytesIO(self.header + complete)))
+            self.ingest(new, os.path.basename(self.source), self.consumed + len(complete), self.ingested)
+            self.end_block = (self.end_block + complete)[-4096:]
+        if len(complete) == len(tail):
+            self.mtime = stat.st_mtime
+
+    def pending_batches(self):
+        if not self.ingest_dir or not os.path.isdir(self.ingest_dir):
+            return []
+        done = {entry.split(':')[0] for entry in self.ingested}
+        return [path for path in sorted(glob.glob(os.path.join(self.ingest_dir, '*.csv')))
+                if os.path.basename(path) not in done]
+
+    def ingest_batch(self, path):
+        new = type_columns(pd.read_csv(path))
+        name = os.path.basename(path)
+        self.ingest(new, name, self.consumed, self.ingested + [f'{name}:{os.path.getsize(path)}'])
+
+    # Extend the current snapshot with new rows and swap it in; the consumed state only moves on success
+    def ingest(self, new, name, consumed, ingested):
+        if len(new) == 0:
+            self.consumed, self.ingested = consumed, ingested
+            return
+        with self.lock:
+            start = time.perf_counter()
+            ingest = {'name': name, 'rows': len(new), 'at': time.time()}
+            snapshot = extend_snapshot(self.snapshot, new, self.version_id(consumed, ingested), ingest)
+            ingest['seconds'] = time.perf_counter() - start
+            self.consumed, self.ingested = consumed, ingested
+            self.snapshot = snapshot  # atomic swap; requests already running keep the old snapshot
+        logger.info('Ingested %d rows from %s in %.2fs (version %s)', len(new), name, ingest['seconds'], snapshot.version)
+
+    def poll(self):
+        while not self.stopped.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Dataset refresh failed; keeping version %s', self.snapshot.version)
+
+    # Start polling in this process. Threads do not survive a fork, so each gunicorn worker starts its
+    # own on its first request rather than the preloading master starting one at import.
+    def watch(self):
+        if self.poll_seconds <= 0 or self.watcher_pid == os.getpid():
+            return
+        self.watcher_pid = os.getpid()
+        threading.Thread(target=self.poll, name='dataset-watcher', daemon=True).start()
+
+    # Stop polling, e.g. once the dataset registry has dropped this dataset
+    def close(self):
+        self.stopped.set()
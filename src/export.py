@@ -0,0 +1,102 @@
+import json
+import os
+
+from filter_index import FILTER_COLUMNS, RANGE_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional; CSV always works
+    pyarrow = None
+
+# Rows per streamed chunk, which is also the Parquet row group size
+EXPORT_CHUNK_ROWS = int(os.environ.get('DNN_EXPORT_CHUNK_ROWS', 50_000))
+
+# Actual values the predictions are scored against, added to an export on request
+ACTUAL_COLUMNS = ['Month 3 (A)', 'Month 4 (A)', 'Month 5 (A)', 'Month 6 (A)']
+
+EXPORT_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+# DataTable sort directions
+SORT_DIRECTIONS = ('asc', 'desc')
+
+
+# A dropdown value or range bound as JSON can send it: a string, a number or null
+def scalar(value):
+    return value is None or isinstance(value, (str, int, float))
+
+
+# (filters, ranges, filter_query, sort_by, actuals, dataset) from the JSON state of an export link:
+# {"filters": {column: values}, "ranges": {column: [low, high]}, "filter_query": ..., "sort_by": [...], "actuals": bool,
+# "dataset": name}; dataset is None when not given. Raises ValueError when it is malformed, so the request
+# fails with a 400 before streaming starts rather than in the middle of the file.
+def export_state(text):
+    state = json.loads(text or '{}')
+    if not isinstance(state, dict):
+        raise ValueError('export state must be an object')
+    selections = state.get('filters') or {}
+    ranges = state.get('ranges') or {}
+    if not isinstance(selections, dict) or not isinstance(ranges, dict):
+        raise ValueError('filters and ranges must be objects')
+    for col, values in selections.items():
+        if not (scalar(values) or isinstance(values, list) and all(map(scalar, values))):
+            raise ValueError(f'bad filter for {col}')
+    for col, bounds in ranges.items():
+        if col not in RANGE_COLUMNS or not isinstance(bounds, list) or len(bounds) != 2 or not all(map(scalar, bounds)):
+            raise ValueError(f'bad range for {col}')
+    sort_by = state.get('sort_by') or []
+    if not isinstance(sort_by, list) or not all(isinstance(s, dict) and isinstance(s.get('column_id'), str) and
+                                                s.get('direction') in SORT_DIRECTIONS for s in sort_by):
+        raise ValueError('sort_by must be a DataTable sort_by list')
+    filters = [selections.get(col) for col in FILTER_COLUMNS]
+    dataset = state.get('dataset')
+    if dataset is not None and not isinstance(dataset, str):
+        raise ValueError('dataset must be a name')
+    return filters, ranges or None, str(state.get('filter_query') or ''), sort_by, bool(state.get('actuals')), dataset
+
+
+# CSV text chunk by chunk, with the header on the first (backends yield at least one, possibly empty, chunk)
+def csv_stream(chunks):
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=(i == 0))
+
+
+# Collects what the Parquet writer writes, handed out and dropped after every row group
+class ChunkSink:
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+# Parquet file one row group per chunk: each group is sent as soon as it is written, and the footer last
+def parquet_stream(chunks):
+    sink, writer, schema = ChunkSink(), None, None
+    for chunk in chunks:
+        table = pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
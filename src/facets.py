@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS
+
+
+# (paths x levels) code matrix and row counts from a count Series grouped by every level
+def path_table(grouped):
+    levels = grouped.index.nlevels
+    paths = np.column_stack([grouped.index.get_level_values(level).to_numpy(dtype=np.int64) for level in range(levels)])
+    return paths.reshape(len(grouped), levels), grouped.to_numpy().astype(np.int64)
+
+
+# Prefix tree over the cascade columns (Month -> Date -> ... -> Affiliate_ID) with row counts per node.
+# Stored level by level as flat arrays so it can be mapped from the cache like the other indexes:
+# codes[d] / counts[d] describe the nodes of level d, and the children of node i at level d are
+# nodes offsets[d][i]:offsets[d][i + 1] of level d + 1, in first-appearance order.
+class FacetTree:
+    def __init__(self, index, columns=FILTER_COLUMNS, arrays=None):
+        self.columns = list(columns)
+        self.index = index
+        if arrays is None:
+            arrays = self.build(*self.group_paths(index, 0))
+        self.paths = arrays['paths']
+        self.path_counts = arrays['path_counts']
+        self.codes = [arrays[f'{level}.codes'] for level in range(len(self.columns))]
+        self.counts = [arrays[f'{level}.counts'] for level in range(len(self.columns))]
+        self.offsets = [arrays[f'{level}.offsets'] for level in range(len(self.columns) - 1)]
+
+    # Distinct code paths of rows start: with their row counts; sort=False keeps first-appearance order
+    def group_paths(self, index, start):
+        codes = pd.DataFrame({col: index.columns[col].codes[start:] for col in self.columns})
+        return path_table(codes.groupby(self.columns, sort=False).size())
+
+    # Tree over an index whose first `start` rows are the ones counted here: only the new rows are
+    # grouped, then merged into the existing path table (dictionary codes of old values never change)
+    def extended(self, index, start):
+        new_paths, new_counts = self.group_paths(index, start)
+        merged = pd.DataFrame(np.concatenate([self.paths, new_paths]), columns=self.columns)
+        merged['count'] = np.concatenate([self.path_counts, new_counts])
+        paths, path_counts = path_table(merged.groupby(self.columns, sort=False)['count'].sum())
+        return FacetTree(index, self.columns, arrays=self.build(paths, path_counts))
+
+    def build(self, paths, path_counts):
+        arrays = {'paths': paths, 'path_counts': path_counts}
+        parent = np.zeros(len(paths), dtype=np.int64)  # every path starts under the root
+        for level in range(len(self.columns)):
+            # A node is a distinct (parent node, value) pair; order nodes by parent, then by first path
+            keys = parent * (paths[:, level].max(initial=0) + 2) + (paths[:, level] + 1)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            order = np.lexsort((first, parent[first]))
+            node_of_key = np.empty(len(order), dtype=np.int64)
+            node_of_key[order] = np.arange(len(order))
+            node = node_of_key[inverse]
+
+            arrays[f'{level}.codes'] = paths[first[order], level].astype(np.int32)
+            arrays[f'{level}.counts'] = np.bincount(node, weights=path_counts, minlength=len(order)).astype(np.int64)
+            if level > 0:
+                # Children of each parent are contiguous, so offsets come from the sorted parent ids
+                parents = parent[first[order]]
+                arrays[f'{level - 1}.offsets'] = np.searchsorted(parents, np.arange(len(arrays[f'{level - 1}.codes']) + 1))
+            parent = node
+        return arrays
+
+    def arrays(self):
+        arrays = {'paths': self.paths, 'path_counts': self.path_counts}
+        arrays.update({f'{level}.codes': codes for level, codes in enumerate(self.codes)})
+        arrays.update({f'{level}.counts': counts for level, counts in enumerate(self.counts)})
+        arrays.update({f'{level}.offsets': offsets for level, offsets in enumerate(self.offsets)})
+        return arrays
+
+    # (value, row count) pairs below a path of selections; empty if any selection is missing or unknown
+    def children(self, path):
+        start, end = 0, len(self.codes[0])
+        for level, value in enumerate(path):
+            if not value or level >= len(self.offsets):
+                return []
+            code = self.index.columns[self.columns[level]].code(value)
+            if code is None:
+                return []
+            match = np.flatnonzero(self.codes[level][start:end] == code)
+            if len(match) == 0:
+                return []
+            node = start + int(match[0])
+            start, end = int(self.offsets[level][node]), int(self.offsets[level][node + 1])
+
+        level = len(path)
+        values = self.index.columns[self.columns[level]].values
+        return [(values[code] if code >= 0 else None, count)
+                for code, count in zip(self.codes[level][start:end].tolist(), self.counts[level][start:end].tolist())]
@@ -0,0 +1,297 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+# Columns the dashboard filters on, in cascade order
+FILTER_COLUMNS = ['Month', 'Date', 'Country', 'New_Gateway', 'Telco', 'Shortcode', 'Keyword', 'Offer_ID', 'Affiliate_ID']
+
+# Columns filtered by an inclusive [low, high] range (None for an open end); Date bounds are 'YYYY-MM-DD' days
+RANGE_COLUMNS = ['Date', 'ECPA', 'Total Sales', 'Month 3 (P)', 'Month 4 (P)', 'Month 5 (P)', 'Month 6 (P)']
+
+# How Date is written in the source, e.g. 7/17/2023
+DATE_FORMAT = '%m/%d/%Y'
+
+
+# Label of a blank filter value (None) where results are grouped by a filter column
+BLANK_LABEL = '(blank)'
+
+
+# Sort key placing a blank value (None) before every other value, as SQLite orders NULL
+def missing_first(value):
+    return value is not None, value
+
+
+# Dropdown value as a list of selected values, or None when nothing is selected ('', None or [])
+def selected_values(value):
+    if isinstance(value, (list, tuple)):
+        return list(value) or None
+    return [value] if value else None
+
+
+# Distinct Date values as datetime64 days (NaT when unparseable)
+def category_days(values):
+    return pd.to_datetime(pd.Series(values, dtype=object), format=DATE_FORMAT, errors='coerce').to_numpy().astype('datetime64[D]')
+
+
+# Date column as datetime64 days, parsing each distinct date once
+def date_days(series):
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    days = category_days(series.cat.categories)
+    codes = series.cat.codes.to_numpy()
+    return np.where(codes >= 0, days[codes], np.datetime64('NaT'))
+
+
+# Range bound typed for comparison with a column of `dtype`, or None for an open or unreadable end.
+# Dates become datetime64 days; float32 metrics compare in float32, as pandas does
+def range_bound(value, dtype):
+    if value is None or value == '':
+        return None
+    try:
+        if np.issubdtype(dtype, np.datetime64):
+            return np.datetime64(str(value)[:10], 'D')
+        return dtype.type(value) if np.issubdtype(dtype, np.floating) else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Sorted row ids matching every condition, or None when there are none. A condition is a (row count,
+# rows(), keep(rows)) triple: the smallest one is materialized and the others probed on its rows only,
+# so the work is bounded by the smallest selection rather than the dataset. stats, when given,
+# receives the number of row ids read ('scanned').
+def intersect(conditions, stats=None):
+    if not conditions:
+        return None
+    conditions = sorted(conditions, key=lambda condition: condition[0])
+    rows = conditions[0][1]()
+    scanned = len(rows)
+    for _, _, keep in conditions[1:]:
+        if len(rows) == 0:
+            break
+        scanned += len(rows)  # one probe per remaining row
+        rows = rows[keep(rows)]
+    if stats is not None:
+        stats['scanned'] = scanned
+    return rows
+
+
+# Dictionary-encoded column with a sorted row-id list per distinct value
+class ColumnIndex:
+    def __init__(self, series, row_ids=None, offsets=None):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            self.codes, uniques = series.cat.codes.to_numpy(), series.cat.categories  # already encoded
+        else:
+            codes, uniques = pd.factorize(series.to_numpy())
+            self.codes = codes.astype(np.int32)
+        self.values = uniques.tolist()
+        self.lookup = {value: code for code, value in enumerate(self.values)}
+
+        if row_ids is None:
+            # One stable argsort groups the row ids of each value together, still in row order
+            row_ids = np.argsort(self.codes, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(self.codes[row_ids], np.arange(len(self.values) + 1))
+        self.row_ids = row_ids
+        self.offsets = offsets
+
+    # Row-id lists for series whose first `start` rows are the ones indexed here: the old lists are
+    # moved over as they are and only the new rows are sorted
+    def extended_arrays(self, series, start):
+        codes = series.cat.codes.to_numpy() if isinstance(series.dtype, pd.CategoricalDtype) else pd.factorize(series.to_numpy())[0]
+        groups = len(series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else self.values) + 1
+        new_codes = codes[start:].astype(np.int64) + 1  # shifted so missing values (-1) form group 0
+
+        old_bounds = np.concatenate([[0], self.offsets])
+        old_bounds = np.concatenate([old_bounds, np.repeat(old_bounds[-1], groups + 1 - len(old_bounds))])
+        old_counts = np.diff(old_bounds)
+        new_counts = np.bincount(new_codes, minlength=groups)
+        bounds = np.concatenate([[0], np.cumsum(old_counts + new_counts)])
+
+        row_ids = np.empty(len(codes), dtype=np.int32)
+        old_groups = np.repeat(np.arange(groups), old_counts)
+        row_ids[np.arange(start) - old_bounds[old_groups] + bounds[old_groups]] = self.row_ids
+
+        order = np.argsort(new_codes, kind='stable')
+        sorted_groups = new_codes[order]
+        rank_in_group = np.arange(len(order)) - (np.cumsum(new_counts) - new_counts)[sorted_groups]
+        row_ids[bounds[sorted_groups] + old_counts[sorted_groups] + rank_in_group] = order + start
+        return row_ids, bounds[1:]
+
+    def code(self, value):
+        try:
+            return self.lookup.get(value)
+        except TypeError:  # unhashable selection never matches
+            return None
+
+    def count(self, code):
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+    def rows(self, code):
+        return self.row_ids[self.offsets[code]:self.offsets[code + 1]]
+
+    # Condition (see intersect) for rows holding any of the given codes; the row-id lists of several
+    # values are merged into one sorted list
+    def condition(self, codes):
+        if len(codes) == 1:
+            code = codes[0]
+            return self.count(code), lambda: self.rows(code), lambda rows: self.codes[rows] == code
+        count = sum(self.count(code) for code in codes)
+        return (count, lambda: np.sort(np.concatenate([self.rows(code) for code in codes] or [np.empty(0, dtype=np.int32)])),
+                lambda rows: np.isin(self.codes[rows], codes))
+
+
+# Inverted index over the filter columns, built once at load time
+class FilterIndex:
+    def __init__(self, df, columns=FILTER_COLUMNS, arrays=None):
+        self.df = df
+        if arrays is None:
+            self.columns = {col: ColumnIndex(df[col]) for col in columns}
+        else:
+            self.columns = {col: ColumnIndex(df[col], arrays[f'{col}.row_ids'], arrays[f'{col}.offsets']) for col in columns}
+
+    # Index over df whose first `start` rows are the ones indexed here (rows appended by an ingest)
+    def extended(self, df, start):
+        arrays = {}
+        for col, index in self.columns.items():
+            arrays[f'{col}.row_ids'], arrays[f'{col}.offsets'] = index.extended_arrays(df[col], start)
+        return FilterIndex(df, list(self.columns), arrays=arrays)
+
+    def arrays(self):
+        arrays = {}
+        for col, index in self.columns.items():
+            arrays[f'{col}.row_ids'] = index.row_ids
+            arrays[f'{col}.offsets'] = index.offsets
+        return arrays
+
+    # Conditions (see intersect) for the non-empty selections; a selection is one value or a list of values
+    def conditions(self, selections):
+        conditions = []
+        for col, value in selections.items():
+            values = selected_values(value)
+            if values is None:
+                continue
+            index = self.columns[col]
+            codes = sorted({code for code in map(index.code, values) if code is not None})
+            conditions.append(index.condition(codes))
+        return conditions
+
+    # Sorted row ids matching every non-empty selection, or None when nothing is selected.
+    # stats, when given, receives the number of row ids read ('scanned')
+    def select(self, selections, stats=None):
+        return intersect(self.conditions(selections), stats)
+
+    # Materialize the selected rows (the frame itself when unfiltered)
+    def take(self, rows):
+        if rows is None:
+            return self.df
+        return self.df.take(rows)
+
+
+# Sorted values and their row ids per range column, built once at load time, so a [low, high] range is
+# the slice between two binary searches. Date is parsed to datetime64 days here, once per distinct date.
+class RangeIndex:
+    def __init__(self, df, columns=RANGE_COLUMNS, arrays=None):
+        self.values = {}
+        self.orders = {}
+        self.sorted = {}
+        for col in columns:
+            if col not in df.columns:
+                continue
+            if arrays is not None:
+                # Metric columns are probed in the frame itself; only the parsed dates are saved
+                self.values[col] = arrays[f'{col}.values'] if col == 'Date' else df[col].to_numpy()
+                self.orders[col] = arrays[f'{col}.order']
+                self.sorted[col] = arrays[f'{col}.sorted']
+                continue
+            values = date_days(df[col]) if col == 'Date' else df[col].to_numpy()
+            self.values[col] = values
+            self.orders[col] = np.argsort(values, kind='stable').astype(np.int32)  # NaN and NaT sort last
+            self.sorted[col] = values[self.orders[col]]
+
+    def arrays(self):
+        arrays = {}
+        for col in self.values:
+            if col == 'Date':
+                arrays[f'{col}.values'] = self.values[col]
+            arrays[f'{col}.order'] = self.orders[col]
+            arrays[f'{col}.sorted'] = self.sorted[col]
+        return arrays
+
+    # Conditions (see intersect) for {column: [low, high]} ranges; open ends and unknown columns are ignored
+    def conditions(self, ranges):
+        conditions = []
+        for col, (low, high) in (ranges or {}).items():
+            if col not in self.values:
+                continue
+            values, ordered = self.values[col], self.sorted[col]
+            low, high = range_bound(low, ordered.dtype), range_bound(high, ordered.dtype)
+            if low is None and high is None:
+                continue
+            start = 0 if low is None else int(np.searchsorted(ordered, low, side='left'))
+            if high is None:
+                end = bisect.bisect_left(ordered, True, key=lambda value: value != value)  # missing values sort last
+            else:
+                end = int(np.searchsorted(ordered, high, side='right'))
+            end = max(end, start)
+            conditions.append((end - start, lambda order=self.orders[col], start=start, end=end: np.sort(order[start:end]),
+                               lambda rows, values=values, low=low, high=high: in_range(values[rows], low, high)))
+        return conditions
+
+
+def in_range(values, low, high):
+    keep = np.ones(len(values), dtype=bool)
+    if low is not None:
+        keep &= values >= low
+    if high is not None:
+        keep &= values <= high
+    return keep
+
+
+# Dense sort rank and ascending argsort per column, built once at load time
+class SortIndex:
+    def __init__(self, df, arrays=None):
+        self.size = len(df)
+        self.ranks = {}
+        self.orders = {}
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+                self.ranks[col] = series.cat.codes.to_numpy()  # sorted categories: the codes are the ranks
+            elif arrays is not None:
+                self.ranks[col] = arrays[f'{col}.rank']
+            else:
+                rank, _ = pd.factorize(series.to_numpy(), sort=True)  # equal values share a rank
+                self.ranks[col] = rank.astype(np.int32)
+            if arrays is not None:
+                self.orders[col] = arrays[f'{col}.order']
+            else:
+                self.orders[col] = np.argsort(self.ranks[col], kind='stable').astype(np.int32)
+
+    def arrays(self):
+        arrays = {f'{col}.rank': rank for col, rank in self.ranks.items()}
+        arrays.update({f'{col}.order': order for col, order in self.orders.items()})
+        return arrays
+
+    # Order rows (None means all rows) by a list of (column, ascending) keys
+    def sort(self, rows, keys):
+        keys = [(col, ascending) for col, ascending in keys if col in self.ranks]
+        if not keys:
+            return rows
+
+        if len(keys) == 1:
+            col, ascending = keys[0]
+            order = self.orders[col]
+            if rows is not None and len(rows) * 16 > self.size:
+                # Large selections: walk the precomputed order and keep the selected rows
+                selected = np.zeros(self.size, dtype=bool)
+                selected[rows] = True
+                order = order[selected[order]]
+            elif rows is not None:
+                order = rows[np.argsort(self.ranks[col][rows], kind='stable')]
+            return order if ascending else order[::-1]
+
+        if rows is None:
+            rows = np.arange(self.size, dtype=np.int32)
+        # np.lexsort treats the last key as the primary one
+        lexkeys = [self.ranks[col][rows] if ascending else -self.ranks[col][rows] for col, ascending in reversed(keys)]
+        return rows[np.lexsort(lexkeys)]
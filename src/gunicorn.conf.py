@@ -0,0 +1,28 @@
+# Gunicorn settings, picked up from the working directory by `gunicorn --chdir src app:server`
+import multiprocessing
+import os
+
+# Import app.py once in the master, which only builds the layout, so the port is bound within the import
+# time; forked workers share its modules. The dataset loads in each worker's warm-up (see post_worker_init):
+# its column cache and index arrays are memory-mapped files, so the workers still share one copy.
+preload_app = True
+
+# The shared dataset makes extra workers cheap, but each still carries its own interpreter and Dash,
+# so the default stays small for the 512 MB free plan; raise WEB_CONCURRENCY on bigger instances
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 2)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = 60
+keepalive = 5
+
+# Recycled workers re-attach to the mapped files rather than re-parsing the CSV
+max_requests = 1000
+max_requests_jitter = 100
+
+
+# Start warming up (loading the dataset, computing the first dashboard) as soon as a worker is forked rather
+# than on its first request; /ready reports the progress
+def post_worker_init(worker):
+    import app
+    app.warmup.start()
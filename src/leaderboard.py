@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import BLANK_LABEL, missing_first
+
+# Groupings the leaderboard ranks: single affiliates or offers, or affiliate and offer pairs
+LEADERBOARD_GROUPS = {'Affiliate_ID': ['Affiliate_ID'], 'Offer_ID': ['Offer_ID'], 'Affiliate_ID / Offer_ID': ['Affiliate_ID', 'Offer_ID']}
+
+# Groups listed by default, and at most
+LEADERBOARD_K = 10
+MAX_K = 500
+
+# Sums per group: rows, sales, spend (sales x ECPA) and predicted revenue (sales x predicted value), the
+# last two over the rows that have both values. A group's predicted ROI is revenue / spend.
+LEADERBOARD_SUMS = ['rows', 'sales', 'spend', 'revenue']
+
+
+# Per-row sales, spend and revenue (LEADERBOARD_SUMS but rows) for one predicted column. Missing values
+# count as nothing, as SQL sums skip NULLs: a blank sales count adds no sales, and a row adds no spend or
+# revenue unless sales, ECPA and the prediction are all there.
+def leaderboard_terms(df, rows, predicted):
+    sales, ecpa, value = (df[col].to_numpy(dtype=float) for col in ('Total Sales', 'ECPA', predicted))
+    if rows is not None:
+        sales, ecpa, value = sales[rows], ecpa[rows], value[rows]
+    spend, revenue = sales * ecpa, sales * value
+    missing = np.isnan(spend) | np.isnan(revenue)
+    spend[missing] = 0
+    revenue[missing] = 0
+    return [np.where(np.isnan(sales), 0, sales), spend, revenue]
+
+
+# Metrics the groups can be ranked by
+LEADERBOARD_METRICS = {'roi': 'Predicted ROI', 'margin': 'Predicted margin', 'revenue': 'Predicted revenue', 'sales': 'Sales'}
+
+
+# Predicted ROI per group, NaN where nothing was spent
+def group_roi(spend, revenue):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(spend > 0, revenue / np.where(spend > 0, spend, 1), np.nan)
+
+
+# Score of every group for one of LEADERBOARD_METRICS; NaN (groups without rows, ROI without spend) is not ranked
+def group_scores(sums, metric, roi):
+    rows, sales, spend, revenue = sums
+    score = {'roi': roi, 'margin': revenue - spend, 'revenue': revenue, 'sales': sales}[metric]
+    return np.where(rows > 0, score, np.nan)
+
+
+# Positions of the best k scores, best first, without sorting every group: argpartition finds the k-th
+# best score, and only the groups at least that good are sorted, ties by key(position), so equal scores
+# at the cut are ranked the same on every backend
+def top_k(scores, key, k, lowest=False):
+    order = np.where(np.isnan(scores), np.inf, scores if lowest else -scores)
+    ranked = np.flatnonzero(np.isfinite(order))
+    if k < len(ranked):
+        cut = order[ranked[np.argpartition(order[ranked], k - 1)[:k]]].max()
+        ranked = ranked[order[ranked] <= cut]
+    return sorted(ranked, key=lambda g: (order[g], key(g)))[:k]
+
+
+# (key, rows, sales, spend, revenue, roi) of the best k groups from their LEADERBOARD_SUMS arrays; ties
+# rank keys holding a blank (None) first, as SQLite orders NULL
+def ranked_groups(key, sums, metric, k, lowest):
+    roi = group_roi(sums[2], sums[3])
+    return [(key(g), int(sums[0][g]), int(sums[1][g]), float(sums[2][g]), float(sums[3][g]), float(roi[g]))
+            for g in top_k(group_scores(sums, metric, roi), lambda g: tuple(map(missing_first, key(g))), k, lowest)]
+
+
+# Leaderboard of the selected rows (None means all rows). Dictionary codes are combined into one number
+# per key: a single column is counted straight into its code slots, pairs are hashed once, and only the
+# keys that are compared or listed are decoded. Codes are shifted by one, so a blank value (code -1)
+# has slot 0 and decodes to None.
+def selection_leaderboard(df, index, rows, group_columns, predicted, metric, k, lowest=False):
+    columns = [index.columns[col] for col in group_columns]
+    combined = np.zeros(len(df) if rows is None else len(rows), dtype=np.int64)
+    for column in columns:
+        combined = combined * (len(column.values) + 1) + (column.codes if rows is None else column.codes[rows]) + 1
+    if len(columns) == 1:
+        groups, numbers = combined, np.arange(len(columns[0].values) + 1)
+    else:
+        groups, numbers = pd.factorize(combined)
+
+    def key(g):
+        number, values = int(numbers[g]), []
+        for column in reversed(columns):
+            number, code = divmod(number, len(column.values) + 1)
+            values.append(column.values[code - 1] if code else None)
+        return tuple(reversed(values))
+
+    sums = [np.bincount(groups, minlength=len(numbers))]
+    sums += [np.bincount(groups, weights=term, minlength=len(numbers)) for term in leaderboard_terms(df, rows, predicted)]
+    return ranked_groups(key, sums, metric, k, lowest)
+
+
+# DataTable records of ranked groups, numbered from 1; the ID columns not grouped by are left empty and
+# blank ids are labelled
+def leaderboard_records(groups, group_columns):
+    records = []
+    for rank, (key, rows, sales, spend, revenue, roi) in enumerate(groups, 1):
+        record = {'Rank': rank, **{col: BLANK_LABEL if value is None else value for col, value in zip(group_columns, key)}, 'Rows': rows, 'Sales': sales, 'Spend': round(spend, 2),
+                  'Predicted revenue': round(revenue, 2), 'Predicted margin': round(revenue - spend, 2)}
+        record['Predicted ROI'] = None if np.isnan(roi) else round(roi, 4)
+        records.append(record)
+    return records
+
+
+# Column names of leaderboard_records, in order
+LEADERBOARD_COLUMNS = ['Rank', 'Affiliate_ID', 'Offer_ID', 'Rows', 'Sales', 'Spend', 'Predicted revenue', 'Predicted margin', 'Predicted ROI']
@@ -0,0 +1,504 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# First port tried for the gunicorn servers started here
+BASE_PORT = 8150
+
+# Dropdowns flicked through in burst mode, and the seconds between the picks sent
+BURST_COLUMNS = ('Month', 'Date')
+BURST_GAP = 0.05
+
+# Controls the session sets that are not filters, so clearing the filters leaves them as they are
+VIEW_CONTROLS = ('accuracy-group.value', 'trend-dimension.value', 'leaderboard-group.value')
+
+# Seconds waited after a run before reading /metrics, so every worker has saved its totals
+METRICS_SETTLE = 2.5
+
+# Seconds a started server may take to bind, and then to warm up every worker
+START_TIMEOUT = 120
+
+# Seconds from starting gunicorn to the first byte of the page shell that --startup aims for
+STARTUP_TTFB_TARGET = float(os.environ.get('STARTUP_TTFB_TARGET', 2.5))
+
+
+# Ids of every component in a /_dash-layout tree
+def layout_ids(node):
+    if isinstance(node, list):
+        return [i for child in node for i in layout_ids(child)]
+    if not isinstance(node, dict):
+        return []
+    ids = []
+    props = node.get('props', {})
+    if 'id' in props:
+        ids.append(props['id'])
+    for value in props.values():
+        if isinstance(value, (dict, list)):
+            ids += layout_ids(value)
+    return ids
+
+
+# Concrete component ids a dependency id stands for: itself, or every layout id an ALL pattern matches
+def expand(dependency_id, ids):
+    if not dependency_id.startswith('{'):
+        return dependency_id
+    pattern = json.loads(dependency_id)
+    return [i for i in ids if isinstance(i, dict) and
+            all(i.get(key) is not None if value == ['ALL'] else i.get(key) == value for key, value in pattern.items())]
+
+
+def id_text(component_id):
+    return json.dumps(component_id, sort_keys=True, separators=(',', ':')) if isinstance(component_id, dict) else component_id
+
+
+# One keep-alive HTTP connection that records (step, seconds, ok) for every request it makes
+class Client:
+    def __init__(self, url, results):
+        self.url = url
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.results = results
+        self.connection = None
+
+    def request(self, step, method, path, body=None, raw=False):
+        start = time.perf_counter()
+        ok, is_json, data = False, False, b''
+        # A kept-alive connection the server has since closed (e.g. a recycled worker) is retried once
+        # on a fresh one, as browsers do
+        for attempt in range(2):
+            reused = self.connection is not None
+            try:
+                if self.connection is None:
+                    self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                ok = response.status in (200, 204)
+                is_json = response.getheader('Content-Type', '').startswith('application/json')
+                break
+            except (OSError, http.client.HTTPException):
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                if not reused:
+                    break
+        self.results.append((step, time.perf_counter() - start, ok))
+        if raw:
+            return data if ok else None
+        return json.loads(data) if ok and is_json and data else None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# Dashboard session built from the app's own layout and callback graph: load the page, pick a value in
+# each filter dropdown from the options the server just returned (month, date, country, ...), narrow the
+# ECPA range, group the accuracy table, break the trends down, rank affiliate / offer pairs, page and
+# sort the table, then clear the filters. Expanding the filters is a clientside callback and sends nothing. With burst > 1 the month and
+# date picks are flicked through: `burst` values are sent BURST_GAP apart without waiting for the
+# responses, as a browser does, and only the last response is used.
+class DashboardSession:
+    def __init__(self, client, layout, dependencies, depth, rng, burst=1):
+        self.client = client
+        self.rng = rng
+        self.depth = depth
+        self.burst = burst
+        self.session = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(16))
+        self.ids = ids = layout_ids(layout)
+        self.dashboard = next(d for d in dependencies if 'table.data' in d['output'])
+        self.poll = next(d for d in dependencies if d['output'].startswith('..dataset-version.data'))
+        self.dropdowns = expand(self.dashboard['inputs'][0]['id'], ids)
+        self.outputs = []
+        for output in self.dashboard['output'].strip('.').split('...'):
+            component, prop = output.rsplit('.', 1)
+            targets = expand(component, ids)
+            self.outputs.append([{'id': i, 'property': prop} for i in targets] if isinstance(targets, list) else {'id': targets, 'property': prop})
+        self.values = {}  # 'id.property' -> value of the filter inputs set so far
+        self.table = {'page_current': 0, 'page_size': 200, 'sort_by': [], 'filter_query': ''}
+        self.version = None
+        self.rendered = None  # dashboard-rendered store, sent back like the browser does
+
+    def body(self, changed):
+        inputs = []
+        for dependency in self.dashboard['inputs']:
+            prop = dependency['property']
+            targets = expand(dependency['id'], self.ids)
+            if isinstance(targets, list):
+                inputs.append([{'id': i, 'property': prop, 'value': self.values.get(f'{id_text(i)}.{prop}')} for i in targets])
+            elif dependency['id'] == 'table':
+                inputs.append({'id': 'table', 'property': prop, 'value': self.table[prop]})
+            elif dependency['id'] == 'dataset-version':
+                inputs.append({'id': dependency['id'], 'property': prop, 'value': self.version})
+            else:
+                inputs.append({'id': dependency['id'], 'property': prop, 'value': self.values.get(f'{dependency["id"]}.{prop}')})
+        state = [{'id': dependency['id'], 'property': dependency['property'],
+                  'value': self.session if dependency['id'] == 'session-id' else self.rendered if dependency['id'] == 'dashboard-rendered'
+                  else self.values.get(f'{dependency["id"]}.{dependency["property"]}')}
+                 for dependency in self.dashboard.get('state', [])]
+        return {'output': self.dashboard['output'], 'outputs': self.outputs, 'inputs': inputs, 'state': state, 'changedPropIds': changed}
+
+    def update(self, step, changed):
+        response = self.client.request(step, 'POST', '/_dash-update-component', self.body(changed))
+        return self.apply((response or {}).get('response', {}))
+
+    # Keep what the browser would from an applied response: the rendered state and the table page shown
+    def apply(self, response):
+        self.rendered = response.get('dashboard-rendered', {}).get('data', self.rendered)
+        self.table['page_current'] = response.get('table', {}).get('page_current', self.table['page_current'])
+        return response
+
+    # Send picks of one dropdown BURST_GAP apart on their own connections; returns the last pick's response
+    def flick(self, step, key, options):
+        picks = self.rng.sample(options, min(self.burst, len(options)))
+        bodies = []
+        for option in picks:
+            self.values[f'{key}.value'] = [option['value']]
+            bodies.append(self.body([f'{key}.value']))
+        clients = [Client(self.client.url, self.client.results) for _ in picks[1:]] + [self.client]
+        responses = [None] * len(picks)
+
+        def send(i):
+            name = step if clients[i] is self.client else 'flicked'
+            responses[i] = clients[i].request(name, 'POST', '/_dash-update-component', bodies[i])
+
+        threads = []
+        for i in range(len(picks)):
+            if i:
+                time.sleep(BURST_GAP)
+            threads.append(threading.Thread(target=send, args=(i,)))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+        for client in clients[:-1]:
+            client.close()
+        return self.apply((responses[-1] or {}).get('response', {}))
+
+    def run(self):
+        for step, path in (('page', '/'), ('layout', '/_dash-layout'), ('dependencies', '/_dash-dependencies')):
+            self.client.request(step, 'GET', path)
+        poll = self.client.request('poll', 'POST', '/_dash-update-component', {
+            'output': self.poll['output'], 'outputs': [{'id': 'dataset-version', 'property': 'data'}, {'id': 'dataset-status', 'property': 'children'}],
+            'inputs': [{'id': dependency['id'], 'property': dependency['property'], 'value': self.values.get(f'{dependency["id"]}.{dependency["property"]}')}
+                       for dependency in self.poll['inputs']],
+            'state': [{'id': 'dataset-version', 'property': 'data', 'value': None}], 'changedPropIds': []})
+        self.version = ((poll or {}).get('response', {}).get('dataset-version') or {}).get('data')
+        response = self.update('initial', [])
+
+        for dropdown in self.dropdowns[:self.depth]:
+            key = id_text(dropdown)
+            options = response.get(key, {}).get('options') or []
+            if not options:
+                break
+            if self.burst > 1 and dropdown.get('column') in BURST_COLUMNS:
+                response = self.flick(dropdown['column'], key, options)
+                continue
+            self.values[f'{key}.value'] = [self.rng.choice(options)['value']]
+            response = self.update(dropdown.get('column', key), [f'{key}.value'])
+
+        ecpa = next((id_text(i) for i in self.ids if isinstance(i, dict) and i.get('type') == 'range-max' and i.get('column') == 'ECPA'), None)
+        if ecpa:
+            self.values[f'{ecpa}.value'] = 1
+            self.update('ecpa range', [f'{ecpa}.value'])
+        if 'accuracy-group' in self.ids:
+            self.values['accuracy-group.value'] = 'Country'
+            self.update('accuracy group', ['accuracy-group.value'])
+        if 'trend-dimension' in self.ids:
+            self.values['trend-dimension.value'] = 'Telco'
+            self.update('trend breakdown', ['trend-dimension.value'])
+        if 'leaderboard-group' in self.ids:
+            self.values['leaderboard-group.value'] = 'Affiliate_ID / Offer_ID'
+            self.update('leaderboard pairs', ['leaderboard-group.value'])
+
+        self.table['page_current'] = 1
+        self.update('table page', ['table.page_current'])
+        self.table['sort_by'] = [{'column_id': 'Total Sales', 'direction': 'desc'}]
+        self.update('table sort', ['table.sort_by'])
+
+        changed = [key for key in self.values if key not in VIEW_CONTROLS]
+        self.values = {key: value for key, value in self.values.items() if key not in changed}
+        self.table.update(page_current=0, sort_by=[])
+        self.update('clear filters', changed)
+
+
+# Bodies of /_dash-update-component requests recorded in a browser HAR export, replayed in order
+def har_bodies(path):
+    with open(path) as f:
+        entries = json.load(f)['log']['entries']
+    return [json.loads(entry['request']['postData']['text']) for entry in entries
+            if entry['request']['url'].endswith('/_dash-update-component') and entry['request'].get('postData')]
+
+
+def replay(client, bodies):
+    for body in bodies:
+        client.request(body['output'][:40], 'POST', '/_dash-update-component', body)
+
+
+# /metrics counters compared before and after a run: worker CPU time, dropped superseded requests and
+# requests that waited for an identical computation instead of repeating it
+SERVER_COUNTERS = {'cpu_seconds': ('process_cpu_seconds_total', ''), 'superseded': ('dash_requests_superseded_total', ''),
+                   'coalesced': ('result_cache_events_total', 'event="coalesced"')}
+
+
+def server_counters(url):
+    totals = dict.fromkeys(SERVER_COUNTERS, 0.0)
+    text = Client(url, []).request('metrics', 'GET', '/metrics', raw=True) or b''
+    for line in text.decode().splitlines():
+        if line.startswith('#') or ' ' not in line:
+            continue
+        series, value = line.rsplit(' ', 1)
+        for key, (name, label) in SERVER_COUNTERS.items():
+            if series.split('{')[0] == name and label in series:
+                totals[key] += float(value)
+    return totals
+
+
+# Run sessions from `concurrency` threads for `duration` seconds; returns every (step, seconds, ok) sample,
+# the wall time and how the server counters changed
+def load(url, concurrency, duration, depth, bodies=None, seed=0, burst=1):
+    bootstrap = Client(url, [])
+    layout = bootstrap.request('layout', 'GET', '/_dash-layout')
+    dependencies = bootstrap.request('dependencies', 'GET', '/_dash-dependencies')
+    if layout is None or dependencies is None:
+        raise SystemExit(f'{url} did not serve the Dash layout')
+
+    results = []
+    deadline = time.perf_counter() + duration
+
+    def worker(n):
+        client = Client(url, results)
+        rng = random.Random(seed * 1000 + n)
+        while time.perf_counter() < deadline:
+            if bodies:
+                replay(client, bodies)
+            else:
+                DashboardSession(client, layout, dependencies, depth, rng, burst).run()
+
+    before = server_counters(url)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    time.sleep(METRICS_SETTLE)  # every worker's totals reach the shared files
+    after = server_counters(url)
+    return results, seconds, {key: round(after[key] - before[key], 3) for key in SERVER_COUNTERS}
+
+
+def summarize(results, seconds, server):
+    steps = {}
+    for step, latency, ok in results:
+        steps.setdefault(step, []).append((latency, ok))
+    report = {'requests': len(results), 'seconds': round(seconds, 2), 'rps': round(len(results) / seconds, 1),
+              'error_rate': round(sum(not ok for _, _, ok in results) / max(len(results), 1), 4), 'server': server, 'steps': {}}
+    for step, samples in steps.items():
+        latencies = np.array([latency for latency, _ in samples]) * 1000
+        report['steps'][step] = {'count': len(samples), 'errors': sum(not ok for _, ok in samples),
+                                 'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+                                 'p90_ms': round(float(np.percentile(latencies, 90)), 1),
+                                 'p99_ms': round(float(np.percentile(latencies, 99)), 1)}
+    return report
+
+
+def print_report(label, report):
+    print(f'\n{label}: {report["requests"]:,} requests in {report["seconds"]}s, {report["rps"]} req/s, '
+          f'error rate {report["error_rate"]:.2%}')
+    server = report['server']
+    print(f'  server CPU {server["cpu_seconds"]:.1f}s ({server["cpu_seconds"] * 1000 / max(report["requests"], 1):.1f}ms per request), '
+          f'{server["superseded"]:.0f} superseded requests dropped, {server["coalesced"]:.0f} coalesced computations')
+    print(f'  {"step":22} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9}')
+    for step, s in report['steps'].items():
+        print(f'  {step:22} {s["count"]:>7} {s["errors"]:>7} {s["p50_ms"]:>9} {s["p90_ms"]:>9} {s["p99_ms"]:>9}')
+
+
+# gunicorn started from src/ with gunicorn.conf.py, as in render.yaml, with the worker settings overridden
+def start_gunicorn(port, workers, worker_class, threads, source=None, cold=False, coalesce=True):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class, GUNICORN_THREADS=str(threads))
+    if source:
+        env['DNN_SOURCE'] = os.path.abspath(source)
+    if cold:
+        env.update(RESULT_CACHE_MB='0', RESULT_CACHE_DISK_MB='0')
+    if not coalesce:
+        env.update(DNN_COALESCE='0', DNN_CANCEL_STALE='0')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:server', '-b', f'127.0.0.1:{port}'],
+                               cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn exited: {process.stderr.read().decode()[-2000:]}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.02)
+    process.kill()
+    raise SystemExit(f'gunicorn did not start within {START_TIMEOUT}s')
+
+
+# Status and JSON body of /ready on a fresh connection (so any worker may answer), or (None, None)
+def readiness(url):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    try:
+        connection.request('GET', '/ready')
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    except (OSError, http.client.HTTPException, ValueError):
+        return None, None
+    finally:
+        connection.close()
+
+
+# Wait until `workers` different worker processes report ready; returns their /ready bodies by pid
+def wait_ready(url, workers, deadline):
+    ready = {}
+    while len(ready) < workers:
+        status, body = readiness(url)
+        if status == 200:
+            ready[body['pid']] = body
+        elif body and any(step['state'] == 'failed' for step in body['steps']):
+            raise SystemExit(f'warm-up failed: {body}')
+        if time.time() > deadline:
+            raise SystemExit(f'{len(ready)} of {workers} workers warmed up within {START_TIMEOUT}s')
+        time.sleep(0.02)
+    return ready
+
+
+# Seconds importing app.py takes and, slowest first, how much of it each module it imports directly
+# accounts for (python -X importtime, which lists a module's imports before the module)
+def import_profile(env):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    children, profile = [], None
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        seconds, name = int(parts[1]) / 1e6, parts[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), seconds))
+        elif depth == 0:
+            if name.strip() == 'app':
+                profile = {'seconds': round(seconds, 3), 'own_seconds': round(int(parts[0].split(':')[1]) / 1e6, 3),
+                           'modules': {module: round(s, 3) for module, s in sorted(children, key=lambda c: -c[1])[:8]}}
+            children = []
+    if profile is None:
+        raise SystemExit(f'importing app failed: {result.stderr[-2000:]}')
+    return profile
+
+
+# Cold start of one gunicorn, timed from spawning it: until the port accepts connections, until the first
+# byte of the page shell (GET /), and until every worker has warmed up, with each worker's warm-up steps
+def startup_profile(port, workers, worker_class, threads, source=None):
+    start = time.time()
+    process = start_gunicorn(port, workers, worker_class, threads, source)
+    bound = time.time()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=START_TIMEOUT)
+        connection.request('GET', '/')
+        response = connection.getresponse()  # returns once the status line is in
+        first_byte = time.time()
+        response.read()
+        connection.close()
+        ready = wait_ready(f'http://127.0.0.1:{port}', workers, start + START_TIMEOUT)
+        warm = time.time()
+    finally:
+        process.terminate()
+        process.wait()
+    return {'bind_seconds': round(bound - start, 3), 'ttfb_seconds': round(first_byte - start, 3), 'page_status': response.status,
+            'ready_seconds': round(warm - start, 3), 'workers': [body for _, body in sorted(ready.items())]}
+
+
+def print_startup(label, report):
+    imports = report['imports']
+    print(f'\n{label}: import app {imports["seconds"]:.2f}s ({imports["own_seconds"]:.3f}s in app.py itself), '
+          f'bound after {report["bind_seconds"]:.2f}s, first byte after {report["ttfb_seconds"]:.2f}s '
+          f'(target {STARTUP_TTFB_TARGET:.1f}s), every worker ready after {report["ready_seconds"]:.2f}s')
+    print('  slowest imports: ' + ', '.join(f'{module} {seconds:.2f}s' for module, seconds in imports['modules'].items()))
+    for worker in report['workers']:
+        print(f'  worker {worker["pid"]} warmed up in {worker["seconds"]:.2f}s: '
+              + ', '.join(f'{step["name"]} {step["seconds"]:.2f}s' for step in worker['steps']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay dashboard sessions against a local gunicorn and report throughput.')
+    parser.add_argument('--url', help='load an already running server instead of starting gunicorn')
+    parser.add_argument('--workers', default='1,2', help='comma-separated gunicorn worker counts')
+    parser.add_argument('--worker-class', default='gthread', help='comma-separated worker classes, e.g. sync,gthread')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous sessions')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per configuration')
+    parser.add_argument('--depth', type=int, default=4, help='filter dropdowns picked per session')
+    parser.add_argument('--har', help='replay the callback requests recorded in a browser HAR file instead')
+    parser.add_argument('--source', help='dataset CSV for the started servers (default DNNresults.csv)')
+    parser.add_argument('--cold', action='store_true', help='turn the result cache off in the started servers')
+    parser.add_argument('--burst', type=int, default=1, help='month and date values flicked through per pick, without waiting')
+    parser.add_argument('--coalesce', default='on', help='comma-separated on/off: single-flight and superseded-request '
+                                                         'dropping in the started servers, e.g. on,off to compare')
+    parser.add_argument('--startup', action='store_true', help='profile the import and cold start of each configuration instead: '
+                                                                   'time to bind, to the first byte of the page and to every worker warm')
+    parser.add_argument('--fresh', action='store_true', help='start from a copy of the source without any cache, as after a deploy')
+    parser.add_argument('--output', help='write every report to this JSON file')
+    args = parser.parse_args()
+
+    bodies = har_bodies(args.har) if args.har else None
+    reports = []
+    if args.startup:
+        configurations = itertools.product([int(w) for w in args.workers.split(',')], args.worker_class.split(','))
+        for port, (workers, worker_class) in enumerate(configurations, BASE_PORT):
+            label = f'{workers} x {worker_class}' + (' from a fresh copy' if args.fresh else '')
+            source = os.path.abspath(args.source or os.path.join(SRC_DIR, 'DNNresults.csv'))
+            folder = tempfile.mkdtemp(prefix='dnn-startup-') if args.fresh else None
+            if folder:
+                source = shutil.copy(source, folder)
+            try:
+                imports = import_profile(dict(os.environ, DNN_SOURCE=source))
+                report = startup_profile(port, workers, worker_class, args.threads, source)
+            finally:
+                if folder:
+                    shutil.rmtree(folder, ignore_errors=True)
+            reports.append({'workers': workers, 'worker_class': worker_class, 'fresh': args.fresh, 'imports': imports, **report})
+            print_startup(label, reports[-1])
+    elif args.url:
+        results, seconds, server = load(args.url, args.concurrency, args.duration, args.depth, bodies, burst=args.burst)
+        reports.append({'url': args.url, **summarize(results, seconds, server)})
+        print_report(args.url, reports[-1])
+    else:
+        configurations = itertools.product([int(w) for w in args.workers.split(',')], args.worker_class.split(','), args.coalesce.split(','))
+        for port, (workers, worker_class, coalesce) in enumerate(configurations, BASE_PORT):
+            label = f'{workers} x {worker_class}' + (f' ({args.threads} threads)' if worker_class == 'gthread' else '') + f', coalescing {coalesce}'
+            process = start_gunicorn(port, workers, worker_class, args.threads, args.source, args.cold, coalesce == 'on')
+            try:
+                wait_ready(f'http://127.0.0.1:{port}', workers, time.time() + START_TIMEOUT)
+                results, seconds, server = load(f'http://127.0.0.1:{port}', args.concurrency, args.duration, args.depth, bodies, burst=args.burst)
+            finally:
+                process.terminate()
+                process.wait()
+            reports.append({'workers': workers, 'worker_class': worker_class, 'threads': args.threads, 'concurrency': args.concurrency,
+                            'cold': args.cold, 'coalesce': coalesce, 'burst': args.burst, **summarize(results, seconds, server)})
+            print_report(label, reports[-1])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=1)
+    if args.startup and any(report['ttfb_seconds'] > STARTUP_TTFB_TARGET for report in reports):
+        sys.exit(1)
@@ -0,0 +1,190 @@
+import cProfile
+import glob
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7]
+ROWS_BUCKETS = [0, 10, 100, 1e3, 1e4, 1e5, 1e6, 1e7]
+
+# Histogram name -> (help text, buckets)
+HISTOGRAMS = {
+    'dash_callback_seconds': ('Wall time of /_dash-update-component requests per callback', LATENCY_BUCKETS),
+    'dash_response_bytes': ('Serialized callback response size per callback', BYTES_BUCKETS),
+    'dash_response_wire_bytes': ('Callback response size as sent, after compression', BYTES_BUCKETS),
+    'filter_rows_scanned': ('Row ids read by the filter index per selection', ROWS_BUCKETS),
+    'filter_rows_returned': ('Rows matching the dropdown selections', ROWS_BUCKETS),
+}
+
+COUNTERS = {
+    'result_cache_events_total': 'Result cache hits, misses, coalesced waits, evictions and invalidations',
+    'dash_requests_superseded_total': 'Dashboard requests dropped because a newer one from the same tab arrived, by stage reached',
+    'process_cpu_seconds_total': 'CPU time used by the worker processes',
+    'dataset_events_total': 'Datasets loaded on first use and evicted to stay within the memory budget, by dataset',
+}
+
+# Callback requests slower than this many milliseconds are saved as cProfile dumps (unset turns profiling off)
+PROFILE_SLOW_MS = os.environ.get('DNN_PROFILE_SLOW_MS')
+
+# Seconds between writes of this process's totals for the other workers
+SAVE_SECONDS = 1
+
+
+def sample(name, labels, value):
+    if not labels:
+        return f'{name} {value}'
+    return f'{name}{{' + ','.join(f'{key}="{label}"' for key, label in labels) + f'}} {value}'
+
+
+def bound_text(bound):
+    return str(int(bound)) if isinstance(bound, float) and bound.is_integer() else str(bound)
+
+
+# Counters and histograms for one process. Each process also writes its totals to a file named after
+# its pid, so whichever gunicorn worker answers /metrics reports the sum over every worker.
+class Metrics:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> per-bucket counts + [+Inf count, sum]
+        self.counters = {}  # (name, labels) -> value
+        # Functions returning more counters, read when totals are taken
+        self.collectors = [lambda: {('process_cpu_seconds_total', ()): round(time.process_time(), 3)}]
+        self.saved = 0
+        self.flush = None  # pending save of totals that changed after a throttled save
+        if directory:
+            self.remove_stale()
+
+    def observe(self, name, value, **labels):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            counts = self.histograms.setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(buckets)] += 1
+            counts[-1] += value
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def totals(self):
+        with self.lock:
+            totals = {'histograms': [[name, labels, list(counts)] for (name, labels), counts in self.histograms.items()],
+                      'counters': [[name, labels, value] for (name, labels), value in self.counters.items()]}
+        for collect in self.collectors:
+            totals['counters'] += [[name, labels, value] for (name, labels), value in collect().items()]
+        return totals
+
+    # Write this process's totals at most every SAVE_SECONDS (always when forced); a skipped write
+    # is made later by a timer, so an idle worker's last requests still reach the other workers
+    def save(self, force=False):
+        if not self.directory:
+            return
+        if not force and time.time() - self.saved < SAVE_SECONDS:
+            with self.lock:
+                if self.flush is None:
+                    self.flush = threading.Timer(SAVE_SECONDS, self.save, kwargs={'force': True})
+                    self.flush.daemon = True
+                    self.flush.start()
+            return
+        with self.lock:
+            self.flush = None
+        self.saved = time.time()
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(self.totals(), f)
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            pass
+
+    # Totals of processes that have exited would be counted forever otherwise
+    def remove_stale(self):
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                os.kill(int(os.path.basename(path).split('.')[0]), 0)
+            except (ValueError, ProcessLookupError):
+                os.remove(path)
+            except PermissionError:
+                pass
+
+    def merged(self):
+        self.save(force=True)
+        files = glob.glob(os.path.join(self.directory, '*.json')) if self.directory else []
+        sources = []
+        for path in files:
+            try:
+                with open(path) as f:
+                    sources.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+        if not sources:
+            sources = [self.totals()]
+
+        histograms, counters = {}, {}
+        for totals in sources:
+            for name, labels, counts in totals['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged = histograms.setdefault(key, [0] * len(counts))
+                histograms[key] = [a + b for a, b in zip(merged, counts)]
+            for name, labels, value in totals['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    # Prometheus text exposition format
+    def render(self):
+        histograms, counters = self.merged()
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (series, labels), counts in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append(sample(f'{name}_bucket', labels + (('le', bound_text(bound)),), cumulative))
+                lines.append(sample(f'{name}_sum', labels, counts[-1]))
+                lines.append(sample(f'{name}_count', labels, cumulative))
+        for name, help_text in COUNTERS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(sample(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+# cProfile of one request, dumped to directory when it took longer than PROFILE_SLOW_MS
+class SlowRequestProfiler:
+    def __init__(self, directory, slow_ms):
+        self.directory = directory
+        self.slow_ms = float(slow_ms)
+
+    def start(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is already running in this process
+            return None
+        return profile
+
+    def stop(self, profile, name, seconds):
+        profile.disable()
+        if seconds * 1000 < self.slow_ms:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{name}-{seconds * 1000:.0f}ms.prof'))
+        except OSError:
+            pass
@@ -0,0 +1,56 @@
+# Queries the dashboard makes of one dataset version. dataset_manager.Snapshot answers them from the
+# in-memory indexes and sqlite_backend.SqliteBackend from an on-disk SQLite file; both must return the
+# same results (tests/test_backends.py checks both against plain pandas).
+#
+# filters are the nine dropdown values in FILTER_COLUMNS order: one value, a list of values (any of them
+# matches), or '', None or [] when unset. ranges maps RANGE_COLUMNS to inclusive [low, high] bounds, None
+# for an open end. A selection is whatever select() returns and is only passed back to the same backend.
+class QueryBackend:
+    version = None
+
+    # Status line shown above the filters
+    def describe(self):
+        raise NotImplementedError
+
+    # Bytes this version holds in the process, counted against the dataset registry's memory budget
+    def memory_bytes(self):
+        raise NotImplementedError
+
+    # Selection for the dropdown values and ranges; stats, when given, may receive 'scanned' and 'returned' row counts
+    def select(self, filters, ranges=None, stats=None):
+        raise NotImplementedError
+
+    # (value, row count) pairs for the next cascade column below a path of dropdown values, within the
+    # ranges, in order of first appearance; empty if any value in the path is missing or unknown
+    def facet_counts(self, path, ranges=None):
+        raise NotImplementedError
+
+    # Percentage of selected rows hitting ROI per predicted horizon, or None when nothing is selected
+    def hit_rates(self, selection):
+        raise NotImplementedError
+
+    # (value, row count, sums) per group of the selection by a filter column (one group with value None
+    # when group_column is None), biggest first, then by value; sums is a horizons x accuracy.SUMS array
+    def accuracy(self, filters, ranges=None, group_column=None):
+        raise NotImplementedError
+
+    # (months, series) of the selection by month, in calendar order: per series (value, row counts by month,
+    # horizons x trends.TREND_SUMS x months sums), biggest first, then by value; one series valued None
+    # when dimension is None
+    def trends(self, filters, ranges=None, dimension=None):
+        raise NotImplementedError
+
+    # Up to k (key, rows, sales, spend, revenue, roi) groups of the selection by group_columns (key is a
+    # tuple of their values), best first by a leaderboard.LEADERBOARD_METRICS metric of the predicted column
+    # (lowest first when lowest), ties by key; see leaderboard.LEADERBOARD_SUMS. ROI ranks only groups that spent.
+    def leaderboard(self, filters, ranges, group_columns, predicted, metric, k, lowest=False):
+        raise NotImplementedError
+
+    # DataFrames of up to chunk_rows rows with the given columns, covering the selection in table order
+    # (filter_query and sort_by applied as in table_page); at least one, empty when nothing matches
+    def export_chunks(self, selection, filter_query, sort_by, columns, chunk_rows):
+        raise NotImplementedError
+
+    # (records, total rows, page count, page served) for one DataTable page of the selection
+    def table_page(self, selection, filter_query, sort_by, page_current, page_size):
+        raise NotImplementedError
@@ -0,0 +1,149 @@
+import glob
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Result files offered next to the main source: comma-separated paths or glob patterns. Runs or regions
+# named DNNresults-<name>.csv or dropped into datasets/ are picked up by default.
+DATASETS = os.environ.get('DNN_DATASETS', 'DNNresults*.csv,datasets/*.csv')
+
+# Loaded datasets are dropped, least recently used first, once their frames and indexes pass this many MB
+MEMORY_BUDGET_MB = float(os.environ.get('DNN_MEMORY_BUDGET_MB', 1024))
+
+
+def dataset_name(source):
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+# {name: path} of the main source first, then every file matching the patterns, by name; the first file
+# of a name wins
+def discover(source, patterns=DATASETS):
+    paths = [os.path.abspath(source)]
+    for pattern in filter(None, (part.strip() for part in patterns.split(','))):
+        paths += sorted(os.path.abspath(path) for path in glob.glob(pattern))
+    sources = {}
+    for path in paths:
+        if sources.setdefault(dataset_name(path), path) != path:
+            logger.warning('Skipping %s: a dataset named %s is already offered', path, dataset_name(path))
+    return sources
+
+
+# Datasets by name, each opened by open_dataset(path) (a DatasetManager or SqliteDataset) on first use.
+# Once the loaded ones hold more than budget_bytes, the least recently used are dropped with their indexes
+# and watchers; requests still holding one of their snapshots finish with it. The dataset just used is
+# always kept, even alone over budget, and so are the datasets a request holds (see hold): a request
+# comparing two datasets that do not fit together keeps both rather than evicting the selected one to
+# load the other, which every later request would then undo. Loads take a lock per name, so a slow load
+# only holds up the requests for that dataset.
+class DatasetRegistry:
+    def __init__(self, sources, open_dataset, budget_bytes=MEMORY_BUDGET_MB * 2**20, default=None):
+        self.sources = dict(sources)
+        self.default = default if default in self.sources else next(iter(self.sources))
+        self.open_dataset = open_dataset
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.loading = {name: threading.Lock() for name in self.sources}
+        self.loaded = OrderedDict()  # name -> dataset, least recently used first
+        self.pins = Counter()  # name -> requests holding it
+        self.local = threading.local()
+        self.events = {}  # (event, name) -> count of loads and evictions
+
+    def names(self):
+        return list(self.sources)
+
+    # Dataset of a name (the default for None or unknown names), loaded if it is not already
+    def get(self, name=None):
+        if name not in self.sources:
+            name = self.default
+        self.pin(name)
+        dataset = self.touch(name)
+        if dataset is not None:
+            return dataset
+        with self.loading[name]:
+            dataset = self.touch(name)  # loaded by another request meanwhile
+            if dataset is not None:
+                return dataset
+            start = time.perf_counter()
+            dataset = self.open_dataset(self.sources[name])
+            with self.lock:
+                self.loaded[name] = dataset
+                self.record('load', name)
+                evicted = self.evict()
+            logger.info('Loaded dataset %s in %.2fs', name, time.perf_counter() - start)
+        for other, size in evicted:
+            logger.info('Evicted dataset %s (%.0f MB) to stay within %.0f MB', other, size / 2**20, self.budget_bytes / 2**20)
+        return dataset
+
+    # Keep every dataset this thread fetches with get() from eviction until release(); called around each
+    # request, so the datasets it uses stay loaded while it runs
+    def hold(self):
+        self.release()
+        self.local.held = []
+
+    def release(self):
+        held, self.local.held = getattr(self.local, 'held', None) or [], None
+        with self.lock:
+            self.pins.subtract(held)
+            self.pins += Counter()  # drop the names no longer held
+
+    @contextmanager
+    def holding(self):
+        self.hold()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pin(self, name):
+        held = getattr(self.local, 'held', None)
+        if held is not None and name not in held:
+            held.append(name)
+            with self.lock:
+                self.pins[name] += 1
+
+    def touch(self, name):
+        with self.lock:
+            dataset = self.loaded.get(name)
+            if dataset is not None:
+                self.loaded.move_to_end(name)
+            return dataset
+
+    def record(self, event, name):
+        self.events[event, name] = self.events.get((event, name), 0) + 1
+
+    # Drop least recently used datasets until the rest fit the budget, keeping the one just used and the
+    # held ones; sizes are measured now, so ingested rows count. Returns the (name, bytes) dropped.
+    def evict(self):
+        sizes = {name: dataset.current().memory_bytes() for name, dataset in self.loaded.items()}
+        evicted = []
+        while sum(sizes.values()) > self.budget_bytes:
+            name = next((name for name in list(self.loaded)[:-1] if not self.pins[name]), None)
+            if name is None:
+                break
+            dataset = self.loaded.pop(name)
+            dataset.close()
+            self.record('evict', name)
+            evicted.append((name, sizes.pop(name)))
+        return evicted
+
+    # Name of the loaded dataset whose current version this is, or None (result_cache.ResultCache scope_of)
+    def name_of(self, version):
+        with self.lock:
+            datasets = list(self.loaded.items())
+        return next((name for name, dataset in datasets if dataset.current().version == version), None)
+
+    # Start the watchers of the loaded datasets in this process (see DatasetManager.watch)
+    def watch(self):
+        with self.lock:
+            datasets = list(self.loaded.values())
+        for dataset in datasets:
+            dataset.watch()
+
+    def memory_bytes(self):
+        with self.lock:
+            return sum(dataset.current().memory_bytes() for dataset in self.loaded.values())
@@ -0,0 +1,256 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+from collections import Counter, OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locks (Windows): identical misses coalesce within a process only
+    fcntl = None
+
+# In-process tier budget and cross-worker (filesystem) tier budget, in megabytes
+MEMORY_MB = float(os.environ.get('RESULT_CACHE_MB', 64))
+DISK_MB = float(os.environ.get('RESULT_CACHE_DISK_MB', 256))
+
+# Disk usage is re-checked after this many writes from one process
+DISK_CHECK_EVERY = 50
+
+# DNN_COALESCE=0 turns single-flight off, to measure what it saves
+COALESCE = os.environ.get('DNN_COALESCE', '1') != '0'
+
+# Counters kept by every cache; 'coalesced' counts requests that waited for a computation already running
+EVENTS = ('memory_hits', 'disk_hits', 'misses', 'coalesced', 'memory_evictions', 'disk_evictions', 'invalidations')
+
+
+# Dropdowns send '' after a clear and None before a choice; lists and dicts become hashable tuples
+def normalize(value):
+    if value == '' or value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    return value
+
+
+# One computation of a missed key, which callers arriving while it runs wait for
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+# Callback results keyed on a namespace, the normalized arguments and the dataset version.
+# Tier 1 is an LRU dict per process, bounded by the pickled size of its entries; tier 2 is a directory of
+# pickles per dataset version shared by every gunicorn worker. Seeing a new version drops the previous
+# one's entries and the other versions' directories, so nothing computed from old data is ever served;
+# requests still running on a retired version compute without the cache.
+# With several datasets, scope_of(version) names the dataset a version belongs to (None for versions no
+# longer current, which compute without the cache): each dataset keeps its own version, and its
+# directories sit under a folder named after it.
+# Misses are single-flight: callers asking for a result that is already being computed wait for that
+# computation instead of repeating it, in this process through a shared Flight and across workers through
+# a lock file per key next to the disk tier (checked again once the lock is held).
+# Cached values are shared between requests and must not be mutated by callers.
+class ResultCache:
+    def __init__(self, directory=None, memory_bytes=MEMORY_MB * 2**20, disk_bytes=DISK_MB * 2**20, coalesce=COALESCE, scope_of=None):
+        self.directory = directory
+        self.scope_of = scope_of
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.coalesce = coalesce
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (version, key) -> (size, value), least recently used first
+        self.flights = {}  # (version, key) -> Flight of a miss being computed in this process
+        self.size = 0
+        self.versions = {}  # scope (None without scope_of) -> current version
+        self.folders = {}  # current version -> its disk tier directory
+        self.retired = set()
+        self.writes = 0
+        self.stats = Counter()
+
+    def key(self, namespace, args):
+        return hashlib.sha1(repr((namespace, normalize(args))).encode()).hexdigest()
+
+    def get_or_compute(self, namespace, version, args, compute):
+        if not self.use_version(version):
+            return compute()
+        key = self.key(namespace, args)
+
+        with self.lock:
+            entry = self.entries.get((version, key))
+            if entry is not None:
+                self.entries.move_to_end((version, key))
+                self.stats['memory_hits'] += 1
+                return entry[1]
+            flight = self.flights.get((version, key))
+            leading = flight is None and self.coalesce
+            if leading:
+                flight = self.flights[(version, key)] = Flight()
+            elif flight is not None:
+                self.stats['coalesced'] += 1
+
+        if flight is None:
+            return self.load(version, key, compute)
+        if not leading:
+            return flight.result()
+        try:
+            flight.value = self.load(version, key, compute)
+            return flight.value
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[(version, key)]
+            flight.done.set()
+
+    # Value from the disk tier, or computed (once over all workers) and stored in both tiers
+    def load(self, version, key, compute):
+        data = self.read_disk(version, key)
+        if data is None:
+            with self.disk_lock(version, key) as waited:
+                data = self.read_disk(version, key) if waited else None
+                if data is None:
+                    self.count('misses')
+                    value = compute()
+                    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                    self.write_disk(version, key, data)
+                    self.remember(version, key, value, len(data))
+                    return value
+                self.count('coalesced')
+        else:
+            self.count('disk_hits')
+        value = pickle.loads(data)
+        self.remember(version, key, value, len(data))
+        return value
+
+    # Exclusive lock on a key across the workers, held while it is computed; yields whether another
+    # worker held it first (its result may be on disk now). A no-op without a shared directory.
+    @contextlib.contextmanager
+    def disk_lock(self, version, key):
+        if self.folders.get(version) is None or fcntl is None or not self.coalesce or self.disk_bytes <= 0:
+            yield False
+            return
+        try:
+            folder = os.path.join(self.folders[version], 'locks')
+            os.makedirs(folder, exist_ok=True)
+            f = open(os.path.join(folder, key), 'wb')
+        except OSError:
+            yield False
+            return
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except OSError:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                waited = True
+            yield waited
+
+    # False for a version that has already been replaced (or, with scopes, is no longer current)
+    def use_version(self, version):
+        scope = self.scope_of(version) if self.scope_of else None
+        if self.scope_of and scope is None:
+            return False
+        if self.versions.get(scope) == version:
+            return True
+        with self.lock:
+            if version in self.retired:
+                return False
+            if self.versions.get(scope) == version:
+                return True
+            previous = self.versions.get(scope)
+            if previous is not None:
+                self.stats['invalidations'] += 1
+                self.retired.add(previous)
+                self.folders.pop(previous, None)
+                for entry in [entry for entry in self.entries if entry[0] == previous]:
+                    self.size -= self.entries.pop(entry)[0]
+            parent = self.directory if scope is None or not self.directory else os.path.join(self.directory, scope)
+            self.folders[version] = parent and os.path.join(parent, version)
+            self.versions[scope] = version
+        if parent and os.path.isdir(parent):
+            for name in os.listdir(parent):
+                if name != version:
+                    shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+        return True
+
+    def remember(self, version, key, value, size):
+        if size > self.memory_bytes:
+            return
+        with self.lock:
+            if (version, key) in self.entries or version in self.retired:
+                return
+            self.entries[version, key] = (size, value)
+            self.size += size
+            while self.size > self.memory_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.stats['memory_evictions'] += 1
+
+    def read_disk(self, version, key):
+        if self.folders.get(version) is None:
+            return None
+        try:
+            with open(os.path.join(self.folders[version], key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_disk(self, version, key, data):
+        folder = self.folders.get(version)
+        if folder is None or len(data) > self.disk_bytes:
+            return
+        tmp = os.path.join(folder, f'{key}.tmp-{os.getpid()}-{threading.get_ident()}')
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(folder, key))
+        except OSError:
+            return
+        self.writes += 1
+        if self.writes % DISK_CHECK_EVERY == 0:
+            self.trim_disk(folder)
+
+    # Delete the least recently written results until the version directory fits its budget
+    def trim_disk(self, folder):
+        try:
+            files = [entry for entry in os.scandir(folder) if entry.is_file()]
+            files.sort(key=lambda entry: entry.stat().st_mtime)
+            total = sum(entry.stat().st_size for entry in files)
+            for entry in files:
+                if total <= self.disk_bytes:
+                    break
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+                self.count('disk_evictions')
+        except OSError:
+            pass
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def snapshot_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats.update(memory_entries=len(self.entries), memory_bytes=self.size)
+            if self.scope_of:
+                stats['versions'] = dict(self.versions)
+            else:
+                stats['version'] = self.versions.get(None)
+        for name in EVENTS:
+            stats.setdefault(name, 0)
+        return stats
@@ -0,0 +1,36 @@
+import numpy as np
+
+# Predicted value columns an ROI hit is measured for (predicted value / ECPA > 1)
+ROI_HORIZONS = ['Day 1', 'Week 1', 'Month 3 (P)', 'Month 4 (P)', 'Month 5 (P)', 'Month 6 (P)']
+
+
+# Per-row ROI hit flags for every horizon, computed once at load time
+class RoiFlags:
+    def __init__(self, df, horizons=ROI_HORIZONS, arrays=None):
+        self.horizons = list(horizons)
+        self.hits = arrays['hits'] if arrays is not None else self.flags(df)
+        self.totals = self.hits.sum(axis=0)
+
+    def flags(self, df):
+        ecpa = df['ECPA'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Row-major (rows x horizons) so gathering a selection reads each row's flags together
+            return np.column_stack([df[col].to_numpy(dtype=float) / ecpa > 1 for col in self.horizons])
+
+    # Flags for df whose first `start` rows are the ones flagged here; only the new rows are computed
+    def extended(self, df, start):
+        hits = np.concatenate([self.hits, self.flags(df.iloc[start:])])
+        return RoiFlags(df, self.horizons, arrays={'hits': hits})
+
+    def arrays(self):
+        return {'hits': self.hits}
+
+    # Percentage of rows hitting ROI keyed by horizon, or None when no rows are selected
+    def hit_rates(self, rows):
+        if rows is None:
+            count, hits = len(self.hits), self.totals
+        else:
+            count, hits = len(rows), self.hits[rows].sum(axis=0)
+        if count == 0:
+            return None
+        return {col: int(h) / count * 100 for col, h in zip(self.horizons, hits)}
@@ -0,0 +1,87 @@
+import os
+import re
+import threading
+import time
+
+# DNN_CANCEL_STALE=0 lets superseded requests run to the end, to measure what dropping them saves
+CANCEL_STALE = os.environ.get('DNN_CANCEL_STALE', '1') != '0'
+
+# Session files untouched for this long belong to closed tabs and are removed
+SESSION_SECONDS = 3600
+
+# Old session files are looked for after this many requests from one process
+CLEANUP_EVERY = 500
+
+# Session ids come from the browser and name files, so only short plain tokens are tracked
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+# Newest dashboard request of every browser tab (session). A request records its arrival time as its
+# token, and is superseded once a later one from the same tab has recorded a bigger token: the browser
+# only applies the response of its latest request, so the older one can stop between stages.
+# Tokens are kept in memory and, with a directory, in one small file per session, so a tab whose requests
+# land on different gunicorn workers is still seen as one session. Requests racing to record their
+# tokens can only leave the older token in place, which cancels nothing. Tokens are overwritten in place at
+# a fixed width (a truncating rewrite is far slower on some filesystems), so a token read while another
+# is written is only trusted when a second read agrees.
+class LatestRequests:
+    def __init__(self, directory=None, enabled=CANCEL_STALE):
+        self.directory = directory
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.tokens = {}  # session -> newest token seen by this process
+        self.requests = 0
+
+    # Token of a request that has just arrived, or None when its session is not tracked
+    def start(self, session):
+        if not self.enabled or not session or not SESSION_ID.match(session):
+            return None
+        token = time.time_ns()
+        with self.lock:
+            self.tokens[session] = max(token, self.tokens.get(session, 0))
+            self.requests += 1
+            cleanup = self.requests % CLEANUP_EVERY == 0
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                fd = os.open(os.path.join(self.directory, session), os.O_WRONLY | os.O_CREAT, 0o644)
+                try:
+                    os.pwrite(fd, f'{token:020d}'.encode(), 0)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        if cleanup:
+            self.cleanup()
+        return token
+
+    def superseded(self, session, token):
+        if token is None:
+            return False
+        with self.lock:
+            if self.tokens.get(session, 0) > token:
+                return True
+        if not self.directory:
+            return False
+        try:
+            with open(os.path.join(self.directory, session), 'rb') as f:
+                newest = int(f.read(20) or 0)
+                if newest <= token:
+                    return False
+                f.seek(0)
+                return int(f.read(20)) == newest
+        except (OSError, ValueError):
+            return False
+
+    def cleanup(self):
+        cutoff = time.time() - SESSION_SECONDS
+        with self.lock:
+            self.tokens = {session: token for session, token in self.tokens.items() if token / 1e9 > cutoff}
+        if not self.directory:
+            return
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+        except OSError:
+            pass
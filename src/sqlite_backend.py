@@ -0,0 +1,348 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from accuracy import ACCURACY_HORIZONS, SUMS
+from dataset import SOURCE_PATH, cache_dir, file_digest, type_columns
+from dataset_manager import TABLE_COLUMNS
+from filter_index import FILTER_COLUMNS, RANGE_COLUMNS, date_days, range_bound, selected_values
+from leaderboard import ranked_groups
+from query_backend import QueryBackend
+from roi import ROI_HORIZONS
+from table_query import float32_list, split_filter_part
+from trends import grouped_series
+
+# Bump when the database layout changes so old files are rebuilt
+DATABASE_FORMAT = 3
+
+# Date as days since 1970-01-01, stored next to the Date text so date ranges are index range scans
+DATE_DAY = 'Date_day'
+
+# CSV rows parsed and inserted at a time, so building never holds the whole file in memory
+CHUNK_ROWS = 200_000
+
+# DataTable comparison operators in SQL; ne uses IS NOT so missing values count as different, as in pandas
+SQL_OPERATORS = {'eq': '=', 'ne': 'IS NOT', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+# SQLite type per column of a typed chunk: categoricals of text are TEXT, whole numbers INTEGER, metrics REAL
+def column_kinds(chunk):
+    kinds = {}
+    for col in chunk.columns:
+        dtype = chunk[col].cat.categories.dtype if isinstance(chunk[col].dtype, pd.CategoricalDtype) else chunk[col].dtype
+        kinds[col] = 'INTEGER' if pd.api.types.is_integer_dtype(dtype) else 'REAL' if pd.api.types.is_float_dtype(dtype) else 'TEXT'
+    return kinds
+
+
+# Python values of one column for executemany. Metrics are float32 in the pandas path, so the same
+# float32 values are stored (exactly, as doubles) and both backends compare and divide the same numbers.
+def column_values(series, kind):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    if kind == 'TEXT':
+        return [None if value is None or value != value else str(value) for value in series.tolist()]
+    if kind == 'REAL':
+        values = series.to_numpy(dtype=np.float32).astype(float)
+        return [None if value != value else value for value in values.tolist()]
+    return [None if value is None or value != value else int(value) for value in series.tolist()]
+
+
+# Import a results CSV into a new SQLite file: one `results` table in file order (rowid = row number),
+# an index per filter and range column plus one over the whole cascade, and a `meta` table describing the source
+def build_database(source, database):
+    stat = os.stat(source)
+    os.makedirs(os.path.dirname(database), exist_ok=True)
+    tmp = f'{database}.tmp-{os.getpid()}'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    connection = sqlite3.connect(tmp)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+
+    kinds, rows = None, 0
+    for chunk in pd.read_csv(source, chunksize=CHUNK_ROWS):
+        chunk = type_columns(chunk)
+        chunk[DATE_DAY] = date_days(chunk['Date']).astype(float)  # NaT becomes NaN, stored as NULL
+        if kinds is None:
+            kinds = column_kinds(chunk)
+            kinds[DATE_DAY] = 'INTEGER'
+            connection.execute('CREATE TABLE results (' + ', '.join(f'{quote(col)} {kind}' for col, kind in kinds.items()) + ')')
+        values = zip(*[column_values(chunk[col], kinds[col]) for col in kinds])
+        connection.executemany(f'INSERT INTO results VALUES ({", ".join("?" * len(kinds))})', values)
+        rows += len(chunk)
+
+    for i, col in enumerate(FILTER_COLUMNS):
+        connection.execute(f'CREATE INDEX filter_{i} ON results ({quote(col)})')
+    for i, col in enumerate(range_column(col) for col in RANGE_COLUMNS):
+        if col not in FILTER_COLUMNS:
+            connection.execute(f'CREATE INDEX range_{i} ON results ({quote(col)})')
+    connection.execute(f'CREATE INDEX cascade ON results ({", ".join(quote(col) for col in FILTER_COLUMNS)})')
+    connection.execute('ANALYZE')
+
+    meta = {'format': DATABASE_FORMAT, 'rows': rows, 'kinds': kinds, 'source_size': stat.st_size,
+            'source_mtime': stat.st_mtime, 'source_sha1': file_digest(source)}
+    connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    connection.executemany('INSERT INTO meta VALUES (?, ?)', [(key, json.dumps(value)) for key, value in meta.items()])
+    connection.commit()
+    connection.close()
+    os.replace(tmp, database)
+    return meta
+
+
+# Column a range filter compares: Date ranges use the day numbers
+def range_column(col):
+    return DATE_DAY if col == 'Date' else col
+
+
+# Meta of a database that still matches the source, or None when it is missing or stale
+def valid_meta(source, database):
+    if not os.path.exists(database):
+        return None
+    try:
+        connection = sqlite3.connect(f'file:{database}?mode=ro', uri=True)
+        meta = {key: json.loads(value) for key, value in connection.execute('SELECT key, value FROM meta')}
+        connection.close()
+    except sqlite3.Error:
+        return None
+    stat = os.stat(source)
+    if meta.get('format') != DATABASE_FORMAT or meta['source_size'] != stat.st_size:
+        return None
+    if meta['source_mtime'] != stat.st_mtime:
+        if meta['source_sha1'] != file_digest(source):
+            return None
+        # Same content under a new mtime (a re-copy): record it, so later opens skip hashing again
+        meta['source_mtime'] = stat.st_mtime
+        try:
+            with sqlite3.connect(database) as connection:
+                connection.execute("UPDATE meta SET value = ? WHERE key = 'source_mtime'", (json.dumps(stat.st_mtime),))
+            connection.close()
+        except sqlite3.Error:
+            pass  # a read-only database just keeps hashing
+    return meta
+
+
+# float32 text of a stored metric, as pandas prints the float32 column (for contains / datestartswith)
+def float32_text(value):
+    return None if value is None else str(np.float32(value))
+
+
+# One version of the dataset answered by SQLite queries; only the requested page is ever in memory.
+# Selections are (WHERE clause, parameters) pairs. Connections are read-only, one per thread and process.
+class SqliteBackend(QueryBackend):
+    def __init__(self, database, meta, load_seconds):
+        self.database = database
+        self.rows = meta['rows']
+        self.kinds = meta['kinds']
+        # Same formula as DatasetManager.version_id, so both backends share result cache entries
+        self.version = hashlib.sha1(f"{meta['source_sha1']}|{meta['source_size']}|".encode()).hexdigest()[:10]
+        self.load_seconds = load_seconds
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():  # never reuse a connection across a fork
+            self.local.connection = sqlite3.connect(f'file:{self.database}?mode=ro', uri=True)
+            self.local.connection.create_function('float32_text', 1, float32_text, deterministic=True)
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    # The rows stay in the file; each connection only keeps SQLite's small page cache
+    def memory_bytes(self):
+        return 0
+
+    def describe(self):
+        return f'Dataset {self.version} · {self.rows:,} rows · SQLite · opened in {self.load_seconds:.2f}s'
+
+    def select(self, filters, ranges=None, stats=None):
+        clauses, params = [], []
+        for col, value in zip(FILTER_COLUMNS, filters):
+            values = selected_values(value)
+            if values is None:
+                continue
+            values = [value for value in values if isinstance(value, (str, int, float))]  # unhashable ones never match
+            if not values:
+                return '0', []
+            clauses.append(f'{quote(col)} = ?' if len(values) == 1 else f'{quote(col)} IN ({", ".join("?" * len(values))})')
+            params += values
+        for col, (low, high) in (ranges or {}).items():
+            if col not in RANGE_COLUMNS or range_column(col) not in self.kinds:
+                continue
+            for bound, operator in ((low, '>='), (high, '<=')):
+                bound = self.range_param(col, bound)
+                if bound is not None:
+                    clauses.append(f'{quote(range_column(col))} {operator} ?')
+                    params.append(bound)
+        return ' AND '.join(clauses), params
+
+    # Bound typed as the pandas path compares it: day numbers for Date, float32 for metrics
+    def range_param(self, col, bound):
+        if col == 'Date':
+            bound = range_bound(bound, np.dtype('datetime64[D]'))
+            return None if bound is None else int(bound.astype(np.int64))
+        bound = range_bound(bound, np.dtype(np.float32 if self.kinds[col] == 'REAL' else np.int64))
+        return None if bound is None else float(bound)
+
+    def facet_counts(self, path, ranges=None):
+        if len(path) >= len(FILTER_COLUMNS) or not all(selected_values(value) for value in path):
+            return []
+        where, params = self.select(list(path) + [None] * (len(FILTER_COLUMNS) - len(path)), ranges)
+        col = quote(FILTER_COLUMNS[len(path)])
+        sql = f'SELECT {col}, COUNT(*) FROM results {"WHERE " + where if where else ""} GROUP BY {col} ORDER BY MIN(rowid)'
+        return [(value, count) for value, count in self.query(sql, params)]
+
+    def hit_rates(self, selection):
+        where, params = selection
+        hits = ', '.join(f'SUM(CASE WHEN "ECPA" = 0 THEN {quote(col)} > 0 ELSE {quote(col)} / "ECPA" > 1 END)' for col in ROI_HORIZONS)
+        count, *totals = self.query(f'SELECT COUNT(*), {hits} FROM results {"WHERE " + where if where else ""}', params)[0]
+        if count == 0:
+            return None
+        return {col: int(h or 0) / count * 100 for col, h in zip(ROI_HORIZONS, totals)}
+
+    def accuracy(self, filters, ranges=None, group_column=None):
+        where, params = self.select(filters, ranges)
+        terms = []
+        for _, predicted, actual in ACCURACY_HORIZONS:
+            p, a, error = quote(predicted), quote(actual), f'({quote(predicted)} - {quote(actual)})'
+            terms += [f'TOTAL({p} IS NOT NULL AND {a} IS NOT NULL)', f'TOTAL({error})', f'TOTAL(ABS({error}))',
+                      f'TOTAL({error} * {error})', f'TOTAL(CASE WHEN {a} != 0 THEN ABS({error}) / ABS({a}) END)',
+                      f'TOTAL({a} != 0 AND {p} IS NOT NULL)']
+        col = quote(group_column) if group_column else 'NULL'
+        group = f'GROUP BY {col} ORDER BY COUNT(*) DESC, {col}' if group_column else ''
+        rows = self.query(f'SELECT {col}, COUNT(*), {", ".join(terms)} FROM results {"WHERE " + where if where else ""} {group}', params)
+        return [(value, count, np.array(sums).reshape(len(ACCURACY_HORIZONS), len(SUMS))) for value, count, *sums in rows if count]
+
+    def trends(self, filters, ranges=None, dimension=None):
+        where, params = self.select(filters, ranges)
+        terms = []
+        for col in ROI_HORIZONS:
+            terms += [f'TOTAL({quote(col)})', f'COUNT({quote(col)})',
+                      f'TOTAL(CASE WHEN "ECPA" = 0 THEN {quote(col)} > 0 ELSE {quote(col)} / "ECPA" > 1 END)']
+        col = quote(dimension) if dimension else 'NULL'
+        rows = self.query(f'SELECT "Month", {col}, COUNT(*), {", ".join(terms)} FROM results {"WHERE " + where if where else ""} '
+                          f'GROUP BY "Month", {col}', params)
+        return grouped_series(rows)
+
+    # Every group is summed by SQL and ranked by the same partial selection as the pandas path
+    def leaderboard(self, filters, ranges, group_columns, predicted, metric, k, lowest=False):
+        where, params = self.select(filters, ranges)
+        cols = ', '.join(map(quote, group_columns))
+        valid = f'"ECPA" IS NOT NULL AND {quote(predicted)} IS NOT NULL'
+        rows = self.query(f'SELECT {cols}, COUNT(*), TOTAL("Total Sales"), TOTAL(CASE WHEN {valid} THEN "Total Sales" * "ECPA" END), '
+                          f'TOTAL(CASE WHEN {valid} THEN "Total Sales" * {quote(predicted)} END) '
+                          f'FROM results {"WHERE " + where if where else ""} GROUP BY {cols}', params)
+        keys = [tuple(row[:len(group_columns)]) for row in rows]
+        sums = [np.array([row[len(group_columns) + i] for row in rows], dtype=float) for i in range(4)]
+        return ranked_groups(keys.__getitem__, sums, metric, k, lowest)
+
+    # SQL for one "{column} op value" part of a filter_query, with the pandas path's typing rules
+    def compare(self, col, operator, raw, value):
+        kind = self.kinds[col]
+        text = quote(col) if kind == 'TEXT' else f'float32_text({quote(col)})' if kind == 'REAL' else f'CAST({quote(col)} AS TEXT)'
+        if operator == 'contains':
+            return f'instr({text}, ?) > 0', [raw]
+        if operator == 'datestartswith':
+            return f'substr({text}, 1, ?) = ?', [len(raw), raw]
+        if kind == 'TEXT':
+            value = raw  # text columns compare against what was typed
+        elif isinstance(value, str):
+            return ('1', []) if operator == 'ne' else ('0', [])  # text against a number never compares
+        elif kind == 'REAL':
+            value = float(np.float32(value))  # pandas compares a float32 column in float32
+        return f'{quote(col)} {SQL_OPERATORS[operator]} ?', [value]
+
+    # WHERE clause, its parameters and the ORDER BY of the selection narrowed by a filter_query and sorted
+    # as the pandas path sorts: ties keep file order, except a single descending key, which reverses it
+    def ordered_query(self, selection, filter_query, sort_by):
+        where, params = selection
+        clauses, params = ([where] if where else []), list(params)
+        for filter_part in (filter_query or '').split(' && ') if filter_query else []:
+            col, operator, raw, value = split_filter_part(filter_part)
+            if col not in TABLE_COLUMNS:
+                continue
+            clause, extra = self.compare(col, operator, raw, value)
+            clauses.append(clause)
+            params += extra
+        where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+        keys = [(s['column_id'], s['direction'] == 'asc') for s in sort_by or [] if s['column_id'] in TABLE_COLUMNS]
+        if len(keys) == 1:
+            order = f'{quote(keys[0][0])} {"ASC" if keys[0][1] else "DESC"}, rowid {"ASC" if keys[0][1] else "DESC"}'
+        else:
+            order = ', '.join([f'{quote(col)} {"ASC" if ascending else "DESC"}' for col, ascending in keys] + ['rowid'])
+        return where, params, order
+
+    def table_page(self, selection, filter_query, sort_by, page_current, page_size):
+        where, params, order = self.ordered_query(selection, filter_query, sort_by)
+        total = self.rows if not where else self.query(f'SELECT COUNT(*) FROM results {where}', params)[0][0]
+        page_size = page_size or 1
+        page_count = max(1, math.ceil(total / page_size))
+        page_current = min(max(page_current or 0, 0), page_count - 1)
+
+        columns = ', '.join(quote(col) for col in TABLE_COLUMNS)
+        rows = self.query(f'SELECT {columns} FROM results {where} ORDER BY {order} LIMIT ? OFFSET ?',
+                          params + [page_size, page_current * page_size])
+        values = [float32_list(np.array(column, dtype=float)) if self.kinds[col] == 'REAL' else list(column)
+                  for col, column in zip(TABLE_COLUMNS, zip(*rows))]
+        return [dict(zip(TABLE_COLUMNS, row)) for row in zip(*values)], total, page_count, page_current
+
+    # Rows streamed from one cursor, chunk_rows at a time; metrics go back to float32 like the pandas frame
+    def export_chunks(self, selection, filter_query, sort_by, columns, chunk_rows):
+        where, params, order = self.ordered_query(selection, filter_query, sort_by)
+        columns = [col for col in columns if col in self.kinds]
+        cursor = self.connection().execute(f'SELECT {", ".join(quote(col) for col in columns)} FROM results {where} ORDER BY {order}', params)
+        reals = {col: np.float32 for col in columns if self.kinds[col] == 'REAL'}
+        first = True
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows and not first:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns).astype(reals)
+            first = False
+            if len(rows) < chunk_rows:
+                break
+
+
+# Dataset served from a SQLite file next to the column cache (src/.cache/<source>/results.sqlite),
+# imported from the CSV on first use and whenever the CSV changes. New batches are not picked up
+# while running; restart (or rebuild with `python sqlite_backend.py`) after replacing the CSV.
+class SqliteDataset:
+    def __init__(self, source=SOURCE_PATH, database=None):
+        self.source = os.path.abspath(source)
+        self.database = database or os.path.join(cache_dir(self.source), 'results.sqlite')
+        start = time.perf_counter()
+        meta = valid_meta(self.source, self.database) or build_database(self.source, self.database)
+        self.backend = SqliteBackend(self.database, meta, time.perf_counter() - start)
+
+    def current(self):
+        return self.backend
+
+    def watch(self):
+        pass
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the SQLite database of a prediction results CSV.')
+    parser.add_argument('source', nargs='?', default=SOURCE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    dataset = SqliteDataset(args.source)
+    print(f'{dataset.database}: {dataset.backend.rows:,} rows, ready in {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,103 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import SOURCE_PATH
+
+# Columns that describe one campaign; they are drawn together so every generated row is a
+# country / gateway / telco / shortcode / keyword combination that exists in the source
+CAMPAIGN_COLUMNS = ['Country', 'New_Gateway', 'Telco', 'Shortcode', 'Keyword']
+
+# Rows written per CSV chunk, so 10M-row files never sit in memory at once
+CHUNK_ROWS = 500_000
+
+
+# Values of a column by frequency, extended with new ids whose weights keep falling off as a power law,
+# so the pool grows with the dataset but stays skewed towards the big affiliates and offers
+def skewed_pool(series, size):
+    counts = series.value_counts()
+    values = counts.index.to_numpy()
+    weights = counts.to_numpy(dtype=float)
+    extra = max(size - len(values), 0)
+    if extra:
+        values = np.concatenate([values, np.arange(extra) + values.max() + 1])
+        weights = np.concatenate([weights, weights[-1] * (len(counts) / (len(counts) + np.arange(1, extra + 1))) ** 1.2])
+    return values, weights / weights.sum()
+
+
+# Synthetic prediction results with the source schema. Campaign combinations, months, affiliates and
+# offers follow the source frequencies; affiliate and offer pools grow with the square root of the scale.
+# Metric columns are whole source rows resampled with a little noise, which keeps them correlated.
+class SyntheticResults:
+    def __init__(self, source=SOURCE_PATH, rows=100_000, seed=0):
+        self.source = pd.read_csv(source)
+        self.rows = rows
+        self.rng = np.random.default_rng(seed)
+        scale = max(rows / len(self.source), 1) ** 0.5
+
+        campaigns = self.source.groupby(CAMPAIGN_COLUMNS, sort=False).size()
+        self.campaigns = campaigns.index.to_frame(index=False)
+        self.campaign_p = campaigns.to_numpy() / campaigns.sum()
+        months = self.source['Month'].value_counts()
+        self.months = pd.to_datetime(months.index, format='mixed')
+        self.month_p = months.to_numpy() / months.sum()
+        self.affiliates = skewed_pool(self.source['Affiliate_ID'], int(self.source['Affiliate_ID'].nunique() * scale))
+        self.offers = skewed_pool(self.source['Offer_ID'], int(self.source['Offer_ID'].nunique() * scale))
+        self.metrics = [col for col in self.source.columns if col not in CAMPAIGN_COLUMNS + ['Month', 'Date', 'Offer_ID', 'Affiliate_ID']]
+
+    def chunk(self, rows):
+        rng = self.rng
+        data = self.campaigns.iloc[rng.choice(len(self.campaigns), rows, p=self.campaign_p)].reset_index(drop=True)
+
+        month = self.months[rng.choice(len(self.months), rows, p=self.month_p)]
+        day = (rng.random(rows) * month.days_in_month).astype(int) + 1
+        data.insert(0, 'Month', [f'{y}/{m}' for y, m in zip(month.year, month.month)])
+        data.insert(1, 'Date', [f'{m}/{d}/{y}' for y, m, d in zip(month.year, month.month, day)])
+        data['Offer_ID'] = rng.choice(self.offers[0], rows, p=self.offers[1])
+        data['Affiliate_ID'] = rng.choice(self.affiliates[0], rows, p=self.affiliates[1])
+
+        sampled = self.source[self.metrics].iloc[rng.integers(len(self.source), size=rows)].reset_index(drop=True)
+        for col in self.metrics:
+            if col == 'Total Sales':
+                data[col] = np.maximum(np.rint(sampled[col] * rng.lognormal(0, 0.2, rows)), 1).astype(np.int64)
+            else:
+                # float32, as the loader stores them; their shortest repr also writes faster
+                data[col] = (sampled[col] * rng.lognormal(0, 0.05, rows)).astype(np.float32)
+        return data[self.source.columns]
+
+    def write(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            for start in range(0, self.rows, CHUNK_ROWS):
+                self.chunk(min(CHUNK_ROWS, self.rows - start)).to_csv(f, header=(start == 0), index=False)
+
+
+# Size suffixes accepted on the command line, e.g. 100k, 1M, 10M
+def parse_rows(text):
+    multiplier = {'k': 10**3, 'm': 10**6}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+# Default location of a generated dataset, e.g. src/.cache/synthetic/DNNresults-1M.csv
+def synthetic_path(rows):
+    label = f'{rows // 10**6}M' if rows % 10**6 == 0 else f'{rows // 10**3}k' if rows % 10**3 == 0 else str(rows)
+    return os.path.join(os.path.dirname(SOURCE_PATH), '.cache', 'synthetic', f'DNNresults-{label}.csv')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic prediction results CSV with the real schema.')
+    parser.add_argument('rows', type=parse_rows, help='number of rows, e.g. 100k, 1M, 10M')
+    parser.add_argument('-o', '--output', help='CSV to write (default src/.cache/synthetic/DNNresults-<rows>.csv)')
+    parser.add_argument('--source', default=SOURCE_PATH, help='CSV whose schema and distributions are copied')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    output = args.output or synthetic_path(args.rows)
+    start = time.perf_counter()
+    SyntheticResults(args.source, args.rows, args.seed).write(output)
+    print(f'Wrote {args.rows:,} rows to {output} in {time.perf_counter() - start:.1f}s')
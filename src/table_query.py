@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # float32 values are then shortened through their str form, several times slower
+    orjson = None
+
+# DataTable filter_query operators, longest spellings first as in the Dash docs
+OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='],
+             ['contains '], ['datestartswith ']]
+
+
+# Split one "{column} op value" part of a filter_query into (column, operator, raw text, value)
+def split_filter_part(filter_part):
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                if not value_part:
+                    return [None] * 4
+                v0 = value_part[0]
+                if v0 == value_part[-1] and v0 in ("'", '"', '`') and len(value_part) > 1:
+                    raw = value_part[1: -1].replace('\\' + v0, v0)
+                    return name, operator_type[0].strip(), raw, raw
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+                return name, operator_type[0].strip(), value_part, value
+    return [None] * 4
+
+
+# Rows of series matching one filter_query part; missing values only match ne, as NULL does in SQL
+def compare(series, operator, raw, value, text):
+    if text:
+        value = raw  # text columns such as Keyword compare against what was typed
+    try:
+        if operator == 'contains':
+            return (series.astype(str).str.contains(raw, regex=False) & series.notna()).to_numpy()
+        if operator == 'datestartswith':
+            return (series.astype(str).str.startswith(raw) & series.notna()).to_numpy()
+        if operator == 'eq':
+            return (series == value).to_numpy()
+        if operator == 'ne':
+            return (series != value).to_numpy()
+        if operator == 'lt':
+            return (series < value).to_numpy()
+        if operator == 'le':
+            return (series <= value).to_numpy()
+        if operator == 'gt':
+            return (series > value).to_numpy()
+        if operator == 'ge':
+            return (series >= value).to_numpy()
+    except TypeError:  # e.g. a text value against a numeric column
+        return np.zeros(len(series), dtype=bool)
+    return np.ones(len(series), dtype=bool)
+
+
+# Values of one column for the given rows, with categoricals decoded to their category dtype; blank
+# values (code -1) become None, which holds the decoded values as objects
+def column_values(series, rows):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        if rows is not None:
+            codes = codes[rows]
+        values = series.cat.categories.take(codes)
+        if (codes < 0).any():
+            values = values.astype(object).where(codes >= 0, None)
+        return pd.Series(values)
+    values = series.to_numpy()
+    return pd.Series(values if rows is None else values[rows])
+
+
+# Narrow rows (None means all rows) by a DataTable filter_query, looking only at those rows
+def apply_filter_query(df, rows, filter_query):
+    if not filter_query:
+        return rows
+    for filter_part in filter_query.split(' && '):
+        col, operator, raw, value = split_filter_part(filter_part)
+        if col not in df.columns:
+            continue
+        series = df[col]
+        text = (series.cat.categories.dtype if isinstance(series.dtype, pd.CategoricalDtype) else series.dtype) == object
+        mask = compare(column_values(series, rows), operator, raw, value, text)
+        rows = np.flatnonzero(mask).astype(np.int32) if rows is None else rows[mask]
+    return rows
+
+
+# Selected rows (None means all rows, in file order) narrowed by a filter_query and ordered by sort_by
+def ordered_rows(index, sort_index, rows, filter_query, sort_by):
+    rows = apply_filter_query(index.df, rows, filter_query)
+    return sort_index.sort(rows, [(s['column_id'], s['direction'] == 'asc') for s in sort_by or []])
+
+
+# One page of the filtered, sorted table plus the total row count and the page actually served
+def query_page(index, sort_index, rows, filter_query, sort_by, page_current, page_size):
+    rows = ordered_rows(index, sort_index, rows, filter_query, sort_by)
+
+    total = len(index.df) if rows is None else len(rows)
+    page_size = page_size or 1
+    page_count = max(1, math.ceil(total / page_size))
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+
+    start = page_current * page_size
+    if rows is None:
+        page = index.df.iloc[start:start + page_size]
+    else:
+        page = index.take(rows[start:start + page_size])
+    return page, total, page_count, page_current
+
+
+# float32 values as Python floats of their shortest decimal form (0.9818182 rather than 0.9818181991577148),
+# so the JSON sent is no longer than the CSV; orjson writes and reads the whole column back in C
+def float32_list(values):
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY))  # NaN comes back as None
+    return values.astype(str).astype(float).tolist()
+
+
+# Values of one page column as Python objects, blank values as None (JSON null) like float32_list's NaN
+def record_values(series):
+    if series.dtype == np.float32:
+        return float32_list(series.to_numpy())
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.hasnans:
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+# Page rows as DataTable records, built a column at a time (one C conversion per column) and zipped into
+# rows, rather than converting every cell through pandas
+def page_records(page):
+    columns = list(page.columns)
+    values = [record_values(page[col]) for col in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
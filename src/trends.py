@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+
+from cube import CellCube
+from filter_index import BLANK_LABEL, missing_first
+from roi import ROI_HORIZONS
+
+# Sums kept per predicted horizon: the predicted values, the rows that have one, and the rows hitting ROI
+TREND_SUMS = ['value', 'valued', 'hits']
+
+# Lines drawn per chart; the smaller series are summed into one OTHER line
+TREND_SERIES = int(os.environ.get('DNN_TREND_SERIES', 8))
+OTHER = 'Other'
+
+# Breakdowns offered for the charts: every filter column but the month on the x axis and its dates
+TREND_DIMENSIONS = ['Country', 'New_Gateway', 'Telco', 'Shortcode', 'Keyword', 'Offer_ID', 'Affiliate_ID']
+
+
+# Calendar order of Month values such as '2023/7', which sorts after '2023/10' as text
+def month_key(value):
+    try:
+        year, month = str(value).split('/')
+        return int(year), int(month), ''
+    except ValueError:
+        return 10**9, 0, str(value)
+
+
+# Per-row terms of TREND_SUMS for one horizon; ROI is hit as in roi.RoiFlags (predicted / ECPA > 1)
+def trend_terms(predicted, ecpa):
+    valued = ~np.isnan(predicted)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hits = predicted / ecpa > 1
+    return [np.where(valued, predicted, 0), valued, hits]
+
+
+# (horizons x TREND_SUMS x groups) sums of rows (None means all rows) by group number
+def trend_sums(df, rows, groups, size):
+    sums = np.zeros((len(ROI_HORIZONS), len(TREND_SUMS), size))
+    ecpa = df['ECPA'].to_numpy(dtype=float)
+    if rows is not None:
+        ecpa = ecpa[rows]
+    for h, col in enumerate(ROI_HORIZONS):
+        predicted = df[col].to_numpy(dtype=float)
+        if rows is not None:
+            predicted = predicted[rows]
+        for s, term in enumerate(trend_terms(predicted, ecpa)):
+            sums[h, s] = np.bincount(groups, weights=term, minlength=size)
+    return sums
+
+
+def by_size(series):
+    return sorted(series, key=lambda one: (-int(one[1].sum()), missing_first(one[0])))
+
+
+# (months, series) from counts and sums grouped by month code * len(values) + value code: the months with
+# rows, in calendar order, and per series (value, row counts by month, horizons x TREND_SUMS x months
+# sums), biggest first, then by value. Without a breakdown there is one series, valued None. A blank
+# month or value is None; month_key puts a blank month last.
+def month_series(months, values, counts, sums):
+    counts = counts.astype(np.int64).reshape(len(months), len(values))
+    sums = sums.reshape(sums.shape[:2] + (len(months), len(values)))
+    order = sorted(np.flatnonzero(counts.sum(axis=1)), key=lambda m: month_key(months[m]))
+    counts, sums = counts[order], sums[:, :, order]
+    series = [(values[v], counts[:, v], sums[:, :, :, v]) for v in np.flatnonzero(counts.sum(axis=0))]
+    return [months[m] for m in order], by_size(series)
+
+
+# The same (months, series) from (month, value, row count, *sums) rows of a GROUP BY month, value
+def grouped_series(rows):
+    months = sorted({month for month, *_ in rows}, key=month_key)
+    position = {month: i for i, month in enumerate(months)}
+    series = {}
+    for month, value, count, *sums in rows:
+        counts, totals = series.setdefault(value, (np.zeros(len(months), dtype=np.int64),
+                                                   np.zeros((len(ROI_HORIZONS), len(TREND_SUMS), len(months)))))
+        counts[position[month]] = count
+        totals[:, :, position[month]] = np.reshape(sums, (len(ROI_HORIZONS), len(TREND_SUMS)))
+    return months, by_size([(value, counts, totals) for value, (counts, totals) in series.items()])
+
+
+# Month and breakdown values by code + 1, so a blank (code -1) has slot 0, valued None
+def blank_first(column):
+    return [None] + column.values
+
+
+# Trends of the selected rows (None means all rows) by month, broken down by a filter column or not at all
+def selection_trends(df, index, rows, dimension):
+    month = index.columns['Month']
+    months = blank_first(month)
+    groups = (month.codes if rows is None else month.codes[rows]).astype(np.int64) + 1
+    values = [None]
+    if dimension is not None:
+        column = index.columns[dimension]
+        values = blank_first(column)
+        groups = groups * len(values) + (column.codes if rows is None else column.codes[rows]) + 1
+    size = len(months) * len(values)
+    return month_series(months, values, np.bincount(groups, minlength=size), trend_sums(df, rows, groups, size))
+
+
+# Trend sums (horizons x TREND_SUMS) per cell: the month by breakdown rollup of any selection on the
+# cube columns merges cells instead of rows
+class TrendCube(CellCube):
+    def row_sums(self, df, rows, groups, size):
+        return trend_sums(df, rows, groups, size)
+
+    # Same result as selection_trends over the selected rows, from the matching cells
+    def rollup(self, filters, ranges, dimension):
+        months = blank_first(self.index.columns['Month'])
+        values = [None] if dimension is None else blank_first(self.index.columns[dimension])
+        groups = (self.codes('Month') + 1) * len(values)
+        if dimension is not None:
+            groups += self.codes(dimension) + 1
+        sums, counts = self.merged(self.kept(filters, ranges), groups, len(months) * len(values))
+        return month_series(months, values, counts, sums)
+
+
+# The biggest `count` series, and the rest summed into one OTHER series; sums add, so its means and
+# rates are exact
+def top_series(series, count=TREND_SERIES):
+    if len(series) <= count + 1:
+        return series
+    rest = series[count:]
+    return series[:count] + [(OTHER, sum(one[1] for one in rest), sum(one[2] for one in rest))]
+
+
+# Line charts of the mean predicted value and the ROI hit rate of one horizon by month, a line per series
+# of the breakdown by dimension (one 'All rows' line without one)
+def trend_figures(months, series, horizon, dimension=None):
+    h = ROI_HORIZONS.index(horizon)
+    months = [BLANK_LABEL if month is None else month for month in months]
+    values, rates = [], []
+    for value, counts, sums in series:
+        total, valued, hits = sums[h]
+        name = 'All rows' if dimension is None else BLANK_LABEL if value is None else str(value)
+        line = {'type': 'scatter', 'mode': 'lines+markers', 'name': name, 'x': months}
+        values.append(dict(line, y=[round(float(t / n), 4) if n else None for t, n in zip(total, valued)]))
+        rates.append(dict(line, y=[round(float(k / c * 100), 2) if c else None for k, c in zip(hits, counts)]))
+    layout = {'margin': {'t': 40, 'r': 20, 'b': 40, 'l': 50}, 'font': {'family': 'Forum'}, 'xaxis': {'type': 'category'},
+              'legend': {'orientation': 'h'}}
+    return [{'data': values, 'layout': dict(layout, title=f'{horizon} predicted value by month')},
+            {'data': rates, 'layout': dict(layout, title=f'{horizon} ROI hit rate (%) by month', yaxis={'range': [0, 100]})}]
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock (Windows): workers warm up side by side
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Start-up work that used to run at import (loading the dataset, computing the first dashboard), run as
+# named steps in a background thread so the server binds and serves the page shell right away; requests
+# needing the data wait for it as usual. Threads do not survive a fork, so each gunicorn worker starts its
+# own (see gunicorn.conf.py). With lock_path set, the workers of one machine take turns: the first builds
+# the dataset caches and the others map them instead of all parsing the same CSV on one CPU.
+class WarmUp:
+    def __init__(self, steps, lock_path=None):
+        self.steps = steps  # [(name, function)], run in order; a failed step ends the warm-up
+        self.lock_path = lock_path
+        self.pid = None
+        self.started = None
+        self.finished = None
+        self.progress = {}
+        self.done = threading.Event()
+
+    # Start warming up in this process, once
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.started, self.finished = time.perf_counter(), None
+        self.progress = {name: {'state': 'pending'} for name, _ in self.steps}
+        self.done.clear()
+        threading.Thread(target=self.run, name='warm-up', daemon=True).start()
+
+    def run(self):
+        try:
+            with self.turn():
+                for name, step in self.steps:
+                    self.progress[name] = {'state': 'running'}
+                    start = time.perf_counter()
+                    try:
+                        step()
+                    except Exception as error:
+                        self.progress[name] = {'state': 'failed', 'seconds': round(time.perf_counter() - start, 3), 'error': repr(error)}
+                        logger.exception('Warm-up step %s failed', name)
+                        return
+                    self.progress[name] = {'state': 'done', 'seconds': round(time.perf_counter() - start, 3)}
+            logger.info('Warmed up in %.2fs', time.perf_counter() - self.started)
+        finally:
+            self.finished = time.perf_counter()
+            self.done.set()
+
+    # Hold the machine-wide warm-up lock, if any, showing the wait as its own step
+    @contextmanager
+    def turn(self):
+        if self.lock_path is None or fcntl is None:
+            yield
+            return
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            f = open(self.lock_path, 'wb')
+        except OSError:
+            yield
+            return
+        with f:
+            start = time.perf_counter()
+            self.progress['waiting for other workers'] = {'state': 'running'}
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self.progress['waiting for other workers'] = {'state': 'done', 'seconds': round(time.perf_counter() - start, 3)}
+            yield
+
+    def ready(self):
+        return self.done.is_set() and all(step['state'] == 'done' for step in self.progress.values())
+
+    # Readiness of this process: whether every step is done, each step's state and seconds, and the seconds
+    # warming up took (so far, while it runs)
+    def status(self):
+        elapsed = None if self.started is None else round((self.finished or time.perf_counter()) - self.started, 3)
+        names = [name for name in self.progress if name not in dict(self.steps)] + [name for name, _ in self.steps]
+        return {'ready': self.ready(), 'pid': os.getpid(), 'started': self.pid == os.getpid(), 'seconds': elapsed,
+                'steps': [{'name': name, **self.progress.get(name, {'state': 'pending'})} for name in names]}
@@ -0,0 +1,39 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'src'))
+
+from dataset import type_columns  # noqa: E402
+
+# 600 synthetic.py rows with a few blank metrics and filter values (Month, Telco, Offer_ID, Affiliate_ID),
+# small enough that every check runs against plain pandas
+FIXTURE_CSV = os.path.join(TESTS_DIR, 'data', 'results.csv')
+
+
+# The fixture CSV copied to a temporary folder, so the caches built next to it are thrown away
+@pytest.fixture
+def source(tmp_path):
+    return shutil.copy(FIXTURE_CSV, tmp_path)
+
+
+@pytest.fixture
+def raw():
+    return pd.read_csv(FIXTURE_CSV)
+
+
+@pytest.fixture
+def frame(raw):
+    return type_columns(raw)
+
+
+# The typed fixture with some filter values blanked (category code -1), Date included so the cubes see one
+@pytest.fixture
+def blank_frame(frame):
+    for i, col in enumerate(['Month', 'Date', 'Telco', 'Offer_ID', 'Affiliate_ID']):
+        frame.loc[range(i, len(frame), 37 + i), col] = None
+    return frame
@@ -0,0 +1,37 @@
+import numpy as np
+
+from accuracy import accuracy_records, selection_totals
+from dataset_manager import build_snapshot
+from filter_index import FILTER_COLUMNS, FilterIndex
+from test_filter_index import RANGES, random_filters, reference_mask
+
+
+# Blank values form their own group, valued None and listed first among groups of the same size
+def test_blank_values_are_their_own_group(blank_frame):
+    index = FilterIndex(blank_frame)
+    groups = selection_totals(blank_frame, index, None, 'Telco')
+    blank = [group for group in groups if group[0] is None]
+    assert len(blank) == 1 and blank[0][1] == blank_frame['Telco'].isna().sum()
+    assert sum(group[1] for group in groups) == len(blank_frame)
+    assert accuracy_records(blank, 'Telco')[0]['Segment'] == '(blank)'
+    assert accuracy_records(selection_totals(blank_frame, index, None, None))[0]['Segment'] == 'All rows'
+
+
+# Date ranges a cube answers; every dated row is in the last one, so only blank dates are left out
+DATE_RANGES = RANGES[:3] + [{'Date': ['2000-01-01', None]}]
+
+
+# Cube cells (blank codes included) add up to the same groups as the selected rows
+def test_cube_totals_match_row_sums(blank_frame):
+    snapshot = build_snapshot(blank_frame, 'test', 0)
+    index = FilterIndex(blank_frame)
+    rng = np.random.default_rng(9)
+    cases = [([None] * 9, ranges, group_column) for ranges in DATE_RANGES for group_column in [None, *FILTER_COLUMNS]]
+    for i, filters in enumerate(random_filters(blank_frame, rng, 60)):
+        cases.append((filters[:7] + [None, None], DATE_RANGES[i % 4], [None, *FILTER_COLUMNS][i % (len(FILTER_COLUMNS) + 1)]))
+    for filters, ranges, group_column in cases:  # filters on cube columns only
+        expected = selection_totals(blank_frame, index, np.flatnonzero(reference_mask(blank_frame, filters, ranges)), group_column)
+        actual = snapshot.accuracy(filters, ranges, group_column)
+        assert [group[:2] for group in actual] == [group[:2] for group in expected], (filters, ranges, group_column)
+        for a, b in zip(actual, expected):
+            assert np.allclose(a[2], b[2])
@@ -0,0 +1,169 @@
+import math
+import shutil
+
+import numpy as np
+import pytest
+
+from accuracy import selection_totals
+from conftest import FIXTURE_CSV
+from dataset import select_columns
+from dataset_manager import TABLE_COLUMNS, DatasetManager
+from filter_index import FILTER_COLUMNS, FilterIndex
+from leaderboard import LEADERBOARD_GROUPS, LEADERBOARD_METRICS, selection_leaderboard
+from roi import ROI_HORIZONS
+from sqlite_backend import SqliteDataset
+from table_query import apply_filter_query, page_records
+from test_facets import reference_options
+from test_filter_index import RANGES, full_rates, random_filters, reference_mask
+from trends import selection_trends
+
+FILTER_QUERIES = ['', '{ECPA} > 1', '{ECPA} <= 0.5 && {Total Sales} >= 100', '{Keyword} contains a', '{Country} = egypt',
+                  '{Day 1} contains 0.1', '{Month} datestartswith 2023', '{Shortcode} > 50000', '{Telco} < m', '{ECPA} = abc',
+                  '{Offer_ID} ne 347', '{Total Sales} eq 110', '{Telco} ne zain', '{Affiliate_ID} contains 3', '{Month} = 2023/07']
+
+SORTS = [[], [{'column_id': 'Total Sales', 'direction': 'desc'}], [{'column_id': 'ECPA', 'direction': 'asc'}],
+         [{'column_id': 'ECPA', 'direction': 'desc'}],
+         [{'column_id': 'Country', 'direction': 'asc'}, {'column_id': 'Day 1', 'direction': 'desc'}]]
+
+
+# Each backend over one copy of the fixture CSV, built through its usual loader (and caches)
+def open_backend(kind, folder):
+    source = shutil.copy(FIXTURE_CSV, folder)
+    if kind == 'sqlite':
+        return SqliteDataset(source).current()
+    return DatasetManager(source, ingest_dir=None, poll_seconds=0).current()
+
+
+@pytest.fixture(scope='module', params=['snapshot', 'sqlite'])
+def backend(request, tmp_path_factory):
+    return open_backend(request.param, tmp_path_factory.mktemp(request.param))
+
+
+@pytest.fixture(scope='module')
+def backends(tmp_path_factory):
+    return [open_backend(kind, tmp_path_factory.mktemp(kind)) for kind in ('snapshot', 'sqlite')]
+
+
+@pytest.fixture
+def cases(frame):
+    rng = np.random.default_rng(5)
+    return [(filters, RANGES[int(rng.integers(len(RANGES)))]) for filters in random_filters(frame, rng, 40)]
+
+
+# Sums are added in a different order by each backend (cube cells, rows, SQL), so they agree to rounding
+def assert_groups(actual, expected, exact):
+    assert [group[:exact] for group in actual] == [group[:exact] for group in expected]
+    for a, b in zip(actual, expected):
+        assert np.allclose(np.array(a[exact:], dtype=float), np.array(b[exact:], dtype=float), rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+def test_selection_matches_boolean_masks(backend, frame, cases):
+    for filters, ranges in cases:
+        rows = np.flatnonzero(reference_mask(frame, filters, ranges))
+        selection = backend.select(filters, ranges)
+        assert backend.table_page(selection, '', [], 0, 50)[1] == len(rows), (filters, ranges)
+        assert backend.hit_rates(selection) == pytest.approx(full_rates(frame, rows)), (filters, ranges)
+
+
+def test_facet_counts_match_boolean_masks(backend, frame, cases):
+    for filters, ranges in cases:
+        for depth in range(len(FILTER_COLUMNS)):
+            path = filters[:depth]
+            expected = reference_options(frame, path, ranges) if all(path) else []
+            assert backend.facet_counts(path, ranges) == expected, (path, ranges)
+
+
+def test_accuracy_matches_row_sums(backend, frame, cases):
+    index = FilterIndex(frame)
+    for i, (filters, ranges) in enumerate(cases):
+        group_column = [None, *FILTER_COLUMNS][i % (len(FILTER_COLUMNS) + 1)]
+        expected = selection_totals(frame, index, np.flatnonzero(reference_mask(frame, filters, ranges)), group_column)
+        assert_groups(backend.accuracy(filters, ranges, group_column), expected, 2)
+
+
+def test_trends_match_row_sums(backend, frame, cases):
+    index = FilterIndex(frame)
+    for i, (filters, ranges) in enumerate(cases):
+        dimension = [None, *FILTER_COLUMNS[1:]][i % len(FILTER_COLUMNS)]
+        months, series = backend.trends(filters, ranges, dimension)
+        expected_months, expected_series = selection_trends(frame, index, np.flatnonzero(reference_mask(frame, filters, ranges)), dimension)
+        assert months == expected_months
+        assert [(value, list(counts)) for value, counts, _ in series] == [(value, list(counts)) for value, counts, _ in expected_series]
+        for (_, _, sums), (_, _, expected_sums) in zip(series, expected_series):
+            assert np.allclose(sums, expected_sums, rtol=1e-9, atol=1e-12)
+
+
+def test_leaderboard_matches_row_sums(backend, frame, cases):
+    index = FilterIndex(frame)
+    rng = np.random.default_rng(6)
+    for filters, ranges in cases:
+        leaders = (LEADERBOARD_GROUPS[list(LEADERBOARD_GROUPS)[int(rng.integers(len(LEADERBOARD_GROUPS)))]],
+                   ROI_HORIZONS[int(rng.integers(len(ROI_HORIZONS)))], list(LEADERBOARD_METRICS)[int(rng.integers(len(LEADERBOARD_METRICS)))],
+                   int(rng.choice([1, 10, 100])), bool(rng.integers(2)))
+        expected = selection_leaderboard(frame, index, np.flatnonzero(reference_mask(frame, filters, ranges)), *leaders)
+        assert_groups(backend.leaderboard(filters, ranges, *leaders), expected, 3)
+
+
+# Rows in table order by sorting the frame itself: missing values sort below every value and ties keep
+# file order, except under a single descending key, which is the ascending order reversed
+def reference_order(df, rows, sort_by):
+    keys = [(s['column_id'], s['direction'] == 'asc') for s in sort_by]
+    if len(keys) == 1:
+        order = sorted_positions(df[keys[0][0]].take(rows), True)
+        return rows[order] if keys[0][1] else rows[order][::-1]
+    for col, ascending in reversed(keys):  # stable passes, least significant key first
+        rows = rows[sorted_positions(df[col].take(rows), ascending)]
+    return rows
+
+
+def sorted_positions(values, ascending):
+    values = values.astype(object).reset_index(drop=True)
+    return values.sort_values(kind='stable', ascending=ascending, na_position='first' if ascending else 'last').index.to_numpy()
+
+
+def test_table_pages_match_pandas(backend, frame, cases):
+    table = select_columns(frame, TABLE_COLUMNS)
+    rng = np.random.default_rng(7)
+    for filters, ranges in cases[:15]:
+        selected = np.flatnonzero(reference_mask(frame, filters, ranges)).astype(np.int32)
+        for filter_query in FILTER_QUERIES:
+            sort_by = SORTS[int(rng.integers(len(SORTS)))]
+            page = int(rng.integers(3))
+            rows = reference_order(frame, apply_filter_query(frame, selected, filter_query), sort_by)
+            page_count = max(1, math.ceil(len(rows) / 50))
+            page = min(page, page_count - 1)
+            expected = page_records(table.take(rows[page * 50:(page + 1) * 50])), len(rows), page_count, page
+            actual = backend.table_page(backend.select(filters, ranges), filter_query, sort_by, page, 50)
+            assert actual == expected, (filters, ranges, filter_query, sort_by)
+
+
+# The columns the fixture leaves blank in some rows. SQLite keeps NULL as a value of its own (grouped,
+# never equal, only matched by ne), so the pandas path must too
+BLANK_COLUMNS = ['Month', 'Telco', 'Offer_ID', 'Affiliate_ID']
+
+
+def test_blank_values_match_between_backends(backends, frame):
+    snapshot, sqlite = backends
+    everything = [None] * len(FILTER_COLUMNS)
+    assert frame[BLANK_COLUMNS].isna().any().all()
+    for ranges in RANGES[:3]:
+        assert snapshot.facet_counts([], ranges) == sqlite.facet_counts([], ranges)
+        for col in BLANK_COLUMNS:
+            for query in [f'{{{col}}} ne {frame[col].dropna().iloc[0]}', f'{{{col}}} contains 1', f'{{{col}}} < 5']:
+                args = (query, [{'column_id': col, 'direction': 'asc'}], 0, 50)
+                assert snapshot.table_page(snapshot.select(everything, ranges), *args) == sqlite.table_page(sqlite.select(everything, ranges), *args)
+            accuracy = snapshot.accuracy(everything, ranges, col)
+            assert ranges or any(value is None for value, *_ in accuracy)
+            assert_groups(accuracy, sqlite.accuracy(everything, ranges, col), 2)
+            if col != 'Month':
+                months, series = snapshot.trends(everything, ranges, col)
+                assert ranges or None in months and any(value is None for value, *_ in series)
+                sqlite_months, sqlite_series = sqlite.trends(everything, ranges, col)
+                assert months == sqlite_months and [(value, list(counts)) for value, counts, _ in series] == \
+                    [(value, list(counts)) for value, counts, _ in sqlite_series]
+        for group_columns in LEADERBOARD_GROUPS.values():
+            for metric in LEADERBOARD_METRICS:
+                leaders = (group_columns, 'Month 3 (P)', metric, len(frame), False)
+                groups = snapshot.leaderboard(everything, ranges, *leaders)
+                assert ranges or metric == 'roi' or any(None in key for key, *_ in groups)
+                assert_groups(groups, sqlite.leaderboard(everything, ranges, *leaders), 3)
@@ -0,0 +1,90 @@
+import io
+import json
+import random
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import FIXTURE_CSV
+from loadtest import DashboardSession, id_text
+
+MONTH = id_text({'type': 'filter-dropdown', 'column': 'Month'})
+
+
+# The app serving a copy of the fixture, imported once: it reads its settings from the environment
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DNN_SOURCE', shutil.copy(FIXTURE_CSV, folder))
+        patch.setenv('DNN_DATASETS', '')
+        patch.setenv('DNN_INGEST_DIR', str(folder / 'ingest'))
+        import app
+        yield app
+
+
+# loadtest.Client over the Flask test client
+class FlaskClient:
+    def __init__(self, server):
+        self.client = server.test_client()
+        self.url = ''
+
+    def request(self, step, method, path, body=None, raw=False):
+        return self.client.open(path, method=method, json=body).get_json()
+
+
+@pytest.fixture
+def session(app):
+    client = FlaskClient(app.server)
+    session = DashboardSession(client, client.request('layout', 'GET', '/_dash-layout'),
+                               client.request('dependencies', 'GET', '/_dash-dependencies'), 0, random.Random(0))
+    session.options = session.update('initial', [])[MONTH]['options']
+    return session
+
+
+# Changes that only need some outputs, and the outputs a response to them holds
+NARROW_UPDATES = {
+    'table sort': ({'sort_by': [{'column_id': 'ECPA', 'direction': 'desc'}]}, {}, {'table', 'table-row-count'}),
+    'accuracy grouping': ({}, {'accuracy-group': 'Country'}, {'accuracy-table'}),
+    'trend breakdown': ({}, {'trend-dimension': 'Telco'}, {'trend-value-graph', 'trend-roi-graph'}),
+    'leaderboard size': ({}, {'leaderboard-k': 3}, {'leaderboard-table'}),
+    'comparison': ({}, {'compare-dataset': 'results'}, {'compare-table'}),  # the fixture compared with itself
+}
+
+
+# Pick a month, but drop the response, as the Dash renderer does once a newer request of the callback is
+# sent; the narrow change that follows must then render everything, and only the next one stays narrow
+@pytest.mark.parametrize('update', list(NARROW_UPDATES))
+def test_narrow_updates_only_follow_a_rendered_state(session, update):
+    table, values, outputs = NARROW_UPDATES[update]
+    session.values[f'{MONTH}.value'] = [session.options[0]['value']]
+    session.client.request('month', 'POST', '/_dash-update-component', session.body([f'{MONTH}.value']))
+
+    changed = [f'table.{prop}' for prop in table] + [f'{key}.value' for key in values]
+    session.table.update(table)
+    session.values.update({f'{key}.value': value for key, value in values.items()})
+    response = session.update(update, changed)
+    assert MONTH in response and set(response) > outputs | {'dashboard-rendered'}
+
+    response = session.update(update, changed)
+    assert set(response) == outputs | {'dashboard-rendered'}
+
+
+# Malformed export states are refused before the download starts, not part way through streaming it
+BAD_EXPORTS = {'range bound list': {'ranges': {'ECPA': [[1, 2], None]}}, 'sort column list': {'sort_by': [{'column_id': ['ECPA'], 'direction': 'asc'}]},
+               'sort direction': {'sort_by': [{'column_id': 'ECPA', 'direction': 'up'}]}, 'nested filter': {'filters': {'Month': [['2023/07']]}}}
+
+
+@pytest.mark.parametrize('state', list(BAD_EXPORTS))
+def test_bad_export_states_are_refused(app, state):
+    response = app.server.test_client().get('/export', query_string={'format': 'csv', 'state': json.dumps(BAD_EXPORTS[state])})
+    assert response.status_code == 400
+
+
+def test_exports_stream_the_sorted_selection(app):
+    state = {'ranges': {'ECPA': [0.5, '2']}, 'sort_by': [{'column_id': 'ECPA', 'direction': 'desc'}]}
+    response = app.server.test_client().get('/export', query_string={'format': 'csv', 'state': json.dumps(state)})
+    rows = pd.read_csv(io.BytesIO(response.get_data()))
+    assert response.status_code == 200 and len(rows) and rows['ECPA'].between(0.5, 2).all()
+    assert rows['ECPA'].is_monotonic_decreasing
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from dataset import load_dataset, type_columns, valid_manifest
+from dataset_manager import DatasetManager
+
+
+# A results file with blank sales counts and a text column the loader does not know about
+def untidy_csv(raw, path):
+    raw.loc[[3, 10], 'Total Sales'] = np.nan
+    raw['Notes'] = [f'note {i}' if i % 7 else None for i in range(len(raw))]
+    raw.to_csv(path, index=False)
+    return str(path)
+
+
+def test_blank_counts_and_extra_columns_load_from_the_csv_and_the_cache(raw, tmp_path):
+    path = untidy_csv(raw, tmp_path / 'results.csv')
+    notes = pd.read_csv(path)['Notes'].fillna('').tolist()
+    for _ in range(2):  # parsed from the CSV, then read back from the cache it wrote
+        data = load_dataset(path)
+        assert data['Total Sales'].dtype == np.float32 and data['Total Sales'].isna().sum() == 2
+        assert data['Notes'].astype(object).fillna('').tolist() == notes
+
+
+def test_batches_with_blank_counts_and_extra_columns_are_ingested(raw, tmp_path):
+    path = untidy_csv(raw.iloc[:500].copy(), tmp_path / 'results.csv')
+    os.makedirs(tmp_path / 'ingest')
+    untidy_csv(raw.iloc[500:].reset_index(drop=True), tmp_path / 'ingest' / 'batch.csv')
+    manager = DatasetManager(path, ingest_dir=str(tmp_path / 'ingest'), poll_seconds=0)
+    snapshot = manager.current()
+    assert len(snapshot.df) == len(raw) and snapshot.df['Total Sales'].isna().sum() == 4
+    assert snapshot.leaderboard([None] * 9, None, ['Affiliate_ID'], 'Month 3 (P)', 'sales', 5)
+
+
+def test_blank_months_stay_missing():
+    data = type_columns(pd.DataFrame({'Month': ['2023/7', '2023/8', None, '2023/07']}))
+    assert data['Month'].astype(object).tolist() == ['2023/07', '2023/08', np.nan, '2023/07']
+    assert data['Month'].cat.categories.tolist() == ['2023/07', '2023/08']
+
+
+# A re-copied source (new mtime, same bytes) keeps its cache, and only the first load after the copy hashes it
+def test_touched_source_is_hashed_once(raw, tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.csv')
+    raw.to_csv(path, index=False)
+    load_dataset(path)
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+    hashed = []
+    monkeypatch.setattr(dataset, 'file_digest', lambda source, digest=dataset.file_digest: hashed.append(source) or digest(source))
+    for _ in range(3):
+        assert load_dataset(path).attrs['sha1']
+    assert hashed == [path]
+    assert valid_manifest(path, os.stat(path))['source_mtime'] == 1_000_000_000
@@ -0,0 +1,49 @@
+import pytest
+
+import dataset_manager
+from dataset_manager import DatasetManager
+
+
+# load_dataset that appends the next row of the fixture to the source during each of the first `growths`
+# reads, as a writer appending while the file is parsed
+def growing_loader(monkeypatch, path, lines, growths):
+    load = dataset_manager.load_dataset
+
+    def load_while_appending(source):
+        if lines and len(appended) < growths:  # after the size was taken, before the rows are parsed
+            appended.append(lines.pop(0))
+            with open(path, 'a') as f:
+                f.write(appended[-1])
+        return load(source)
+
+    appended = []
+    monkeypatch.setattr(dataset_manager, 'load_dataset', load_while_appending)
+    return appended
+
+
+def start_file(source, rows):
+    with open(source) as f:
+        lines = f.readlines()
+    with open(source, 'w') as f:
+        f.writelines(lines[:rows + 1])
+    return lines[rows + 1:]
+
+
+def test_rows_appended_during_a_load_are_ingested_once(source, monkeypatch):
+    lines = start_file(source, 500)
+    growing_loader(monkeypatch, source, lines, growths=2)
+    manager = DatasetManager(source, poll_seconds=0)
+    assert len(manager.current().df) == 502  # read again until the size held still
+    manager.refresh()
+    assert len(manager.current().df) == 502
+
+
+def test_a_source_growing_during_every_read_is_not_loaded(source, monkeypatch):
+    lines = start_file(source, 500)
+    growing_loader(monkeypatch, source, lines, growths=dataset_manager.LOAD_ATTEMPTS)
+    with pytest.raises(RuntimeError):
+        DatasetManager(source, poll_seconds=0)
+    monkeypatch.undo()
+    manager = DatasetManager(source, poll_seconds=0)  # once appends pause, everything is there exactly once
+    manager.refresh()
+    assert len(manager.current().df) == 500 + dataset_manager.LOAD_ATTEMPTS
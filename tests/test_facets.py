@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from dataset import append_rows, type_columns
+from dataset_manager import build_snapshot
+from facets import FacetTree
+from filter_index import FILTER_COLUMNS, FilterIndex
+from test_filter_index import RANGES, random_filters, reference_mask
+
+
+# Reference dropdown options: the next column's values over the selected rows, in first-appearance order
+# (missing values as None), with their row counts
+def reference_options(df, path, ranges=None):
+    mask = reference_mask(df, list(path) + [None] * (len(FILTER_COLUMNS) - len(path)), ranges)
+    values = df[FILTER_COLUMNS[len(path)]].astype(object)[mask]
+    values = values.where(values.notna(), None)
+    counts = values.value_counts(dropna=False, sort=False)
+    return [(value, int(counts[value])) for value in pd.unique(values)]
+
+
+def test_cascade_options_match_boolean_masks(frame):
+    snapshot = build_snapshot(frame, 'test', 0)
+    rng = np.random.default_rng(3)
+    for filters in random_filters(frame, rng, 150):
+        ranges = RANGES[int(rng.integers(len(RANGES)))] if rng.random() < 0.5 else None
+        for depth in range(len(FILTER_COLUMNS)):
+            path = filters[:depth]
+            if not all(value for value in path):
+                break
+            assert snapshot.facet_counts(path, ranges) == reference_options(frame, path, ranges), (path, ranges)
+
+
+# A tree extended by new rows answers every path as a tree built over all the rows does
+def test_extended_tree_matches_a_full_build(raw):
+    base = type_columns(raw.iloc[:400].copy())
+    full = append_rows(base, type_columns(raw.iloc[400:].reset_index(drop=True)))  # as an ingest does
+    index = FilterIndex(full)
+    extended = FacetTree(FilterIndex(base)).extended(index, 400)
+    rebuilt = FacetTree(index)
+    for name, array in rebuilt.arrays().items():
+        assert np.array_equal(extended.arrays()[name], array), name
+    rng = np.random.default_rng(4)
+    for row in rng.integers(len(full), size=100):
+        values = [full[col].iloc[row] for col in FILTER_COLUMNS]
+        for depth in range(len(FILTER_COLUMNS)):
+            if depth and values[depth - 1] != values[depth - 1]:
+                break  # a blank value cannot be picked in a dropdown
+            assert extended.children(values[:depth]) == reference_options(full, values[:depth])
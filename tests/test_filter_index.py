@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import type_columns
+from dataset_manager import build_snapshot, extend_snapshot
+from filter_index import DATE_FORMAT, FILTER_COLUMNS, intersect, selected_values
+from roi import ROI_HORIZONS
+
+RANGES = [None, {'Date': ['2023-01-01', '2023-03-31']}, {'Date': [None, '2022-12-15']}, {'ECPA': [0.5, 2]},
+          {'Total Sales': [100, None], 'Month 3 (P)': [None, 0.9]}, {'Month 6 (P)': [1.2, 1.2]}, {'ECPA': [3, 1]}]
+
+
+def python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+# Random cascades of single and multiple values, some with a value the data does not hold
+def random_filters(df, rng, count):
+    cases = [[None] * len(FILTER_COLUMNS), ['no such month'] + [None] * 8]
+    for _ in range(count):
+        rows = rng.integers(len(df), size=int(rng.integers(1, 4)))
+        depth = int(rng.integers(1, len(FILTER_COLUMNS) + 1))
+        filters = []
+        for col in FILTER_COLUMNS[:depth]:
+            values = sorted({python_value(df[col].iloc[row]) for row in rows if df[col].iloc[row] == df[col].iloc[row]}, key=str)
+            if not values or rng.random() < 0.2:  # blank values cannot be picked in a dropdown
+                values.append('unknown')
+            filters.append(values if len(values) > 1 or rng.random() < 0.5 else values[0])
+        cases.append(filters + [None] * (len(FILTER_COLUMNS) - depth))
+    return cases
+
+
+# Boolean-mask reference: rows holding one of the selected values of every column and inside every range
+def reference_mask(df, filters, ranges=None):
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in zip(FILTER_COLUMNS, filters):
+        values = selected_values(value)
+        if values is not None:
+            mask &= df[col].isin(values).to_numpy()
+    for col, (low, high) in (ranges or {}).items():
+        if col == 'Date':
+            values = pd.to_datetime(df[col].astype(str), format=DATE_FORMAT).to_numpy().astype('datetime64[D]')
+            low, high = [None if bound is None else np.datetime64(bound, 'D') for bound in (low, high)]
+        else:
+            values = df[col].to_numpy()
+            low, high = [None if bound is None else values.dtype.type(bound) for bound in (low, high)]
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    return mask
+
+
+def selected_rows(rows, size):
+    return np.arange(size) if rows is None else rows
+
+
+def test_intersect_starts_from_the_smallest_condition():
+    calls = []
+    small = (2, lambda: calls.append('small') or np.array([3, 7]), lambda rows: rows > 5)
+    large = (100, lambda: calls.append('large') or np.arange(100), lambda rows: np.ones(len(rows), dtype=bool))
+    stats = {}
+    assert intersect([large, small], stats).tolist() == [3, 7]
+    assert calls == ['small'] and stats['scanned'] == 4
+    assert intersect([]) is None
+
+
+def test_select_matches_boolean_masks(frame):
+    snapshot = build_snapshot(frame, 'test', 0)
+    rng = np.random.default_rng(0)
+    for filters in random_filters(frame, rng, 200):
+        for ranges in RANGES:
+            rows = snapshot.select(filters, ranges)
+            expected = np.flatnonzero(reference_mask(frame, filters, ranges))
+            if not any(selected_values(value) for value in filters) and not ranges:
+                assert rows is None
+            assert selected_rows(rows, len(frame)).tolist() == expected.tolist(), (filters, ranges)
+
+
+def test_hit_rates_match_boolean_masks(frame):
+    snapshot = build_snapshot(frame, 'test', 0)
+    ecpa = frame['ECPA'].to_numpy(dtype=float)
+    rng = np.random.default_rng(1)
+    for filters in random_filters(frame, rng, 100):
+        ranges = RANGES[int(rng.integers(len(RANGES)))]
+        mask = reference_mask(frame, filters, ranges)
+        rates = snapshot.hit_rates(snapshot.select(filters, ranges))
+        if not mask.any():
+            assert rates is None
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = {col: (frame[col].to_numpy(dtype=float)[mask] / ecpa[mask] > 1).mean() * 100 for col in ROI_HORIZONS}
+        assert rates == pytest.approx(expected)
+
+
+# Indexes extended by an ingest select exactly what indexes built over all the rows do
+def test_extended_snapshot_matches_a_full_build(raw):
+    full = type_columns(raw.copy())
+    snapshot = build_snapshot(type_columns(raw.iloc[:400].copy()), 'base', 0)
+    new = type_columns(raw.iloc[400:].reset_index(drop=True))
+    extended = extend_snapshot(snapshot, new, 'extended', {'name': 'batch.csv', 'rows': len(new), 'at': 0})
+    rng = np.random.default_rng(2)
+    for filters in random_filters(full, rng, 100):
+        ranges = RANGES[int(rng.integers(len(RANGES)))]
+        expected = np.flatnonzero(reference_mask(full, filters, ranges))
+        assert selected_rows(extended.select(filters, ranges), len(full)).tolist() == expected.tolist(), (filters, ranges)
+        assert extended.hit_rates(extended.select(filters, ranges)) == pytest.approx(full_rates(full, expected))
+
+
+def full_rates(df, rows):
+    if len(rows) == 0:
+        return None
+    ecpa = df['ECPA'].to_numpy(dtype=float)[rows]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {col: (df[col].to_numpy(dtype=float)[rows] / ecpa > 1).mean() * 100 for col in ROI_HORIZONS}
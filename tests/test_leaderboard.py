@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import FilterIndex
+from leaderboard import LEADERBOARD_GROUPS, leaderboard_records, selection_leaderboard, top_k
+from test_trends import python_value
+
+
+# Scores drawn from a few values, so most of them tie, with some groups not ranked (NaN)
+def random_scores(rng, size):
+    scores = rng.choice([-1.5, 0.0, 0.25, 2.0, 7.0], size=size)
+    scores[rng.random(size) < 0.2] = np.nan
+    return scores
+
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(8)
+    for _ in range(300):
+        size = int(rng.integers(0, 60))
+        scores = random_scores(rng, size)
+        keys = [(str(key), int(key)) for key in rng.permutation(size)]  # ties go by key, not by position
+        k = int(rng.integers(1, size + 3))
+        lowest = bool(rng.integers(2))
+        groups = pd.DataFrame({'score': scores, 'key': keys}).dropna()
+        expected = groups.sort_values(['score', 'key'], ascending=[lowest, True], kind='stable').head(k).index.tolist()
+        assert [int(g) for g in top_k(scores, keys.__getitem__, k, lowest)] == expected, (scores, keys, k, lowest)
+
+
+# Every group, blank ids included, holds the rows pandas groups under the same key
+def test_blank_ids_are_their_own_group(blank_frame):
+    index = FilterIndex(blank_frame)
+    for group_columns in LEADERBOARD_GROUPS.values():
+        expected = blank_frame.astype({col: object for col in group_columns}).groupby(group_columns, dropna=False).size()
+        expected = {tuple(map(python_value, key if len(group_columns) > 1 else (key,))): rows for key, rows in expected.items()}
+        groups = selection_leaderboard(blank_frame, index, None, group_columns, 'Month 3 (P)', 'sales', len(blank_frame))
+        assert {key: rows for key, rows, *_ in groups} == expected
+        assert any(None in key for key in expected)
+        blank = [group for group in groups if None in group[0]]
+        assert '(blank)' in leaderboard_records(blank, group_columns)[0].values()
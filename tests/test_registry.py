@@ -0,0 +1,49 @@
+from registry import DatasetRegistry
+
+
+# A loaded dataset of a fixed size, recording whether it was dropped
+class FakeDataset:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def current(self):
+        return self
+
+    def memory_bytes(self):
+        return 100
+
+    def close(self):
+        self.closed = True
+
+
+def registry():
+    return DatasetRegistry({'a': 'a.csv', 'b': 'b.csv', 'c': 'c.csv'}, FakeDataset, budget_bytes=150)
+
+
+# Requests comparing two datasets that do not fit the budget together keep both loaded, whichever is
+# selected, instead of each evicting the other's dataset for the next request to reload
+def test_datasets_a_request_uses_are_not_evicted_by_it():
+    datasets = registry()
+    for selected, compared in [('a', 'b'), ('b', 'a')] * 3:
+        with datasets.holding():
+            first = datasets.get(selected)
+            datasets.get(compared)
+            assert not first.closed
+        with datasets.holding():  # the version poll, which only asks for the selected dataset
+            datasets.get(selected)
+    assert datasets.events == {('load', 'a'): 1, ('load', 'b'): 1}
+
+
+# Held datasets are released with the request: the next load evicts the least recently used again
+def test_released_datasets_are_evicted_again():
+    datasets = registry()
+    with datasets.holding():
+        a, b = datasets.get('a'), datasets.get('b')
+    with datasets.holding():
+        datasets.get('b')
+        datasets.get('c')
+    assert a.closed and not b.closed and list(datasets.loaded) == ['b', 'c']
+    assert datasets.pins == {}
+    datasets.get('a')  # outside a request nothing is held: only the dataset just used is kept
+    assert list(datasets.loaded) == ['a']
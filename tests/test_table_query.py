@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_query import apply_filter_query
+
+# Blank ids and keywords (category code -1) match no condition but ne, as NULL does in the SQLite backend
+ROWS = pd.DataFrame({'Keyword': pd.Categorical(['xde', 'abc', None, 'xde', 'none']), 'Shortcode': pd.Categorical([5, 60000, None, 7, 5])})
+
+QUERIES = {'{Keyword} = xde': [0, 3], '{Keyword} ne xde': [1, 2, 4], '{Keyword} contains on': [4], '{Keyword} < m': [1],
+           '{Shortcode} > 50000': [1], '{Shortcode} contains 6': [1], '{Shortcode} = 5': [0, 4], '{Shortcode} ne 5': [1, 2, 3],
+           '{Shortcode} < abc': []}
+
+
+@pytest.mark.parametrize('query', list(QUERIES))
+def test_filter_queries_skip_blank_values(query):
+    assert apply_filter_query(ROWS, None, query).tolist() == QUERIES[query]
+    assert apply_filter_query(ROWS, np.arange(1, 5), query).tolist() == [row for row in QUERIES[query] if row >= 1]
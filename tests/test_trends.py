@@ -0,0 +1,47 @@
+import numpy as np
+
+from dataset_manager import build_snapshot
+from filter_index import FilterIndex
+from test_accuracy import DATE_RANGES
+from test_filter_index import reference_mask
+from trends import TREND_DIMENSIONS, selection_trends, trend_figures
+
+
+def python_value(value):
+    return None if value != value else value.item() if hasattr(value, 'item') else value
+
+
+# Row counts by (month, value) as pandas groups them, blanks kept as None
+def reference_counts(df, rows, dimension):
+    columns = ['Month'] + ([dimension] if dimension else [])
+    groups = df.take(rows).astype({col: object for col in columns}).groupby(columns, dropna=False).size()
+    return {tuple(map(python_value, key if dimension else (key, None))): count for key, count in groups.items()}
+
+
+def series_counts(months, series):
+    return {(month, value): int(count) for value, counts, _ in series for month, count in zip(months, counts) if count}
+
+
+# Blank months and breakdown values are counted in their own slots, never under a neighbouring value,
+# and the cube rolls up the same series as the selected rows
+def test_blank_values_are_their_own_series(blank_frame):
+    snapshot = build_snapshot(blank_frame, 'test', 0)
+    index = FilterIndex(blank_frame)
+    for ranges in DATE_RANGES:
+        rows = np.flatnonzero(reference_mask(blank_frame, [None] * 9, ranges))
+        for dimension in [None] + TREND_DIMENSIONS:
+            months, series = selection_trends(blank_frame, index, rows, dimension)
+            assert series_counts(months, series) == reference_counts(blank_frame, rows, dimension), (ranges, dimension)
+            assert months[-1] is None or blank_frame['Month'].take(rows).notna().all()
+            cube_months, cube_series = snapshot.trends([None] * 9, ranges, dimension)
+            assert cube_months == months and [(value, list(counts)) for value, counts, _ in cube_series] == \
+                [(value, list(counts)) for value, counts, _ in series]
+            for (_, _, a), (_, _, b) in zip(cube_series, series):
+                assert np.allclose(a, b)
+
+
+def test_blank_values_are_labelled(blank_frame):
+    months, series = selection_trends(blank_frame, FilterIndex(blank_frame), None, 'Telco')
+    figure = trend_figures(months, series, 'Day 1', 'Telco')[0]
+    assert figure['data'][0]['x'][-1] == '(blank)' and '(blank)' in [line['name'] for line in figure['data']]
+    assert [line['name'] for line in trend_figures(*selection_trends(blank_frame, FilterIndex(blank_frame), None, None), 'Day 1')[0]['data']] == ['All rows']